@@ -1,11 +1,48 @@
+import tempfile
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Customer, MilkEntry
+from django.http import FileResponse
+from django.utils import timezone
+
+from . import deletion
+from .billing import generate_month_bills
+from .models import AuditLog, BillJob, Customer, MilkEntry, MonthlyLedger, Payment, PriceSchedule
+from .pricing import with_price
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'balance_amount', 'created_at')
     search_fields = ('name',)
     fields = ('name', 'balance_amount')
+    actions = ('download_current_month_bills', 'download_previous_month_bills')
+
+    # deletes are soft (see accounts.deletion)
+    def delete_model(self, request, obj):
+        deletion.delete_customer(obj)
+
+    def delete_queryset(self, request, queryset):
+        for customer in queryset:
+            deletion.delete_customer(customer)
+
+    def _bills_zip(self, request, queryset, day):
+        output = tempfile.TemporaryFile()
+        manifest = generate_month_bills(
+            day.year, day.month, output, customer_ids=list(queryset.values_list('id', flat=True))
+        )
+        output.seek(0)
+        self.message_user(request, f"Rendered {len(manifest['bills'])} bills in {manifest['total_seconds']}s.")
+        return FileResponse(
+            output, as_attachment=True, filename=f"bills_{day.year}_{day.month:02d}.zip",
+        )
+
+    @admin.action(description="Download this month's bills (ZIP)")
+    def download_current_month_bills(self, request, queryset):
+        return self._bills_zip(request, queryset, timezone.localdate())
+
+    @admin.action(description="Download last month's bills (ZIP)")
+    def download_previous_month_bills(self, request, queryset):
+        return self._bills_zip(request, queryset, timezone.localdate().replace(day=1) - timedelta(days=1))
 
 @admin.register(MilkEntry)
 class MilkEntryAdmin(admin.ModelAdmin):
@@ -14,10 +51,89 @@ class MilkEntryAdmin(admin.ModelAdmin):
     search_fields = ('customer__name',)
     ordering = ('-date',)
 
+    def get_queryset(self, request):
+        # price every listed row in the changelist query
+        return with_price(super().get_queryset(request))
+
+    def delete_model(self, request, obj):
+        deletion.delete_entries([obj])
+
+    def delete_queryset(self, request, queryset):
+        deletion.delete_entries(list(queryset))
+
     def litres_display(self, obj):
         return f"{obj.litres:.3f}"
     litres_display.short_description = 'Litres'
 
     def amount_display(self, obj):
         return f"₹{obj.amount:.2f}"
-    amount_display.short_description = 'Amount'
\ No newline at end of file
+    amount_display.short_description = 'Amount'
+
+@admin.register(PriceSchedule)
+class PriceScheduleAdmin(admin.ModelAdmin):
+    list_display = ('effective_from', 'customer', 'price_per_litre', 'updated_at')
+    list_filter = ('effective_from',)
+    search_fields = ('customer__name',)
+    list_select_related = ('customer',)
+    autocomplete_fields = ('customer',)
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ('date', 'customer', 'amount', 'note', 'created_at')
+    list_filter = ('date',)
+    search_fields = ('customer__name', 'note')
+    list_select_related = ('customer',)
+    autocomplete_fields = ('customer',)
+    date_hierarchy = 'date'
+
+@admin.register(MonthlyLedger)
+class MonthlyLedgerAdmin(admin.ModelAdmin):
+    list_display = (
+        'customer', 'year', 'month', 'total_ml', 'entry_count', 'amount', 'price_per_litre',
+        'paid', 'billed_to_date', 'paid_to_date', 'updated_at',
+    )
+    list_filter = ('year', 'month')
+    search_fields = ('customer__name',)
+    list_select_related = ('customer',)
+
+    # maintained from MilkEntry and Payment changes; use `manage.py reconcile_balances` to fix drift
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ('at', 'user', 'action', 'model', 'object_id', 'changes')
+    list_filter = ('model', 'action')
+    search_fields = ('=object_id',)
+    list_select_related = ('user',)
+    date_hierarchy = 'at'
+
+    # append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(BillJob)
+class BillJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'customer', 'year', 'month', 'status', 'attempts', 'finished_at', 'expires_at')
+    list_filter = ('status',)
+    search_fields = ('customer__name',)
+    list_select_related = ('customer',)
+
+    # written by the bill worker; expired jobs are removed by it too
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
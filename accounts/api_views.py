@@ -1,10 +1,112 @@
-from rest_framework.decorators import api_view, permission_classes
+import hashlib
+
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
 from decimal import Decimal
 
-from .models import Customer, MilkEntry
+from . import bulk, deletion, sync
+from .customers import get_or_create_by_name
+from .models import Customer, IdempotencyKey, MilkEntry, SyncTombstone
+from .pagination import DeletedCursorPagination, UpdatedCursorPagination
+from .parsers import NDJSONParser
+from .pricing import unit_price
+
+CUSTOMER_FIELDS = ('id', 'name', 'balance_amount', 'created_at', 'updated_at')
+ENTRY_FIELDS = ('id', 'customer_id', 'date', 'quantity_ml', 'unit_price', 'created_at', 'updated_at')
+TOMBSTONE_FIELDS = ('id', 'kind', 'object_id', 'uuid', 'deleted_at')
+
+
+def _updated_since(request):
+    """Optional ?updated_since= ISO datetime (naive values are local time); raises ValueError."""
+    raw = request.query_params.get('updated_since')
+    if not raw:
+        return None
+    value = parse_datetime(raw)
+    if value is None:
+        raise ValueError("updated_since must be an ISO 8601 datetime")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _changed_rows(request, queryset, fields, field='updated_at', paginator_class=UpdatedCursorPagination):
+    """One cursor page of queryset.values(*fields), limited to ?updated_since= on `field`."""
+    try:
+        since = _updated_since(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if since is not None:
+        # >= so rows saved in the same instant as the last sync are not lost
+        queryset = queryset.filter(**{f'{field}__gte': since})
+    paginator = paginator_class()
+    page = paginator.paginate_queryset(queryset.values(*fields), request)
+    return paginator.get_paginated_response(page)
+
+
+@gzip_page
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def list_customers(request):
+    """
+    Customers as plain rows, oldest change first, in cursor pages.
+
+    Pass ?updated_since= with the updated_at of the last row seen to
+    fetch only customers changed since, and follow "next" until it is
+    null. Deleted customers and entries are not listed here; fetch
+    list_deleted with the same ?updated_since= to drop them.
+    """
+    return _changed_rows(request, Customer.objects.all(), CUSTOMER_FIELDS)
+
+
+@gzip_page
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def list_entries(request):
+    """Milk entries as plain rows, like list_customers; ?customer= limits them to one customer."""
+    entries = MilkEntry.objects.filter(customer__deleted_at__isnull=True).annotate(unit_price=unit_price())
+    customer_id = request.query_params.get('customer')
+    if customer_id:
+        if not customer_id.isdigit():
+            return Response({"error": "customer must be an id"}, status=status.HTTP_400_BAD_REQUEST)
+        entries = entries.filter(customer_id=customer_id)
+    return _changed_rows(request, entries, ENTRY_FIELDS)
+
+
+@gzip_page
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def list_deleted(request):
+    """
+    Tombstones of deleted customers and entries, like list_customers but
+    ordered on deleted_at, which ?updated_since= also filters on.
+    ?kind=customer|entry limits them to one kind. A deleted customer's
+    entries have no tombstones of their own.
+    """
+    tombstones = SyncTombstone.objects.all()
+    kind = request.query_params.get('kind')
+    if kind:
+        if kind not in (SyncTombstone.CUSTOMER, SyncTombstone.ENTRY):
+            return Response({"error": "kind must be customer or entry"}, status=status.HTTP_400_BAD_REQUEST)
+        tombstones = tombstones.filter(kind=kind)
+    return _changed_rows(
+        request, tombstones, TOMBSTONE_FIELDS, field='deleted_at', paginator_class=DeletedCursorPagination,
+    )
+
+
+@csrf_exempt
+def entries(request):
+    """GET lists entries, anything else goes to create_entry; both check auth and CSRF themselves."""
+    if request.method == 'GET':
+        return list_entries(request)
+    return create_entry(request)
 
 
 @api_view(["POST"])
@@ -28,18 +130,19 @@ def create_entry(request):
         if not customer:
             return Response({"error": "Invalid customer_id"}, status=400)
     elif customer_name:
-        customer, _ = Customer.objects.get_or_create(name=customer_name.strip())
+        customer, _ = get_or_create_by_name(customer_name)
     else:
         return Response(
             {"error": "customer_id or customer_name required"},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    entry = MilkEntry.objects.create(
-        customer=customer,
-        quantity_ml=int(quantity_ml),
-        date=date
-    )
+    with transaction.atomic():
+        entry = MilkEntry.objects.create(
+            customer=customer,
+            quantity_ml=int(quantity_ml),
+            date=date
+        )
 
     return Response({
         "message": "Entry created",
@@ -57,5 +160,145 @@ def delete_entry(request, entry_id):
     if not entry:
         return Response({"error": "Entry not found"}, status=404)
 
-    entry.delete()
+    deletion.delete_entries([entry])
     return Response({"message": "Entry deleted"})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def bulk_create_entries(request):
+    """
+    Create many entries at once from a JSON array (or {"entries": [...]})
+    or an NDJSON body. Each row takes the same fields as create_entry.
+
+    Send an Idempotency-Key header to make retries safe: a repeated key
+    returns the stored response instead of inserting the rows again.
+    Keys are per user, and reusing one for a different request is a 422.
+    With ?upsert=1 rows are keyed on (customer, date) and update that
+    day's existing entry instead of adding a second one.
+    """
+    key = request.headers.get('Idempotency-Key', '').strip()[:100]
+    request_hash = ''
+    if key:
+        # read before request.data consumes the body
+        request_hash = _request_hash(request)
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if stored:
+            return _replay(stored, request_hash)
+
+    rows = request.data
+    if isinstance(rows, dict):
+        rows = rows.get('entries')
+    if not isinstance(rows, list) or not rows:
+        return Response(
+            {"error": "Expected a non-empty list of entries"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    upsert = request.query_params.get('upsert') in ('1', 'true')
+    try:
+        chunk_size = int(request.query_params.get('chunk_size', bulk.DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return Response({"error": "chunk_size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        with transaction.atomic():
+            results, customers_created = bulk.import_entries(rows, chunk_size=chunk_size, upsert=upsert)
+            statuses = [r['status'] for r in results]
+            saved = len(statuses) - statuses.count('error')
+            body = {
+                "created": statuses.count('created'),
+                "updated": statuses.count('updated'),
+                "failed": statuses.count('error'),
+                "customers_created": customers_created,
+                "results": results,
+            }
+            if saved and saved == len(results):
+                code = status.HTTP_201_CREATED
+            elif saved:
+                code = status.HTTP_207_MULTI_STATUS
+            else:
+                code = status.HTTP_400_BAD_REQUEST
+            if key:
+                IdempotencyKey.objects.create(
+                    user=request.user, key=key, request_hash=request_hash,
+                    endpoint='entries/bulk', status_code=code, response=body,
+                )
+    except IntegrityError:
+        # a concurrent request with the same key won; return its result
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key).first() if key else None
+        if stored is None:
+            raise
+        return _replay(stored, request_hash)
+
+    return Response(body, status=code)
+
+
+def _request_hash(request):
+    digest = hashlib.sha256(request.META.get('QUERY_STRING', '').encode())
+    digest.update(b'\n')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        return Response(
+            {"error": "Idempotency-Key was already used for a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def sync_push(request):
+    """
+    Apply entries changed offline on a handset: a JSON array (or
+    {"entries": [...]}) or NDJSON of {uuid, customer_id, date,
+    quantity_ml, modified_at[, deleted]}. Safe to retry; see accounts.sync.
+    """
+    rows = request.data
+    if isinstance(rows, dict):
+        rows = rows.get('entries')
+    if not isinstance(rows, list) or not rows:
+        return Response({"error": "Expected a non-empty list of entries"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > sync.MAX_PUSH_ROWS:
+        return Response(
+            {"error": f"At most {sync.MAX_PUSH_ROWS} entries per push"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    results = sync.push(rows)
+    statuses = [r['status'] for r in results]
+    failed = statuses.count('error')
+    body = {status_name: statuses.count(status_name) for status_name in ('created', 'updated', 'deleted', 'unchanged', 'stale')}
+    body.update(failed=failed, results=results)
+    if not failed:
+        code = status.HTTP_200_OK
+    elif failed < len(results):
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return Response(body, status=code)
+
+
+@gzip_page
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def sync_pull(request):
+    """
+    Server changes since ?checkpoint= (omit it for the first sync):
+    customers, entries and deletions, plus the next checkpoint. Pull
+    again at once while has_more is true.
+    """
+    try:
+        limit = min(int(request.query_params.get('limit', sync.PULL_LIMIT)), sync.PULL_LIMIT)
+        changes = sync.pull(request.query_params.get('checkpoint'), limit=max(1, limit))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(changes)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # metrics hooks every new database connection, so load it before any is opened
+        from . import metrics, signals  # noqa: F401
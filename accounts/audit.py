@@ -0,0 +1,134 @@
+"""
+Append-only audit log, written in batches.
+
+record() does not touch the database: once the surrounding transaction
+commits, the change is appended to the current request's buffer (or,
+outside requests, the thread's). The buffer is written with one bulk INSERT when the request finishes (after the
+response has been sent) or as soon as it holds AUDIT_FLUSH_SIZE records,
+so a bulk import adds a few INSERTs rather than one per row. Changes
+rolled back with their transaction are never logged.
+
+AuditUserMiddleware starts the buffer and remembers the request, so
+records name the user who made the change. Both are context variables:
+an async view's queries, and the commits that buffer its records, run on
+another thread than the view itself.
+"""
+import atexit
+import contextvars
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import AuditLog
+
+FLUSH_SIZE = getattr(settings, 'AUDIT_FLUSH_SIZE', 500)
+
+logger = logging.getLogger(__name__)
+
+_request = contextvars.ContextVar('audit_request', default=None)
+_records = contextvars.ContextVar('audit_records', default=None)
+
+
+def _buffer():
+    records = _records.get()
+    if records is None:
+        records = []
+        _records.set(records)
+    return records
+
+
+def _user_id():
+    request = _request.get()
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def entry_fields(entry):
+    """The audited fields of a MilkEntry."""
+    return {'customer_id': entry.customer_id, 'date': entry.date, 'quantity_ml': entry.quantity_ml}
+
+
+def record(model, object_id, action, changes=None):
+    """Log one change to `model` ('customer', 'entry', ...) once the transaction commits."""
+    record_many(model, action, [(object_id, changes)])
+
+
+def record_many(model, action, changes):
+    """Log the same action for many objects; changes is [(object_id, changes_dict), ...]."""
+    if not changes:
+        return
+    user_id = _user_id()
+    now = timezone.now()
+    records = [
+        AuditLog(at=now, user_id=user_id, model=model, object_id=object_id, action=action, changes=data or {})
+        for object_id, data in changes
+    ]
+
+    def buffer():
+        pending = _buffer()
+        pending.extend(records)
+        if len(pending) >= FLUSH_SIZE:
+            flush()
+
+    transaction.on_commit(buffer)
+
+
+def flush():
+    """Write the request's (or thread's) buffered records. Returns how many were written."""
+    records = _buffer()
+    if not records:
+        return 0
+    pending = records[:]
+    # emptied in place: every context copied from the request's shares this list
+    records.clear()
+    try:
+        AuditLog.objects.bulk_create(pending, batch_size=FLUSH_SIZE)
+    except Exception:
+        # never fail the request that made the change; the rows are in the log output
+        logger.exception("Could not write %d audit records: %r", len(pending), [
+            (r.model, r.object_id, r.action, r.changes) for r in pending
+        ])
+        return 0
+    return len(pending)
+
+
+@receiver(request_finished)
+def flush_after_request(sender, **kwargs):
+    _request.set(None)
+    flush()
+
+
+# management commands and scripts have no request_finished
+atexit.register(flush)
+
+
+def _start(request):
+    _request.set(request)
+    # a new list, not cleared: the previous request's may still be flushing
+    _records.set([])
+
+
+class AuditUserMiddleware:
+    """Makes the current request's user available to record()."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _start(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        _start(request)
+        return await self.get_response(request)
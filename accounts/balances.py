@@ -0,0 +1,121 @@
+"""
+Customer balances read from the running totals in MonthlyLedger.
+
+Every ledger row carries billed_to_date (the opening balance plus all
+bills up to and including its month) and paid_to_date, kept current by
+accounts.ledger in the same transaction as the entry or payment. The
+balance at the end of any month is therefore the customer's latest row
+at or before that month: one lookup on the (customer, year, month)
+unique index, however long the history.
+
+Ageing assumes payments settle the oldest bills first, so whatever is
+still unpaid from bills older than N months is billed_to_date as of N
+months ago minus everything paid since the start.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import MonthlyLedger
+
+BILLED_FIELD = DecimalField(max_digits=16, decimal_places=4)
+PAID_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+# (label, months back): bills of the current month are "current", and so on
+AGEING_BUCKETS = (
+    ('current', 0),
+    ('1_month', 1),
+    ('2_months', 2),
+    ('3_months_plus', 3),
+)
+
+
+def _shift(year, month, months_back):
+    index = year * 12 + month - 1 - months_back
+    return index // 12, index % 12 + 1
+
+
+def _as_of(year, month, field, output_field, default):
+    """Correlated running total `field` of the customer's last ledger row at or before the month."""
+    row = (
+        MonthlyLedger.objects.filter(customer=OuterRef('pk'))
+        .filter(Q(year__lt=year) | Q(year=year, month__lte=month))
+        .order_by('-year', '-month')
+        .values(field)[:1]
+    )
+    return Coalesce(Subquery(row, output_field=output_field), default, output_field=output_field)
+
+
+def _month(year, month):
+    if year is None:
+        today = timezone.localdate()
+        return today.year, today.month
+    return year, month
+
+
+def outstanding(year=None, month=None):
+    """Expression for a customer's balance at the end of the month (default: the current one)."""
+    year, month = _month(year, month)
+    opening = Coalesce('balance_amount', Value(Decimal(0)), output_field=BILLED_FIELD)
+    return ExpressionWrapper(
+        _as_of(year, month, 'billed_to_date', BILLED_FIELD, opening)
+        - _as_of(year, month, 'paid_to_date', PAID_FIELD, Value(Decimal(0))),
+        output_field=BILLED_FIELD,
+    )
+
+
+def with_balances(customers, year=None, month=None):
+    """
+    Annotate a Customer queryset with balances at the end of the month
+    (default: the current one): billed_to_date, paid_to_date,
+    carried_billed/carried_paid (at the end of the month before) and
+    billed_<n> for the older ageing boundaries. Pass each customer through
+    balance() and ageing() to read them.
+    """
+    year, month = _month(year, month)
+    opening = Coalesce('balance_amount', Value(Decimal(0)), output_field=BILLED_FIELD)
+    previous = _shift(year, month, 1)
+    annotations = {
+        'billed_to_date': _as_of(year, month, 'billed_to_date', BILLED_FIELD, opening),
+        'paid_to_date': _as_of(year, month, 'paid_to_date', PAID_FIELD, Value(Decimal(0))),
+        'carried_billed': _as_of(*previous, 'billed_to_date', BILLED_FIELD, opening),
+        'carried_paid': _as_of(*previous, 'paid_to_date', PAID_FIELD, Value(Decimal(0))),
+    }
+    # the previous month's running total (carried_billed) is the 1-month boundary
+    for _, months_back in AGEING_BUCKETS[2:]:
+        annotations[f'billed_{months_back}'] = _as_of(
+            *_shift(year, month, months_back), 'billed_to_date', BILLED_FIELD, opening,
+        )
+    return customers.annotate(**annotations)
+
+
+def balance(customer):
+    """Outstanding at the end of the month of a with_balances() customer."""
+    return round(Decimal(customer.billed_to_date) - Decimal(customer.paid_to_date), 2)
+
+
+def carried_forward(customer):
+    """Outstanding brought into the month of a with_balances() customer."""
+    return round(Decimal(customer.carried_billed) - Decimal(customer.carried_paid), 2)
+
+
+def ageing(customer):
+    """
+    {bucket: amount} of a with_balances() customer's outstanding balance,
+    split by the age of the bills it is made of. A credit (negative
+    balance) is reported as a negative 'current' amount.
+    """
+    paid = Decimal(customer.paid_to_date)
+    billed = {0: Decimal(customer.billed_to_date), 1: Decimal(customer.carried_billed)}
+    for _, months_back in AGEING_BUCKETS[2:]:
+        billed[months_back] = Decimal(getattr(customer, f'billed_{months_back}'))
+    # unpaid[n]: what is still unpaid of the bills from n or more months ago
+    unpaid = {n: max(total - paid, Decimal(0)) for n, total in billed.items()}
+    unpaid[0] = billed[0] - paid
+    unpaid[len(AGEING_BUCKETS)] = Decimal(0)
+    return {
+        label: round(unpaid[months_back] - unpaid[months_back + 1], 2)
+        for label, months_back in AGEING_BUCKETS
+    }
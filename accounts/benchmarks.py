@@ -0,0 +1,437 @@
+"""
+Seeded benchmark data and a benchmark run of the hot views.
+
+seed() fills an empty database with a realistic dataset (by default
+5,000 customers with three years of daily deliveries, monthly payments
+and a yearly price rise) using bulk_create in batches, then rebuilds the
+ledger once. Point DATABASES at a scratch database before seeding.
+
+run() requests each view in CASES with the Django test client: a few
+timed runs, then one run under CaptureQueriesContext and tracemalloc for
+the query count and peak Python memory. Each case has a query budget, so
+an N+1 regression shows up as a failed benchmark rather than a slow page
+in production.
+
+pdf_render() times generate_bill_pdf alone on synthetic bills of a given
+number of rows, without touching the database.
+
+load_test() sends concurrent requests to a running server, e.g. gunicorn
+with gunicorn.conf.py, for throughput under load rather than the time of
+one request. It logs in by writing a session for the benchmark user to
+the database, so the server must use the same database.
+server_modes() starts gunicorn.conf.py once per SERVER_MODE (WSGI with
+gthread workers, ASGI with uvicorn workers) and load-tests each.
+"""
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ledger, pricing
+from .models import Customer, MilkEntry, MonthlyLedger, Payment, PriceSchedule, customer_name_key
+from .pdf_generation import generate_bill_pdf
+
+FIRST_NAMES = (
+    'Aarav', 'Anita', 'Arjun', 'Deepa', 'Farhan', 'Geeta', 'Harish', 'Imran', 'Jaya', 'Kiran',
+    'Lakshmi', 'Manoj', 'Meena', 'Nikhil', 'Pooja', 'Rahul', 'Rekha', 'Sanjay', 'Sunita', 'Vijay',
+)
+LAST_NAMES = (
+    'Patil', 'Sharma', 'Iyer', 'Khan', 'Reddy', 'Joshi', 'Nair', 'Gupta', 'Deshmukh', 'Singh',
+)
+# usual daily quantity in ml, weighted towards a litre
+USUAL_QUANTITIES = (500, 1000, 1000, 1000, 1500, 2000)
+SKIP_CHANCE = 0.05
+CHANGE_CHANCE = 0.1
+OVERRIDE_CHANCE = 0.05
+MISSED_PAYMENT_CHANCE = 0.1
+YEARLY_PRICE_RISE = Decimal(2)
+
+BENCHMARK_USER = 'benchmark'
+
+# entry rows of the bills timed by pdf_render(): a month, about three years, about 27 years
+PDF_ROW_COUNTS = (30, 1000, 10000)
+# one page object per page; the page tree is /Type /Pages
+PDF_PAGE = re.compile(rb'/Type\s*/Page\b')
+
+# args name the URL arguments and the query string may use {customer}, {year} and {month}, filled in by run()
+Case = namedtuple('Case', 'name url_name args query budget')
+
+CASES = (
+    Case('home', 'accounts:home', (), '', 5),
+    Case('customer_list', 'accounts:customer_list', (), '', 5),
+    Case('customer_list_by_due', 'accounts:customer_list', (), 'sort=-due', 5),
+    Case('customer_detail', 'accounts:customer_detail', ('customer',), '', 8),
+    Case('monthly_summary', 'accounts:monthly_summary', (), 'month={year}-{month:02d}', 6),
+    Case('monthly_summary_year', 'accounts:monthly_summary', (), 'year={year}', 6),
+    Case('bill_pdf_month', 'accounts:bill_pdf_month', ('customer', 'year', 'month'), '', 8),
+    Case('bill_pdf_all', 'accounts:bill_pdf', ('customer',), '', 8),
+    Case('api_customers', 'accounts:api_customers', (), '', 4),
+    Case('api_entries', 'accounts:api_entries', (), 'customer={customer}', 4),
+    Case('api_sync_pull', 'accounts:api_sync_pull', (), '', 6),
+)
+
+# SERVER_MODE values of gunicorn.conf.py compared by server_modes()
+SERVER_MODES = ('wsgi', 'asgi')
+
+# requested in turn by each load_test() thread: mostly pages, with a bill PDF among them
+LOAD_CASES = ('home', 'customer_list', 'customer_detail', 'bill_pdf_month', 'api_entries')
+
+
+def _months(start, end):
+    day = start.replace(day=1)
+    while day <= end:
+        yield day
+        day = (day + timedelta(days=32)).replace(day=1)
+
+
+def seed(customers=5000, years=3, end=None, batch_size=10000, random_seed=0, log=None):
+    """
+    Generate the dataset and rebuild the ledger. Returns a dict of counts.
+
+    Deliveries run daily for `years` years up to `end` (default today);
+    each customer skips some days, now and then changes quantity, and
+    pays last month's bill early in the month, occasionally missing one.
+    """
+    rng = random.Random(random_seed)
+    end = end or timezone.localdate()
+    start = end - timedelta(days=365 * years - 1)
+    log = log or (lambda message: None)
+
+    base_price = pricing.DEFAULT_PRICE
+    prices = [
+        PriceSchedule(effective_from=month, price_per_litre=base_price + YEARLY_PRICE_RISE * index)
+        for index, month in enumerate(
+            day for day in _months(start, end) if day == start.replace(day=1) or day.month == 4
+        )
+    ]
+    PriceSchedule.objects.bulk_create(prices, ignore_conflicts=True)
+
+    names = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} #{number}" for number in range(1, customers + 1)]
+    new_customers = Customer.objects.bulk_create([
+        Customer(
+            name=name,
+            name_key=customer_name_key(name),
+            balance_amount=Decimal(rng.choice((0, 0, 0, 250, 500))),
+        )
+        for name in names
+    ], batch_size=batch_size)
+    if new_customers[0].pk is None:
+        # backends that do not return ids from bulk inserts
+        new_customers = list(Customer.objects.order_by('-id')[:customers])[::-1]
+    log(f"{len(new_customers)} customers")
+
+    overrides = [
+        PriceSchedule(customer=customer, effective_from=start, price_per_litre=base_price - 2)
+        for customer in new_customers if rng.random() < OVERRIDE_CHANCE
+    ]
+    PriceSchedule.objects.bulk_create(overrides, batch_size=batch_size)
+    override_ids = {price.customer_id for price in overrides}
+
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    default_price = {
+        day: max((price.price_per_litre for price in prices if price.effective_from <= day), default=base_price)
+        for day in days
+    }
+
+    entries, payments = [], []
+    counts = {'customers': len(new_customers), 'entries': 0, 'payments': 0, 'prices': len(prices) + len(overrides)}
+
+    def flush_entries():
+        MilkEntry.objects.bulk_create(entries, batch_size=batch_size)
+        counts['entries'] += len(entries)
+        entries.clear()
+
+    for number, customer in enumerate(new_customers, 1):
+        usual = rng.choice(USUAL_QUANTITIES)
+        month_amount = Decimal(0)
+        for day in days:
+            if day.day == 1 and month_amount:
+                if rng.random() >= MISSED_PAYMENT_CHANCE:
+                    payments.append(Payment(
+                        customer_id=customer.pk,
+                        date=day + timedelta(days=rng.randint(2, 9)),
+                        amount=max((month_amount / 10).quantize(Decimal(1)) * 10, Decimal(10)),
+                        note='seeded',
+                    ))
+                month_amount = Decimal(0)
+            if rng.random() < SKIP_CHANCE:
+                continue
+            quantity = usual + rng.choice((-500, 500)) if rng.random() < CHANGE_CHANCE else usual
+            quantity = max(quantity, 0)
+            entries.append(MilkEntry(customer_id=customer.pk, date=day, quantity_ml=quantity))
+            price = base_price - 2 if customer.pk in override_ids else default_price[day]
+            month_amount += Decimal(quantity) * price / 1000
+            if len(entries) >= batch_size:
+                flush_entries()
+        if number % 500 == 0:
+            log(f"{number} customers, {counts['entries'] + len(entries)} entries")
+    flush_entries()
+    # payments made after `end` have not happened yet
+    payments = [payment for payment in payments if payment.date <= end]
+    Payment.objects.bulk_create(payments, batch_size=batch_size)
+    counts['payments'] = len(payments)
+    log(f"{counts['entries']} entries, {counts['payments']} payments; rebuilding the ledger")
+
+    counts['ledger_rows'] = ledger.rebuild(batch_size=batch_size)
+    return counts
+
+
+def _benchmark_client():
+    user, created = get_user_model().objects.get_or_create(
+        username=BENCHMARK_USER, defaults={'is_staff': True},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _target():
+    """(customer, year, month): the first customer and its latest month with entries."""
+    customer = Customer.objects.order_by('id').first()
+    if customer is None:
+        raise ValueError("No customers to benchmark; run seed_benchmark_data first.")
+    latest = (
+        MonthlyLedger.objects.filter(customer=customer, entry_count__gt=0)
+        .order_by('-year', '-month')
+        .values_list('year', 'month')
+        .first()
+    )
+    today = timezone.localdate()
+    return customer, *(latest or (today.year, today.month))
+
+
+def _path(case, values):
+    path = reverse(case.url_name, args=[values[arg] for arg in case.args])
+    if case.query:
+        path += '?' + case.query.format(**values)
+    return path
+
+
+def run(repeat=5, only=None):
+    """
+    Benchmark every case (or the names in `only`). Returns a list of
+    result dicts: name, path, status, bytes, queries, budget,
+    over_budget, first/min/median/max wall time in ms and peak_memory_kb.
+    """
+    customer, year, month = _target()
+    values = {'customer': customer.pk, 'year': year, 'month': month}
+    client = _benchmark_client()
+    results = []
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        path = _path(case, values)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        results.append({
+            'name': case.name,
+            'path': path,
+            'status': response.status_code,
+            'bytes': len(content),
+            'queries': len(queries),
+            'budget': case.budget,
+            'over_budget': len(queries) > case.budget,
+            # the first run may fill caches (e.g. the bill PDF cache)
+            'first_ms': round(timings[0], 2) if timings else None,
+            'min_ms': round(min(timings), 2) if timings else None,
+            'median_ms': round(statistics.median(timings), 2) if timings else None,
+            'max_ms': round(max(timings), 2) if timings else None,
+            'peak_memory_kb': round(peak / 1024, 1),
+        })
+    return results
+
+
+def _bill_rows(count, end):
+    """count daily (date, quantity_ml, unit_price) rows ending at `end`, with one price rise halfway."""
+    start = end - timedelta(days=count - 1)
+    prices = (pricing.DEFAULT_PRICE, pricing.DEFAULT_PRICE + YEARLY_PRICE_RISE)
+    return [
+        (start + timedelta(days=offset), USUAL_QUANTITIES[offset % len(USUAL_QUANTITIES)], prices[offset * 2 >= count])
+        for offset in range(count)
+    ]
+
+
+def pdf_render(row_counts=PDF_ROW_COUNTS, repeat=3):
+    """
+    Time generate_bill_pdf on bills of each number of rows. Returns a
+    list of result dicts: rows, pages, bytes and min/median/max ms.
+    """
+    customer = Customer(name="Benchmark Customer", balance_amount=Decimal(250))
+    results = []
+    for count in row_counts:
+        rows = _bill_rows(count, timezone.localdate())
+        total_ml = sum(qty for _, qty, _ in rows)
+        total_amount = sum(qty * price for _, qty, price in rows) / 1000
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pdf = generate_bill_pdf(
+                customer=customer,
+                rows=rows,
+                total_ml=total_ml,
+                total_litres=round(Decimal(total_ml) / 1000, 2),
+                total_amount=round(total_amount, 2),
+                paid=Decimal(0),
+            ).getvalue()
+            timings.append((time.perf_counter() - started) * 1000)
+        results.append({
+            'rows': count,
+            'pages': len(PDF_PAGE.findall(pdf)),
+            'bytes': len(pdf),
+            'min_ms': round(min(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'max_ms': round(max(timings), 2),
+        })
+    return results
+
+
+def dataset():
+    """Row counts of the benchmarked database, stored with the results."""
+    return {
+        'customers': Customer.objects.count(),
+        'entries': MilkEntry.objects.count(),
+        'payments': Payment.objects.count(),
+        'ledger_rows': MonthlyLedger.objects.count(),
+        'database': connection.vendor,
+    }
+
+
+def load_test(base_url, concurrency=8, duration=10, only=None, timeout=60):
+    """
+    Request the LOAD_CASES (or the case names in `only`) from the server
+    at base_url from `concurrency` threads for `duration` seconds, each
+    thread going round the cases from a different one. Returns a dict:
+    requests, errors, requests_per_second and per-path results
+    (requests, errors, p50/p95/max ms).
+    """
+    customer, year, month = _target()
+    values = {'customer': customer.pk, 'year': year, 'month': month}
+    urls = [
+        base_url.rstrip('/') + _path(case, values)
+        for case in CASES if case.name in (only or LOAD_CASES)
+    ]
+    session = _benchmark_client().cookies[settings.SESSION_COOKIE_NAME].value
+    headers = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={session}'}
+
+    def worker(offset):
+        timings = []  # (url, ms, ok)
+        index = offset
+        while time.perf_counter() < deadline:
+            url = urls[index % len(urls)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+                    response.read()
+                    # a redirect to the login page means the session was not accepted
+                    ok = response.status == 200 and response.geturl() == url
+            except OSError:
+                ok = False
+            timings.append((url, (time.perf_counter() - started) * 1000, ok))
+        return timings
+
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(concurrency) as pool:
+        timings = [timing for thread in pool.map(worker, range(concurrency)) for timing in thread]
+    elapsed = time.perf_counter() - started
+
+    by_url = defaultdict(list)
+    for url, ms, ok in timings:
+        by_url[url].append((ms, ok))
+    paths = []
+    for url in urls:
+        ms = sorted(ms for ms, _ in by_url[url])
+        paths.append({
+            'path': url[len(base_url.rstrip('/')):],
+            'requests': len(ms),
+            'errors': sum(not ok for _, ok in by_url[url]),
+            'p50_ms': round(_percentile(ms, 0.5), 1) if ms else None,
+            'p95_ms': round(_percentile(ms, 0.95), 1) if ms else None,
+            'max_ms': round(ms[-1], 1) if ms else None,
+        })
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 2),
+        'requests': len(timings),
+        'errors': sum(not ok for _, _, ok in timings),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'paths': paths,
+    }
+
+
+def _wait_for_server(url, timeout):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except urllib.error.HTTPError:
+            # any response means it is serving
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise ValueError(f"No server answered at {url} within {timeout}s.")
+            time.sleep(0.25)
+
+
+def server_modes(port=8765, concurrency=8, duration=10, only=None, startup_timeout=30):
+    """
+    {mode: load_test() result} for each of SERVER_MODES: gunicorn is
+    started with gunicorn.conf.py, this process's settings and
+    SERVER_MODE=mode on 127.0.0.1:port, load-tested and stopped.
+    """
+    base_url = f'http://127.0.0.1:{port}'
+    results = {}
+    for mode in SERVER_MODES:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+             '--bind', f'127.0.0.1:{port}', '--access-logfile', '/dev/null'],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, SERVER_MODE=mode),
+        )
+        try:
+            _wait_for_server(base_url + reverse('login'), startup_timeout)
+            results[mode] = load_test(base_url, concurrency=concurrency, duration=duration, only=only)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+    return results
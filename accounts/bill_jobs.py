@@ -0,0 +1,223 @@
+"""
+Bill PDFs rendered in the background, with the queue in the database.
+
+A request enqueues a BillJob and gets its id back at once; the page
+polls the job's status and downloads the PDF once it is done, so a long
+all-time bill no longer holds a web worker for the whole render.
+`manage.py run_bill_worker` claims queued jobs and renders them in a
+process pool. No broker is needed: a job is claimed with an UPDATE that
+only matches while it is still queued, so several workers can share the
+database.
+
+A finished PDF is copied into default_storage under BILL_JOB_DIR and
+kept for BILL_JOB_TTL_SECONDS; the worker deletes expired jobs and their
+files, and trims the bill PDF cache (accounts.pdf_cache), in its sweep. A job that has been running for longer than JOB_TIMEOUT (its
+worker died) is queued again, up to MAX_ATTEMPTS. queue_health() tells
+the web health check when queued jobs are no longer being picked up.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+
+from . import pdf_cache
+from .billing import Bill
+from .models import BillJob, Customer
+
+JOB_DIR = getattr(settings, 'BILL_JOB_DIR', 'bill_jobs')
+TTL = timedelta(seconds=getattr(settings, 'BILL_JOB_TTL_SECONDS', 3600))
+JOB_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+# a queued job waiting this long with no job started meanwhile means no worker is running
+QUEUE_STALE_AFTER = timedelta(seconds=getattr(settings, 'BILL_JOB_QUEUE_STALE_SECONDS', 300))
+# seconds between sweeps for stale and expired jobs
+SWEEP_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(bill, user=None):
+    """
+    The job rendering `bill` (a billing.Bill): an unexpired job for the
+    same bill content if there is one, else a new queued job.
+    """
+    now = timezone.now()
+    existing = (
+        BillJob.objects.filter(
+            key=bill.key, status__in=(BillJob.QUEUED, BillJob.RUNNING, BillJob.DONE), expires_at__gt=now,
+        )
+        .order_by('-created_at')
+        .first()
+    )
+    if existing is not None:
+        return existing
+    return BillJob.objects.create(
+        customer=bill.customer,
+        year=bill.year,
+        month=bill.month,
+        key=bill.key,
+        requested_by=user if user is not None and user.is_authenticated else None,
+        filename=f"{bill.filename}.pdf",
+        expires_at=now + TTL,
+    )
+
+
+def claim(limit):
+    """Mark up to `limit` of the oldest queued jobs running. Returns their ids."""
+    if limit <= 0:
+        return []
+    candidates = list(
+        BillJob.objects.filter(status=BillJob.QUEUED)
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = []
+    for pk in candidates:
+        # another worker may have claimed it since the SELECT
+        taken = BillJob.objects.filter(pk=pk, status=BillJob.QUEUED).update(
+            status=BillJob.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        if taken:
+            claimed.append(pk)
+    return claimed
+
+
+def _finish(job_id, **fields):
+    now = timezone.now()
+    return BillJob.objects.filter(pk=job_id, status=BillJob.RUNNING).update(
+        finished_at=now, expires_at=now + TTL, **fields,
+    )
+
+
+def run_job(job_id):
+    """Render one claimed job (in a worker process). Returns the seconds it took."""
+    started = time.perf_counter()
+    job = BillJob.objects.get(pk=job_id)
+    try:
+        customer = Bill.customers(job.year, job.month).get(pk=job.customer_id)
+    except Customer.DoesNotExist:
+        _finish(job_id, status=BillJob.FAILED, error="The customer has been deleted.")
+        return time.perf_counter() - started
+    bill = Bill(customer, job.year, job.month)
+    name = default_storage.save(f"{JOB_DIR}/{job.pk}.pdf", ContentFile(bill.render()))
+    if not _finish(job_id, status=BillJob.DONE, file=name, filename=f"{bill.filename}.pdf", key=bill.key, error=''):
+        # requeued as stale while it rendered; the other run keeps its own file
+        default_storage.delete(name)
+    return time.perf_counter() - started
+
+
+def retry(job_id, error):
+    """Queue a failed job again, or mark it failed once it has used up MAX_ATTEMPTS."""
+    job = BillJob.objects.filter(pk=job_id, status=BillJob.RUNNING).first()
+    if job is None:
+        return
+    if job.attempts >= MAX_ATTEMPTS:
+        _finish(job_id, status=BillJob.FAILED, error=error[:1000])
+    else:
+        BillJob.objects.filter(pk=job_id, status=BillJob.RUNNING).update(status=BillJob.QUEUED, error=error[:1000])
+
+
+def requeue_stale():
+    """Retry jobs running for longer than JOB_TIMEOUT. Returns how many."""
+    stale = BillJob.objects.filter(status=BillJob.RUNNING, started_at__lt=timezone.now() - JOB_TIMEOUT)
+    job_ids = list(stale.values_list('pk', flat=True))
+    for job_id in job_ids:
+        retry(job_id, "Timed out; the worker may have stopped.")
+    return len(job_ids)
+
+
+def purge_expired():
+    """Delete expired jobs that are not running, and their PDFs. Returns how many."""
+    expired = BillJob.objects.filter(expires_at__lte=timezone.now()).exclude(status=BillJob.RUNNING)
+    jobs = list(expired.values_list('pk', 'file'))
+    for _, name in jobs:
+        if name:
+            default_storage.delete(name)
+    BillJob.objects.filter(pk__in=[pk for pk, _ in jobs]).delete()
+    return len(jobs)
+
+
+def queue_health():
+    """
+    {'queued': n, 'oldest_queued_seconds': s or None, 'stale': bool}. The
+    queue is stale when a job has been queued for longer than
+    QUEUE_STALE_AFTER and no job has started since then: a retried job
+    keeps its created_at, so its age alone does not mean the worker stopped.
+    """
+    now = timezone.now()
+    queued = BillJob.objects.filter(status=BillJob.QUEUED)
+    count = queued.count()
+    oldest = queued.order_by('created_at').values_list('created_at', flat=True).first()
+    stale = False
+    if oldest is not None and now - oldest > QUEUE_STALE_AFTER:
+        stale = not BillJob.objects.filter(started_at__gt=now - QUEUE_STALE_AFTER).exists()
+    return {
+        'queued': count,
+        'oldest_queued_seconds': int((now - oldest).total_seconds()) if oldest is not None else None,
+        'stale': stale,
+    }
+
+
+def work(workers=None, poll_interval=1.0, once=False, log=None):
+    """
+    Claim and render jobs in a pool of `workers` processes until
+    interrupted, or with `once` until the queue is empty. Returns the
+    number of jobs finished.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    log = log or logger.info
+    finished = 0
+    last_sweep = None
+    running = {}
+    # spawned workers open their own database connections, unlike forked
+    # ones that would share the sockets of this long-running parent; the
+    # initializer must not import models, so it is django.setup itself
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+        try:
+            while True:
+                if last_sweep is None or time.monotonic() - last_sweep >= SWEEP_INTERVAL:
+                    stale, expired, evicted = requeue_stale(), purge_expired(), pdf_cache.evict()
+                    if stale or expired or evicted:
+                        log(f"Requeued {stale} stale jobs, removed {expired} expired jobs "
+                            f"and {evicted} cached PDFs")
+                    last_sweep = time.monotonic()
+
+                for job_id in claim(workers - len(running)):
+                    running[pool.submit(run_job, job_id)] = job_id
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        seconds = future.result()
+                    except BrokenProcessPool:
+                        retry(job_id, "The render process died.")
+                        raise
+                    except Exception as exc:
+                        logger.exception("Bill job %s failed", job_id)
+                        retry(job_id, f"{type(exc).__name__}: {exc}")
+                    else:
+                        finished += 1
+                        log(f"Job {job_id} finished in {seconds:.2f}s")
+        finally:
+            # let another worker pick up what this one leaves unfinished
+            BillJob.objects.filter(pk__in=list(running.values()), status=BillJob.RUNNING).update(
+                status=BillJob.QUEUED, attempts=F('attempts') - 1,
+            )
+    return finished
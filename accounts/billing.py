@@ -0,0 +1,229 @@
+"""
+Bill rendering: one customer's bill (Bill), and month-end bills for many
+customers at once.
+
+For the month-end run all entries of the month are fetched with one
+query, priced in the database (accounts.pricing), grouped by customer and rendered with generate_bill_pdf in a process pool. Each
+finished PDF is written into a ZIP as soon as it is ready, together
+with a manifest.json holding per-bill timings.
+
+Async views render a Bill with arender(): the queries stay on the
+request's database thread and generate_bill_pdf runs in a pool of
+PDF_RENDER_THREADS threads, so a burst of bill downloads cannot take
+every thread the server has.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from decimal import Decimal
+from itertools import groupby
+from zipfile import ZIP_STORED, ZipFile
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from . import balances, pdf_cache, pricing
+from .models import Customer, MilkEntry
+from .pricing import unit_price
+from .pdf_generation import generate_bill_pdf
+from .periods import month_range
+
+PDF_RENDER_THREADS = getattr(settings, 'PDF_RENDER_THREADS', 2)
+
+_pdf_executor = ThreadPoolExecutor(max_workers=PDF_RENDER_THREADS, thread_name_prefix='bill-pdf')
+
+
+def bill_filename(customer, year=None, month=None):
+    name = (customer.name or f"customer_{customer.id}").replace(' ', '_')
+    if year and month:
+        return f"bill_{name}_{year}_{month:02d}"
+    return f"bill_{name}_all"
+
+
+class Bill:
+    """
+    One customer's bill for a month, or for all time when year and month
+    are None. Construction runs the cheap aggregates that identify the
+    rendered PDF (key, used as its ETag and cache key); render() lays it
+    out only when the cache does not have it.
+    """
+
+    def __init__(self, customer, year=None, month=None):
+        """customer must come from Bill.customers(year, month)."""
+        self.customer = customer
+        self.year = year
+        self.month = month
+        if year and month:
+            start, end = month_range(year, month)
+            self.entries = MilkEntry.objects.filter(
+                customer=customer, date__gte=start, date__lt=end,
+            ).order_by('date')
+            self.ledger_rows = customer.ledger.filter(year=year, month=month)
+            # the balance brought into the month is one ledger lookup
+            self.previous_balance = balances.carried_forward(customer)
+            self.period = f"{year}-{month:02d}"
+        else:
+            self.entries = MilkEntry.objects.filter(customer=customer).order_by('date')
+            self.ledger_rows = customer.ledger.all()
+            self.previous_balance = customer.balance_amount
+            self.period = 'all'
+        self.filename = bill_filename(customer, year, month)
+
+        # one cheap aggregate decides whether a cached render can be served
+        self.state = self.entries.aggregate(
+            last_updated=Max('updated_at'), count=Count('id'), total_ml=Sum('quantity_ml'),
+            amount=Sum(pricing.entry_amount()),
+        )
+        self.paid = self.ledger_rows.aggregate(paid=Sum('paid'))['paid'] or Decimal(0)
+        self.key = pdf_cache.bill_key(customer, self.period, self.state, balance=(self.previous_balance, self.paid))
+
+    @staticmethod
+    def customers(year=None, month=None):
+        """Queryset to look a bill's customer up in."""
+        if year and month:
+            return balances.with_balances(Customer.objects.all(), year, month)
+        return Customer.objects.all()
+
+    @property
+    def last_modified(self):
+        modified = [t for t in (self.state['last_updated'], self.customer.updated_at) if t]
+        return max(modified) if modified else None
+
+    def cached(self):
+        """The rendered PDF if it is in the cache, else None."""
+        return pdf_cache.get(self.key)
+
+    def pdf_arguments(self):
+        """generate_bill_pdf's keyword arguments; runs the bill's remaining queries."""
+        totals = self.ledger_rows.aggregate(total_ml=Sum('total_ml'), amount=Sum('amount'))
+        total_ml = totals['total_ml'] or 0
+        rows = list(
+            self.entries.annotate(unit_price=unit_price())
+            .values_list('date', 'quantity_ml', 'unit_price')
+        )
+        prices = {price for _, _, price in rows}
+        return {
+            'customer': self.customer,
+            'rows': rows,
+            'total_ml': total_ml,
+            'total_litres': round(Decimal(total_ml) / Decimal(1000), 2) if total_ml else Decimal(0),
+            'total_amount': round(totals['amount'] or Decimal(0), 2),
+            'price_per_litre': prices.pop() if len(prices) == 1 else None,
+            'year': self.year,
+            'month': self.month,
+            'previous_balance': self.previous_balance,
+            'paid': self.paid,
+        }
+
+    def render(self):
+        """The PDF bytes, rendered and cached unless the cache has them."""
+        pdf = pdf_cache.get(self.key)
+        if pdf is None:
+            pdf = _pdf_bytes(self.pdf_arguments())
+            pdf_cache.put(self.key, pdf)
+        return pdf
+
+    async def arender(self):
+        """render() for async views, with the layout done in the bounded PDF thread pool."""
+        pdf = await sync_to_async(pdf_cache.get)(self.key)
+        if pdf is None:
+            arguments = await sync_to_async(self.pdf_arguments)()
+            pdf = await sync_to_async(_pdf_bytes, thread_sensitive=False, executor=_pdf_executor)(arguments)
+            await sync_to_async(pdf_cache.put)(self.key, pdf)
+        return pdf
+
+
+def _pdf_bytes(arguments):
+    return generate_bill_pdf(**arguments).getvalue()
+
+
+def _render(customer, rows, year, month):
+    """
+    Render one bill in a worker process; rows are (date, quantity_ml,
+    unit_price) tuples and customer is annotated by balances.with_balances().
+    """
+    started = time.perf_counter()
+    total_ml = sum(qty for _, qty, _ in rows)
+    total_litres = round(Decimal(total_ml) / Decimal(1000), 2)
+    total_amount = round(sum((qty * Decimal(price) for _, qty, price in rows), Decimal(0)) / 1000, 2)
+    prices = {price for _, _, price in rows}
+    pdf = generate_bill_pdf(
+        customer=customer,
+        rows=rows,
+        total_ml=total_ml,
+        total_litres=total_litres,
+        total_amount=total_amount,
+        price_per_litre=prices.pop() if len(prices) == 1 else None,
+        year=year,
+        month=month,
+        previous_balance=balances.carried_forward(customer),
+        paid=Decimal(customer.paid_to_date) - Decimal(customer.carried_paid),
+    ).getvalue()
+    return {
+        'customer_id': customer.id,
+        'customer': customer.name,
+        'filename': f"{customer.id}_{bill_filename(customer, year, month)}.pdf",
+        'entries': len(rows),
+        'total_ml': total_ml,
+        'amount': str(total_amount),
+        'render_seconds': round(time.perf_counter() - started, 4),
+        'bytes': len(pdf),
+    }, pdf
+
+
+def month_bill_jobs(year, month, customer_ids=None):
+    """Yield (customer, [(date, quantity_ml, unit_price), ...]) for every customer with entries in the month."""
+    start, end = month_range(year, month)
+    entries = MilkEntry.objects.filter(date__gte=start, date__lt=end, customer__deleted_at__isnull=True)
+    if customer_ids is not None:
+        entries = entries.filter(customer_id__in=customer_ids)
+    rows = list(
+        entries.annotate(unit_price=unit_price())
+        .order_by('customer_id', 'date', 'id')
+        .values_list('customer_id', 'date', 'quantity_ml', 'unit_price')
+    )
+    customers = balances.with_balances(Customer.objects.all(), year, month).in_bulk({row[0] for row in rows})
+    for customer_id, group in groupby(rows, key=lambda row: row[0]):
+        yield customers[customer_id], [(day, qty, price) for _, day, qty, price in group]
+
+
+def generate_month_bills(year, month, output, customer_ids=None, workers=None):
+    """
+    Render the month's bills into a ZIP written to `output` (a path or
+    binary file object). Returns the manifest dict that is also stored
+    in the archive as manifest.json.
+    """
+    started = time.perf_counter()
+    jobs = list(month_bill_jobs(year, month, customer_ids))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    manifest = {
+        'year': year,
+        'month': month,
+        'generated_at': timezone.now().isoformat(),
+        'workers': workers,
+        'bills': [],
+    }
+
+    # spawned, not forked: this may run in a threaded web worker (the admin action), whose
+    # database connections and locks a fork would copy; the initializer must not import
+    # models, so it is django.setup itself
+    context = multiprocessing.get_context('spawn')
+    with ZipFile(output, 'w', compression=ZIP_STORED) as archive:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            futures = [
+                pool.submit(_render, customer, rows, year, month)
+                for customer, rows in jobs
+            ]
+            for future in as_completed(futures):
+                info, pdf = future.result()
+                archive.writestr(info['filename'], pdf)
+                manifest['bills'].append(info)
+        manifest['bills'].sort(key=lambda info: info['customer_id'])
+        manifest['total_seconds'] = round(time.perf_counter() - started, 4)
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    return manifest
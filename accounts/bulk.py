@@ -0,0 +1,215 @@
+"""
+Batched milk-entry writes shared by the bulk API and the route sheet.
+
+Customers are resolved with one query, missing ones are created in bulk
+and entries are inserted with bulk_create, so a sync of thousands of
+rows costs a handful of queries instead of one round trip per entry.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import audit, customers, ledger, stats
+from .models import Customer, MilkEntry, customer_name_key
+
+DEFAULT_CHUNK_SIZE = getattr(settings, 'BULK_ENTRY_CHUNK_SIZE', 500)
+MAX_CHUNK_SIZE = 5000
+
+
+class RowError(ValueError):
+    pass
+
+
+def _clean_row(row):
+    """Validate one payload row; returns (customer_id, customer_name, date, quantity_ml)."""
+    if not isinstance(row, dict):
+        raise RowError("row must be an object")
+
+    quantity_ml = row.get('quantity_ml')
+    raw_date = row.get('date')
+    if quantity_ml is None or raw_date is None:
+        raise RowError("quantity_ml and date are required")
+    try:
+        quantity_ml = int(quantity_ml)
+    except (TypeError, ValueError):
+        raise RowError("quantity_ml must be an integer")
+    if quantity_ml < 0:
+        raise RowError("quantity_ml must not be negative")
+    try:
+        entry_date = parse_date(str(raw_date))
+    except ValueError:
+        entry_date = None
+    if entry_date is None:
+        raise RowError("date must be YYYY-MM-DD")
+
+    customer_id = row.get('customer_id')
+    customer_name = row.get('customer_name') or ''
+    if not isinstance(customer_name, str):
+        raise RowError("customer_name must be a string")
+    customer_name = customer_name.strip()
+    if customer_id:
+        try:
+            customer_id = int(customer_id)
+        except (TypeError, ValueError):
+            raise RowError("Invalid customer_id")
+    elif not customer_name:
+        raise RowError("customer_id or customer_name required")
+    return customer_id or None, customer_name, entry_date, quantity_ml
+
+
+def _resolve_customers(ids, names):
+    """
+    Map ids and names to customer ids with one query, creating missing
+    names in bulk. Names are matched by customer_name_key. Returns
+    (found ids, {name: customer id}, number of customers created).
+    """
+    keys = {name: customer_name_key(name) for name in names}
+    found_ids = set()
+    by_key = {}
+    if ids or keys:
+        matches = Customer.objects.filter(Q(id__in=ids) | Q(name_key__in=set(keys.values()))).values_list('id', 'name_key')
+        for pk, key in matches:
+            found_ids.add(pk)
+            if key is not None:
+                by_key[key] = pk
+
+    missing = {}
+    for name, key in keys.items():
+        if key not in by_key:
+            missing.setdefault(key, customers.clean_name(name))
+    created = 0
+    if missing:
+        try:
+            with transaction.atomic():
+                Customer.objects.bulk_create([Customer(name=name, name_key=key) for key, name in missing.items()])
+        except IntegrityError:
+            # a concurrent request created some of them first; the signals
+            # of get_or_create count and audit the ones made here
+            created = sum(customers.get_or_create_by_name(name)[1] for name in missing.values())
+            by_key.update(Customer.objects.filter(name_key__in=list(missing)).values_list('name_key', 'id'))
+        else:
+            created = len(missing)
+            # not every backend returns primary keys from bulk inserts
+            by_key.update(Customer.objects.filter(name_key__in=list(missing)).values_list('name_key', 'id'))
+            stats.adjust(customer_count=created)
+            audit.record_many('customer', 'create', [(by_key[key], {'name': name}) for key, name in missing.items()])
+    return found_ids, {name: by_key[key] for name, key in keys.items()}, created
+
+
+def import_entries(rows, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
+    """
+    Insert a batch of entry payloads.
+
+    Invalid rows are reported and skipped; the valid ones are written in
+    one transaction. With upsert=True rows are keyed on (customer, date):
+    an existing entry for that day is updated instead of adding another.
+    Returns (results, customers_created) where results has one dict per
+    input row, in input order.
+    """
+    chunk_size = max(1, min(int(chunk_size), MAX_CHUNK_SIZE))
+    results = [None] * len(rows)
+    cleaned = []
+    for index, row in enumerate(rows):
+        try:
+            cleaned.append((index, _clean_row(row)))
+        except RowError as exc:
+            results[index] = {'index': index, 'status': 'error', 'error': str(exc)}
+
+    ids = {c[0] for _, c in cleaned if c[0]}
+    names = {c[1] for _, c in cleaned if not c[0]}
+
+    with transaction.atomic():
+        found_ids, by_name, customers_created = _resolve_customers(ids, names)
+
+        pending = []
+        for index, (customer_id, customer_name, entry_date, quantity_ml) in cleaned:
+            if customer_id and customer_id not in found_ids:
+                results[index] = {'index': index, 'status': 'error', 'error': "Invalid customer_id"}
+                continue
+            pending.append((index, MilkEntry(
+                customer_id=customer_id or by_name[customer_name],
+                date=entry_date,
+                quantity_ml=quantity_ml,
+            )))
+
+        if upsert:
+            by_day = {}
+            for _, entry in pending:
+                # the last row for a (customer, date) wins
+                by_day.setdefault(entry.date, {})[entry.customer_id] = entry.quantity_ml
+            saved = {day: _upsert_day(day, quantities, chunk_size) for day, quantities in by_day.items()}
+            outcomes = [saved[entry.date][entry.customer_id] for _, entry in pending]
+        else:
+            MilkEntry.objects.bulk_create([entry for _, entry in pending], batch_size=chunk_size)
+            ledger.refresh({(e.customer_id, e.date.year, e.date.month) for _, e in pending})
+            audit.record_many('entry', 'create', [(e.pk, audit.entry_fields(e)) for _, e in pending])
+            outcomes = [('created', entry) for _, entry in pending]
+
+    for (index, _), (status, entry) in zip(pending, outcomes):
+        results[index] = {
+            'index': index,
+            'status': status,
+            'entry_id': entry.pk,
+            'customer_id': entry.customer_id,
+        }
+    return results, customers_created
+
+
+def upsert_day_entries(day, quantities, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Save one day's quantities keyed on (customer, date).
+
+    quantities maps customer_id -> quantity_ml. Existing entries for that
+    day are updated with bulk_update, the rest are created with
+    bulk_create, all in one transaction. Returns (created, updated).
+    """
+    saved = _upsert_day(day, quantities, chunk_size)
+    statuses = [status for status, _ in saved.values()]
+    return statuses.count('created'), statuses.count('updated')
+
+
+def _upsert_day(day, quantities, chunk_size):
+    """upsert_day_entries() returning {customer_id: (status, entry)}."""
+    if not quantities:
+        return {}
+    saved = {}
+    with transaction.atomic():
+        existing = {}
+        for entry in (
+            MilkEntry.objects.select_for_update()
+            .filter(date=day, customer_id__in=quantities.keys())
+            .order_by('customer_id', 'id')
+        ):
+            existing.setdefault(entry.customer_id, entry)
+
+        now = timezone.now()
+        to_update = []
+        to_create = []
+        before = {}
+        for customer_id, quantity_ml in quantities.items():
+            entry = existing.get(customer_id)
+            if entry is None:
+                entry = MilkEntry(customer_id=customer_id, date=day, quantity_ml=quantity_ml)
+                to_create.append(entry)
+                saved[customer_id] = ('created', entry)
+            elif entry.quantity_ml != quantity_ml:
+                before[customer_id] = entry.quantity_ml
+                entry.quantity_ml = quantity_ml
+                entry.updated_at = now
+                entry.modified_at = now
+                to_update.append(entry)
+                saved[customer_id] = ('updated', entry)
+            else:
+                saved[customer_id] = ('unchanged', entry)
+
+        MilkEntry.objects.bulk_update(to_update, ['quantity_ml', 'updated_at', 'modified_at'], batch_size=chunk_size)
+        MilkEntry.objects.bulk_create(to_create, batch_size=chunk_size)
+        ledger.refresh({(e.customer_id, day.year, day.month) for e in to_update + to_create})
+        audit.record_many('entry', 'create', [(e.pk, audit.entry_fields(e)) for e in to_create])
+        audit.record_many('entry', 'update', [
+            (e.pk, {'before': {'quantity_ml': before[e.customer_id]}, 'after': audit.entry_fields(e)})
+            for e in to_update
+        ])
+    return saved
@@ -0,0 +1,116 @@
+"""
+Delivered litres over time for the customer page's chart.
+
+series() sums quantity_ml per day, week (starting Monday) or month in
+the database with Trunc and returns one point per period of the range,
+zero for periods without deliveries. state() hashes the cheap aggregate
+from alatest() into the chart's ETag: it changes whenever an entry in
+the range is added, edited, moved or deleted, or the customer is edited.
+The queries are async (the chart view is), so the view can run
+alatest() alongside the customer lookup.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, DateField, Max, Sum
+from django.db.models.functions import Trunc
+
+from .models import MilkEntry
+from .periods import add_months
+
+GRANULARITIES = ('day', 'week', 'month')
+# default range, in periods ending with the current one
+DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}
+MAX_POINTS = 400
+
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _step(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    if granularity == 'month':
+        return add_months(day, 1)
+    return day + timedelta(days=1)
+
+
+def default_start(end, granularity):
+    """Start of the DEFAULT_PERIODS[granularity] periods ending with end's."""
+    periods = DEFAULT_PERIODS[granularity] - 1
+    if granularity == 'week':
+        return period_start(end, 'week') - timedelta(weeks=periods)
+    if granularity == 'month':
+        return add_months(end, -periods)
+    return end - timedelta(days=periods)
+
+
+def count(start, end, granularity):
+    """len(periods(start, end, granularity)), without building the list."""
+    first, last = period_start(start, granularity), period_start(end, granularity)
+    if granularity == 'week':
+        return (last - first).days // 7 + 1
+    if granularity == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days + 1
+
+
+def periods(start, end, granularity):
+    """Start dates of the periods from start's to end's (inclusive)."""
+    day = period_start(start, granularity)
+    result = []
+    while day <= end:
+        result.append(day)
+        day = _step(day, granularity)
+    return result
+
+
+def _entries(customer_id, start, end):
+    return MilkEntry.objects.filter(customer_id=customer_id, date__gte=start, date__lte=end)
+
+
+async def alatest(customer_id, start, end):
+    """{'last_updated', 'count'} of the customer's entries in the range."""
+    return await _entries(customer_id, start, end).aaggregate(last_updated=Max('updated_at'), count=Count('id'))
+
+
+def state(customer, latest, start, end, granularity):
+    """Hash of what the series depends on (latest from alatest()), for the ETag."""
+    parts = [
+        customer.pk,
+        customer.updated_at.isoformat() if customer.updated_at else '',
+        latest['last_updated'].isoformat() if latest['last_updated'] else '',
+        latest['count'],
+        start.isoformat(),
+        end.isoformat(),
+        granularity,
+    ]
+    return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def totals(customer_id, start, end, granularity):
+    """(period start, quantity_ml) rows of the periods with deliveries."""
+    return (
+        _entries(customer_id, start, end)
+        .annotate(period=Trunc('date', granularity, output_field=DateField()))
+        .values('period')
+        .annotate(ml=Sum('quantity_ml'))
+        .order_by()
+        .values_list('period', 'ml')
+    )
+
+
+async def aseries(customer_id, start, end, granularity):
+    """(labels, litres): one point per period from start to end (inclusive)."""
+    totals_by_period = {period: ml async for period, ml in totals(customer_id, start, end, granularity)}
+    label = '%Y-%m' if granularity == 'month' else '%Y-%m-%d'
+    labels, litres = [], []
+    for day in periods(start, end, granularity):
+        labels.append(day.strftime(label))
+        litres.append(round((totals_by_period.get(day) or 0) / 1000, 3))
+    return labels, litres
@@ -0,0 +1,107 @@
+"""
+Customers looked up by name, and merging of duplicates.
+
+A customer's name_key (models.customer_name_key: casefolded, whitespace
+collapsed) is unique among live customers, so "Ravi Patil" and
+" ravi  patil" are the same customer and two requests creating it at
+once cannot both succeed: the second INSERT fails on the constraint and
+get_or_create returns the row the first one made.
+
+Customers that were duplicated before the constraint existed keep a
+null name_key until merge() folds them into the one that has it.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import audit, deletion, ledger
+from .models import Customer, MilkEntry, MonthlyLedger, Payment, PriceSchedule, customer_name_key
+
+
+def clean_name(name):
+    return ' '.join((name or '').split())
+
+
+def get_or_create_by_name(name):
+    """(customer, created) for the live customer with this name, creating it if there is none."""
+    name = clean_name(name)
+    return Customer.objects.get_or_create(name_key=customer_name_key(name), defaults={'name': name})
+
+
+def duplicate_groups():
+    """
+    [(customer id to keep, [duplicate ids]), ...] for live customers
+    sharing a name key. The one holding the key is kept, else the oldest.
+    """
+    groups = defaultdict(list)
+    rows = Customer.objects.order_by('id').values_list('id', 'name', 'name_key')
+    for pk, name, name_key in rows:
+        key = customer_name_key(name)
+        if key:
+            groups[key].append((name_key is not None, pk))
+    result = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        keep = next((pk for has_key, pk in members if has_key), members[0][1])
+        result.append((keep, [pk for _, pk in members if pk != keep]))
+    return result
+
+
+def merge(keep_id, duplicate_ids):
+    """
+    Fold the duplicates into keep_id: re-point their entries and payments
+    with one UPDATE each, move price overrides for dates keep_id has none
+    for, add their opening balances to its own, recompute the affected
+    ledger months and running balances, and soft-delete the duplicates.
+    Returns {'entries': n, 'payments': n, 'opening_balance': amount}.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        customers = Customer.objects.select_for_update().in_bulk([keep_id, *duplicate_ids])
+        keep = customers[keep_id]
+        duplicates = [customers[pk] for pk in duplicate_ids if pk in customers]
+        ids = [customer.pk for customer in duplicates]
+
+        months = set(
+            MonthlyLedger.objects.filter(customer_id__in=ids).values_list('customer_id', 'year', 'month')
+        )
+        months |= {(keep_id, year, month) for _, year, month in months}
+
+        # soft-deleted entries move too, so a purge never removes them with the duplicate
+        entries = MilkEntry.all_objects.filter(customer_id__in=ids).update(
+            customer_id=keep_id, updated_at=now, modified_at=now,
+        )
+        payments = Payment.objects.filter(customer_id__in=ids).update(customer_id=keep_id, updated_at=now)
+        taken = set(PriceSchedule.objects.filter(customer_id=keep_id).values_list('effective_from', flat=True))
+        moved_prices = []
+        for pk, effective_from in (
+            PriceSchedule.objects.filter(customer_id__in=ids).order_by('customer_id').values_list('pk', 'effective_from')
+        ):
+            if effective_from not in taken:
+                taken.add(effective_from)
+                moved_prices.append(pk)
+        PriceSchedule.objects.filter(pk__in=moved_prices).update(customer_id=keep_id, updated_at=now)
+
+        opening = sum((Decimal(customer.balance_amount or 0) for customer in duplicates), Decimal(0))
+        Customer.objects.filter(pk__in=ids).update(balance_amount=0)
+        Customer.objects.filter(pk=keep_id).update(balance_amount=F('balance_amount') + opening, updated_at=now)
+
+        if months:
+            # also rebalances keep_id's running totals from its new opening balance
+            ledger.refresh(months)
+        else:
+            ledger.opening_changed(keep_id, opening)
+        for customer in duplicates:
+            # its opening balance and ledger totals now belong to keep_id
+            customer.balance_amount = Decimal(0)
+            deletion.delete_customer(customer)
+
+        if keep.name_key is None:
+            Customer.objects.filter(pk=keep_id).update(name_key=customer_name_key(keep.name))
+        result = {'entries': entries, 'payments': payments, 'opening_balance': opening}
+        audit.record('customer', keep_id, 'merge', {'merged': ids, **result})
+    return result
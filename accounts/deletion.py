@@ -0,0 +1,120 @@
+"""
+Soft deletes and the batched purge that follows them.
+
+Deleting a customer or entry only sets deleted_at: the row drops out of
+the default managers (whose partial indexes only cover live rows), the
+ledger and dashboard totals are adjusted, and a SyncTombstone and an
+audit record are written. Nothing is cascaded in the request.
+
+A customer's entries are marked deleted straight away when there are
+few of them; otherwise purge() (run by `manage.py purge_deleted`) marks
+them in batches of short transactions. Rows that have been deleted for
+longer than SOFT_DELETE_RETENTION_DAYS are removed for good by purge().
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import audit, ledger, stats
+from .models import Customer, MilkEntry, SyncTombstone
+
+PURGE_BATCH_SIZE = getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+RETENTION_DAYS = getattr(settings, 'SOFT_DELETE_RETENTION_DAYS', 90)
+
+
+def delete_entries(entries):
+    """Soft-delete the given live entries with one UPDATE. Returns how many were deleted."""
+    entries = [entry for entry in entries if entry.deleted_at is None]
+    if not entries:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        deleted = MilkEntry.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            deleted_at=now, updated_at=now, modified_at=now,
+        )
+        ledger.refresh({(entry.customer_id, entry.date.year, entry.date.month) for entry in entries})
+        SyncTombstone.objects.bulk_create([
+            SyncTombstone(kind=SyncTombstone.ENTRY, object_id=entry.pk, uuid=entry.uuid, deleted_at=now)
+            for entry in entries
+        ])
+        audit.record_many('entry', 'delete', [(entry.pk, audit.entry_fields(entry)) for entry in entries])
+    for entry in entries:
+        entry.deleted_at = now
+    return deleted
+
+
+def delete_customer(customer):
+    """
+    Soft-delete a customer. Its ledger rows go at once; its entries are
+    marked here when there are at most PURGE_BATCH_SIZE of them, otherwise
+    by the next purge().
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if not Customer.objects.filter(pk=customer.pk).update(deleted_at=now, updated_at=now):
+            return False
+        totals = customer.ledger.aggregate(
+            total_ml=Sum('total_ml'), amount=Sum('amount'), paid=Sum('paid'), entries=Sum('entry_count'),
+        )
+        customer.ledger.all().delete()
+        stats.adjust(
+            customer_count=-1,
+            total_balance=-Decimal(str(customer.balance_amount or 0)),
+            total_ml=-(totals['total_ml'] or 0),
+            total_amount=-(totals['amount'] or Decimal(0)),
+            total_paid=-(totals['paid'] or Decimal(0)),
+        )
+        if (totals['entries'] or 0) <= PURGE_BATCH_SIZE:
+            _mark_entries(MilkEntry.objects.filter(customer_id=customer.pk).values('pk'), now)
+        SyncTombstone.objects.create(kind=SyncTombstone.CUSTOMER, object_id=customer.pk, deleted_at=now)
+        audit.record('customer', customer.pk, 'delete', {
+            'name': customer.name,
+            'balance_amount': customer.balance_amount,
+            'entries': totals['entries'] or 0,
+        })
+    customer.deleted_at = now
+    return True
+
+
+def _mark_entries(pks, deleted_at):
+    # entries of a deleted customer: its tombstone and audit record cover them
+    return MilkEntry.all_objects.filter(pk__in=pks).update(deleted_at=deleted_at, updated_at=timezone.now())
+
+
+def _in_batches(queryset, batch_size, action):
+    """Run action(pks) on queryset's primary keys, batch_size at a time, one transaction each."""
+    done = 0
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return done
+            done += action(pks)
+
+
+def purge(batch_size=PURGE_BATCH_SIZE, retention_days=RETENTION_DAYS):
+    """
+    Finish deferred customer deletes and remove rows deleted more than
+    retention_days ago, in batches. Returns a dict of counts.
+    """
+    counts = {'entries_marked': 0, 'entries_removed': 0, 'customers_removed': 0}
+    for customer_id, deleted_at in Customer.all_objects.filter(deleted_at__isnull=False).values_list('pk', 'deleted_at'):
+        counts['entries_marked'] += _in_batches(
+            MilkEntry.objects.filter(customer_id=customer_id), batch_size,
+            lambda pks: _mark_entries(pks, deleted_at),
+        )
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    counts['entries_removed'] = _in_batches(
+        MilkEntry.all_objects.filter(deleted_at__lt=cutoff), batch_size,
+        lambda pks: MilkEntry.all_objects.filter(pk__in=pks).delete()[0],
+    )
+    for customer in Customer.all_objects.filter(deleted_at__lt=cutoff):
+        if not MilkEntry.all_objects.filter(customer_id=customer.pk).exists():
+            customer.delete()
+            counts['customers_removed'] += 1
+    return counts
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Customer, MilkEntry
+from .customers import clean_name
+from .models import Customer, MilkEntry, Payment
 
 class CustomerForm(forms.ModelForm):
     class Meta:
@@ -12,12 +13,53 @@ class CustomerForm(forms.ModelForm):
             }),
             'balance_amount': forms.NumberInput(attrs={
                 'class': 'form-control',
-                'placeholder': 'Enter balance amount',
+                'placeholder': 'Dues from before payments were recorded',
                 'step': '0.01',
                 'min': '0'
             }),
         }
 
+    def clean_name(self):
+        return clean_name(self.cleaned_data['name']) or None
+
+class PaymentForm(forms.ModelForm):
+    class Meta:
+        model = Payment
+        fields = ['date', 'amount', 'note']
+        widgets = {
+            'date': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date',
+            }),
+            'amount': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Amount received',
+                'step': '0.01',
+                'min': '0.01'
+            }),
+            'note': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Cash, UPI reference, ... (optional)'
+            }),
+        }
+
+    def clean_amount(self):
+        amount = self.cleaned_data['amount']
+        if amount is not None and amount <= 0:
+            raise forms.ValidationError("Amount must be more than zero.")
+        return amount
+
+class CustomerSearchSelect(forms.Select):
+    """
+    Select holding only the chosen customer; the page searches the rest
+    on demand through accounts:customer_search.
+    """
+
+    def optgroups(self, name, value, attrs=None):
+        ids = [v for v in value if str(v).isdigit()]
+        self.choices = [('', '')] + list(Customer.objects.filter(pk__in=ids).values_list('pk', 'name'))
+        return super().optgroups(name, value, attrs)
+
 class MilkEntryForm(forms.ModelForm):
     # extra field to allow typing a new customer name
     customer_name = forms.CharField(
@@ -34,7 +76,7 @@ class MilkEntryForm(forms.ModelForm):
         model = MilkEntry
         fields = ['customer', 'customer_name', 'date', 'quantity_ml']
         widgets = {
-            'customer': forms.Select(attrs={
+            'customer': CustomerSearchSelect(attrs={
                 'class': 'form-select select-customer',
                 'id': 'id_customer_select',
                 'data-placeholder': '-- Select or search customer --'
@@ -55,7 +97,8 @@ class MilkEntryForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['customer'].queryset = Customer.objects.all().order_by('name')
+        # validating the choice is one primary-key lookup; the widget never lists them all
+        self.fields['customer'].queryset = Customer.objects.all()
         self.fields['customer'].required = False
 
     def clean(self):
@@ -0,0 +1,378 @@
+"""
+Incremental maintenance of MonthlyLedger.
+
+Every change to a MilkEntry or Payment is turned into a (customer, year,
+month) delta and applied with a single UPDATE, so reports can read month
+totals without re-scanning raw entries. Bulk writes bypass the model
+signals and call refresh() for the months they touched; price schedule
+changes call reprice(). rebuild() recomputes the whole table and is used
+by the rebuild_ledger command.
+
+Each row also carries the customer's running totals (billed_to_date,
+including the opening balance, and paid_to_date), so a change shifts
+them in that month and every later one with one more UPDATE, and the
+balance at any month is a single row (see accounts.balances).
+
+Amounts are priced per entry date with accounts.pricing, so a month
+spanning a price change is billed at both rates.
+"""
+from datetime import date
+from decimal import Decimal
+from heapq import merge
+from itertools import groupby
+from operator import attrgetter, itemgetter
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, NullIf
+from django.utils import timezone
+
+from . import pricing, stats
+from .models import Customer, MilkEntry, MonthlyLedger, Payment
+from .periods import month_range
+
+_date_field = MilkEntry._meta.get_field('date')
+_payment_date_field = Payment._meta.get_field('date')
+
+
+def entry_state(entry):
+    """(customer_id, date, quantity_ml) of an entry, with date normalised to a date."""
+    return (entry.customer_id, _date_field.to_python(entry.date), int(entry.quantity_ml or 0))
+
+
+def _average_price(amount, total_ml):
+    if not total_ml:
+        return Decimal(0)
+    return (Decimal(amount) * Decimal(1000) / Decimal(total_ml)).quantize(Decimal('0.01'))
+
+
+def payment_state(payment):
+    """(customer_id, date, amount) of a payment, with date normalised to a date."""
+    return (payment.customer_id, _payment_date_field.to_python(payment.date), Decimal(str(payment.amount or 0)))
+
+
+def _from_month(year, month):
+    return Q(year__gt=year) | Q(year=year, month__gte=month)
+
+
+def _carried_into(customer_id, year, month):
+    """(billed_to_date, paid_to_date) of the customer's last row before the month."""
+    previous = (
+        MonthlyLedger.objects.filter(customer_id=customer_id)
+        .exclude(_from_month(year, month))
+        .order_by('-year', '-month')
+        .values_list('billed_to_date', 'paid_to_date')
+        .first()
+    )
+    if previous is not None:
+        return previous
+    opening = Customer.all_objects.filter(pk=customer_id).values_list('balance_amount', flat=True).first()
+    return Decimal(opening or 0), Decimal(0)
+
+
+def _month_row(customer_id, year, month, **defaults):
+    lookup = {'customer_id': customer_id, 'year': year, 'month': month}
+    if not MonthlyLedger.objects.filter(**lookup).exists():
+        billed, paid = _carried_into(customer_id, year, month)
+        MonthlyLedger.objects.get_or_create(
+            **lookup, defaults={**defaults, 'billed_to_date': billed, 'paid_to_date': paid},
+        )
+    return lookup
+
+
+def _carry(customer_id, year, month, **deltas):
+    """Add deltas to the running totals of the month and every later one."""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if deltas:
+        MonthlyLedger.objects.filter(_from_month(year, month), customer_id=customer_id).update(
+            **{field: F(field) + value for field, value in deltas.items()}
+        )
+
+
+def _apply(customer_id, date, ml, count, create):
+    price = pricing.price_on(customer_id, date)
+    lookup = {'customer_id': customer_id, 'year': date.year, 'month': date.month}
+    if create:
+        _month_row(customer_id, date.year, date.month, price_per_litre=price)
+    amount = Decimal(ml) * price / Decimal(1000)
+    updated = MonthlyLedger.objects.filter(**lookup).update(
+        total_ml=F('total_ml') + ml,
+        entry_count=F('entry_count') + count,
+        amount=F('amount') + amount,
+        price_per_litre=Coalesce(
+            (F('amount') + amount) / (NullIf(F('total_ml') + ml, Value(0)) * Value(Decimal('0.001'))),
+            F('price_per_litre'),
+            output_field=pricing.PRICE_FIELD,
+        ),
+    )
+    if updated:
+        _carry(customer_id, date.year, date.month, billed_to_date=amount)
+        stats.adjust(total_ml=ml, total_amount=amount)
+
+
+def _apply_payment(customer_id, date, amount, create):
+    if create:
+        lookup = _month_row(customer_id, date.year, date.month)
+    else:
+        lookup = {'customer_id': customer_id, 'year': date.year, 'month': date.month}
+    if MonthlyLedger.objects.filter(**lookup).update(paid=F('paid') + amount):
+        _carry(customer_id, date.year, date.month, paid_to_date=amount)
+        stats.adjust(total_paid=amount)
+
+
+def entry_changed(previous, current):
+    """
+    Apply the difference between two entry states to the ledger.
+
+    previous/current are entry_state() tuples, or None for a created or
+    deleted entry. Removals never create ledger rows, so a cascade that
+    has already deleted the customer's ledger is left alone.
+    """
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous and current and previous[:2] == current[:2]:
+            _apply(current[0], current[1], current[2] - previous[2], 0, create=True)
+            return
+        if previous:
+            _apply(previous[0], previous[1], -previous[2], -1, create=False)
+        if current:
+            _apply(current[0], current[1], current[2], 1, create=True)
+
+
+def payment_changed(previous, current):
+    """Apply the difference between two payment_state() tuples (None when created or deleted)."""
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous and current and previous[:2] == current[:2]:
+            _apply_payment(current[0], current[1], current[2] - previous[2], create=True)
+            return
+        if previous:
+            _apply_payment(previous[0], previous[1], -previous[2], create=False)
+        if current:
+            _apply_payment(current[0], current[1], current[2], create=True)
+
+
+def opening_changed(customer_id, delta):
+    """Shift the running totals of a customer whose opening balance changed by delta."""
+    if delta:
+        MonthlyLedger.objects.filter(customer_id=customer_id).update(billed_to_date=F('billed_to_date') + delta)
+
+
+def refresh(keys):
+    """
+    Recompute the given (customer_id, year, month) ledger rows from
+    MilkEntry and Payment, then the running totals of their customers.
+
+    Used after bulk writes, which bypass the model signals. Costs two
+    aggregate queries plus reads and bulk writes of the ledger rows.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    customer_ids = {key[0] for key in keys}
+    start = min(date(year, month, 1) for _, year, month in keys)
+    last_year, last_month = max((year, month) for _, year, month in keys)
+    end = month_range(last_year, last_month)[1]
+
+    period = {'customer_id__in': customer_ids, 'date__gte': start, 'date__lt': end}
+    fresh = {
+        (row.customer_id, row.year, row.month): row
+        for row in compute_rows(MilkEntry.objects.filter(**period), Payment.objects.filter(**period))
+        if (row.customer_id, row.year, row.month) in keys
+    }
+    with transaction.atomic():
+        existing = {
+            (row.customer_id, row.year, row.month): row
+            for row in MonthlyLedger.objects.select_for_update().filter(
+                customer_id__in=customer_ids,
+                year__gte=start.year,
+                year__lte=last_year,
+            )
+        }
+        to_update = []
+        to_create = []
+        ml_delta = 0
+        amount_delta = Decimal(0)
+        paid_delta = Decimal(0)
+        for key in keys:
+            new = fresh.get(key)
+            row = existing.get(key)
+            if row is None:
+                if new is not None:
+                    to_create.append(new)
+                    ml_delta += new.total_ml
+                    amount_delta += new.amount
+                    paid_delta += new.paid
+                continue
+            ml_delta -= row.total_ml
+            amount_delta -= row.amount
+            paid_delta -= row.paid
+            row.total_ml = new.total_ml if new else 0
+            row.entry_count = new.entry_count if new else 0
+            row.amount = new.amount if new else Decimal(0)
+            row.paid = new.paid if new else Decimal(0)
+            row.price_per_litre = new.price_per_litre if new else row.price_per_litre
+            row.updated_at = timezone.now()
+            ml_delta += row.total_ml
+            amount_delta += row.amount
+            paid_delta += row.paid
+            to_update.append(row)
+        MonthlyLedger.objects.bulk_update(
+            to_update, ['total_ml', 'entry_count', 'amount', 'paid', 'price_per_litre', 'updated_at'], batch_size=500,
+        )
+        MonthlyLedger.objects.bulk_create(to_create, batch_size=500)
+        _rebalance(customer_ids)
+        stats.adjust(total_ml=ml_delta, total_amount=amount_delta, total_paid=paid_delta)
+
+
+def reprice(since, customer_id=None):
+    """
+    Re-price the ledger after a PriceSchedule row effective from `since`
+    was added, changed or removed; customer_id limits it to one customer's
+    override. Returns the number of customer-months recomputed.
+    """
+    keys = pricing.affected_months(since, customer_id)
+    refresh(keys)
+    return len(keys)
+
+
+def _running(rows, openings):
+    """Fill in the running totals of rows ordered by customer and month; openings maps customer to opening balance."""
+    for customer_id, group in groupby(rows, key=attrgetter('customer_id')):
+        billed, paid = Decimal(openings.get(customer_id) or 0), Decimal(0)
+        for row in group:
+            billed += row.amount
+            paid += row.paid
+            row.billed_to_date, row.paid_to_date = billed, paid
+            yield row
+
+
+def _rebalance(customer_ids):
+    """Recompute the running totals of the customers' ledger rows."""
+    openings = dict(Customer.all_objects.filter(pk__in=customer_ids).values_list('pk', 'balance_amount'))
+    rows = list(
+        MonthlyLedger.objects.select_for_update()
+        .filter(customer_id__in=customer_ids)
+        .order_by('customer_id', 'year', 'month')
+    )
+    stored = {row.pk: (row.billed_to_date, row.paid_to_date) for row in rows}
+    changed = [
+        row for row in _running(rows, openings)
+        if stored[row.pk] != (row.billed_to_date, row.paid_to_date)
+    ]
+    MonthlyLedger.objects.bulk_update(changed, ['billed_to_date', 'paid_to_date'], batch_size=500)
+
+
+def _month_totals(queryset, **sums):
+    return (
+        # a deleted customer's entries may wait for purge_deleted to mark them
+        queryset.filter(customer__deleted_at__isnull=True)
+        .order_by()
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('customer_id', 'year', 'month')
+        .annotate(**sums)
+        .order_by('customer_id', 'year', 'month')
+    )
+
+
+def compute_rows(entries=None, payments=None):
+    """
+    Yield fresh MonthlyLedger instances computed from MilkEntry and
+    Payment (or the given querysets), ordered by customer and month.
+    Running totals are left at zero; see _running().
+    """
+    if entries is None:
+        entries = MilkEntry.objects.all()
+    if payments is None:
+        payments = Payment.objects.all()
+    key = itemgetter('customer_id', 'year', 'month')
+    totals = merge(
+        _month_totals(
+            entries, total_ml=Sum('quantity_ml'), entry_count=Count('id'), amount=Sum(pricing.entry_amount()),
+        ).iterator(chunk_size=2000),
+        _month_totals(payments, paid=Sum('amount')).iterator(chunk_size=2000),
+        key=key,
+    )
+    for (customer_id, year, month), parts in groupby(totals, key=key):
+        row = {}
+        for part in parts:
+            row.update(part)
+        amount = row.get('amount') or Decimal(0)
+        yield MonthlyLedger(
+            customer_id=customer_id,
+            year=year,
+            month=month,
+            total_ml=row.get('total_ml') or 0,
+            entry_count=row.get('entry_count') or 0,
+            amount=amount,
+            price_per_litre=_average_price(amount, row.get('total_ml')),
+            paid=row.get('paid') or Decimal(0),
+        )
+
+
+def _openings():
+    return dict(Customer.objects.values_list('pk', 'balance_amount'))
+
+
+def _snapshot(total_ml, entry_count, amount, paid, billed_to_date, paid_to_date):
+    return (total_ml, entry_count, round(amount, 2), paid, round(billed_to_date, 2), paid_to_date)
+
+
+def diff():
+    """
+    Compare the stored ledger with a fresh computation.
+
+    Returns a list of (customer_id, year, month, stored, expected) where
+    stored/expected are (total_ml, entry_count, amount, paid,
+    billed_to_date, paid_to_date) tuples or None, with amounts rounded to
+    paise. Stored rows whose month has no entries or payments left are
+    expected to be empty and to carry the previous month's running totals.
+    """
+    fields = ('total_ml', 'entry_count', 'amount', 'paid', 'billed_to_date', 'paid_to_date')
+    stored = {
+        (r[0], r[1], r[2]): _snapshot(*r[3:])
+        for r in MonthlyLedger.objects.values_list('customer_id', 'year', 'month', *fields)
+    }
+    openings = _openings()
+    expected = {
+        (row.customer_id, row.year, row.month): _snapshot(*(getattr(row, field) for field in fields))
+        for row in _running(compute_rows(), openings)
+    }
+    mismatches = []
+    carried = {}
+    for key in sorted(stored.keys() | expected.keys()):
+        customer_id = key[0]
+        if key in expected:
+            want = expected[key]
+        elif customer_id in openings:
+            billed, paid = carried.get(customer_id, (Decimal(openings[customer_id] or 0), Decimal(0)))
+            want = _snapshot(0, 0, Decimal(0), Decimal(0), billed, paid)
+        else:
+            want = None
+        if want is not None:
+            carried[customer_id] = want[4:]
+        found = stored.get(key)
+        if found != want:
+            mismatches.append((*key, found, want))
+    return mismatches
+
+
+def rebuild(batch_size=1000):
+    """Replace the whole ledger with totals and running balances recomputed from MilkEntry and Payment."""
+    with transaction.atomic():
+        MonthlyLedger.objects.all().delete()
+        batch = []
+        created = 0
+        for row in _running(compute_rows(), _openings()):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                MonthlyLedger.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            MonthlyLedger.objects.bulk_create(batch)
+            created += len(batch)
+        stats.reconcile()
+    return created
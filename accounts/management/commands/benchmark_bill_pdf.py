@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from accounts import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time bill PDF rendering on synthetic bills of 30, 1,000 and 10,000 rows (no database needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, action='append',
+            help="Rows in a benchmarked bill (repeatable; default: 30, 1000 and 10000).",
+        )
+        parser.add_argument('--repeat', type=int, default=3, help="Timed renders per bill.")
+
+    def handle(self, *args, **options):
+        results = benchmarks.pdf_render(
+            row_counts=options['rows'] or benchmarks.PDF_ROW_COUNTS,
+            repeat=max(1, options['repeat']),
+        )
+        self.stdout.write(f"{'rows':>7} {'pages':>6} {'KB':>8} {'min ms':>9} {'median ms':>10} {'max ms':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['rows']:>7} {result['pages']:>6} {result['bytes'] / 1024:>8.1f} "
+                f"{result['min_ms']:>9} {result['median_ms']:>10} {result['max_ms']:>9}"
+            )
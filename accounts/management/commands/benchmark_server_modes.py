@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn once as WSGI (gthread) and once as ASGI (uvicorn workers) with "
+        "gunicorn.conf.py and the current settings, load-test each and compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765, help="Port for the servers (127.0.0.1).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per server.")
+        parser.add_argument('--output', default='server-modes.json', help="JSON results file.")
+        parser.add_argument(
+            '--only', action='append', choices=[case.name for case in benchmarks.CASES],
+            help=f"Request this case (repeatable; default: {', '.join(benchmarks.LOAD_CASES)}).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmarks.server_modes(
+                port=options['port'],
+                concurrency=max(1, options['concurrency']),
+                duration=max(1, options['duration']),
+                only=options['only'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'generated_at': timezone.now().isoformat(),
+                'dataset': benchmarks.dataset(),
+                'results': results,
+            }, f, indent=2)
+
+        modes = benchmarks.SERVER_MODES
+        self.stdout.write(f"{'path':<40}" + ''.join(f" {mode + ' p50':>10} {mode + ' p95':>10}" for mode in modes))
+        for index, path in enumerate(results[modes[0]]['paths']):
+            self.stdout.write(f"{path['path']:<40}" + ''.join(
+                f" {results[mode]['paths'][index]['p50_ms']!s:>10} {results[mode]['paths'][index]['p95_ms']!s:>10}"
+                for mode in modes
+            ))
+        for mode in modes:
+            result = results[mode]
+            line = f"{mode}: {result['requests_per_second']} requests/s, {result['errors']} errors"
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+        self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,78 @@
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts import charts, pricing, reports
+from accounts.models import Customer, MilkEntry
+from accounts.periods import month_range
+
+
+@contextmanager
+def _prefer_indexes():
+    """
+    On PostgreSQL disable sequential scans for the duration, so a small
+    table still shows whether an index *can* serve the query.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        yield
+
+
+def _uses_index(plan):
+    if connection.vendor == 'sqlite':
+        # "SEARCH accounts_milkentry USING INDEX ..." vs "SCAN accounts_milkentry";
+        # every table of a join must be read through an index
+        full_scan = re.search(r'\bSCAN \S+\s*$', plan, re.MULTILINE)
+        return full_scan is None and ('USING INDEX' in plan or 'USING COVERING INDEX' in plan)
+    if connection.vendor == 'postgresql':
+        return 'Index' in plan and 'Seq Scan' not in plan
+    return 'index' in plan.lower()
+
+
+def hot_queries(customer_id, today):
+    """{label: queryset} of the queries the views run, built as the views build them."""
+    start, end = month_range(today.year, today.month)
+    last_day = end - timedelta(days=1)
+    week_ago = today - timedelta(days=6)
+    return {
+        'customer month (bill_pdf, customer_detail, chart_data ETag)': MilkEntry.objects.filter(
+            customer_id=customer_id, date__gte=start, date__lt=end
+        ).order_by('date'),
+        'customer litres per day (chart_data)': charts.totals(
+            customer_id, charts.default_start(today, 'day'), today, 'day'
+        ),
+        'whole months from the ledger (monthly_summary)': reports.customer_totals(start, last_day)[0],
+        'other ranges from entries (monthly_summary)': reports.customer_totals(week_ago, today)[0],
+        'latest entries (home)': pricing.with_price(
+            MilkEntry.objects.filter(customer__deleted_at__isnull=True).select_related('customer')
+        ).order_by('-date')[:10],
+    }
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot MilkEntry queries and fail if any of them cannot use an index."
+
+    def handle(self, *args, **options):
+        customer_id = Customer.objects.values_list('id', flat=True).first() or 0
+        queries = hot_queries(customer_id, timezone.localdate())
+
+        failures = []
+        with _prefer_indexes():
+            for label, queryset in queries.items():
+                plan = queryset.explain()
+                ok = _uses_index(plan)
+                self.stdout.write(f"{'OK  ' if ok else 'FAIL'} {label}")
+                for line in plan.splitlines():
+                    self.stdout.write(f"       {line}")
+                if not ok:
+                    failures.append(label)
+
+        if failures:
+            raise CommandError(f"No index used for: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f"All {len(queries)} queries use an index ({connection.vendor})."))
@@ -0,0 +1,53 @@
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.billing import generate_month_bills
+
+
+class Command(BaseCommand):
+    help = "Render every customer's bill for a month in parallel into one ZIP with a manifest."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int)
+        parser.add_argument('--month', type=int, help="Defaults to the previous month.")
+        parser.add_argument(
+            '--output',
+            help="Write the ZIP to this path. Without it the ZIP is saved to default storage under bills/.",
+        )
+        parser.add_argument('--workers', type=int, help="Render processes (default: CPU count).")
+        parser.add_argument('--customer', type=int, action='append', dest='customers',
+                            help="Only this customer id (repeatable).")
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        if not month:
+            last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+            year, month = last_month.year, last_month.month
+        elif not year:
+            year = timezone.localdate().year
+        if not 1 <= month <= 12:
+            raise CommandError("--month must be between 1 and 12")
+
+        kwargs = {'customer_ids': options['customers'], 'workers': options['workers']}
+        if options['output']:
+            manifest = generate_month_bills(year, month, options['output'], **kwargs)
+            location = options['output']
+        else:
+            with tempfile.TemporaryFile() as tmp:
+                manifest = generate_month_bills(year, month, tmp, **kwargs)
+                tmp.seek(0)
+                location = default_storage.save(f"bills/bills_{year}_{month:02d}.zip", File(tmp))
+
+        bills = manifest['bills']
+        slowest = max(bills, key=lambda info: info['render_seconds'], default=None)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(bills)} bills for {year}-{month:02d} in {manifest['total_seconds']}s "
+            f"with {manifest['workers']} workers -> {location}"
+        ))
+        if slowest:
+            self.stdout.write(f"Slowest: {slowest['filename']} ({slowest['render_seconds']}s)")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import customers, ledger
+from accounts.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge live customers whose names differ only in case or spacing: move entries, payments "
+        "and opening balances to one of them, recompute its balances and delete the rest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only list the duplicates that would be merged.",
+        )
+
+    def handle(self, *args, **options):
+        groups = customers.duplicate_groups()
+        if not groups:
+            self.stdout.write(self.style.SUCCESS("No duplicate customers."))
+            return
+
+        names = dict(
+            Customer.objects.filter(pk__in=[pk for keep, ids in groups for pk in (keep, *ids)])
+            .values_list('pk', 'name')
+        )
+        for keep, ids in groups:
+            duplicates = ', '.join(f"#{pk} {names[pk]!r}" for pk in ids)
+            self.stdout.write(f"#{keep} {names[keep]!r} <- {duplicates}")
+        if options['dry_run']:
+            self.stdout.write(f"{len(groups)} customers have duplicates; run without --dry-run to merge them.")
+            return
+
+        entries = payments = 0
+        for keep, ids in groups:
+            result = customers.merge(keep, ids)
+            entries += result['entries']
+            payments += result['payments']
+        if ledger.diff():
+            raise CommandError("Balances drifted while merging; run `manage.py reconcile_balances`.")
+        merged = sum(len(ids) for _, ids in groups)
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {merged} duplicates into {len(groups)} customers "
+            f"({entries} entries, {payments} payments moved)."
+        ))
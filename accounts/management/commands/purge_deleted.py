@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from accounts import audit, deletion
+
+
+class Command(BaseCommand):
+    help = (
+        "Finish deferred customer deletes in batches and remove rows soft-deleted "
+        "more than --retention-days ago."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=deletion.PURGE_BATCH_SIZE)
+        parser.add_argument('--retention-days', type=int, default=deletion.RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        counts = deletion.purge(batch_size=options['batch_size'], retention_days=options['retention_days'])
+        audit.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {counts['entries_marked']} entries of deleted customers; removed "
+            f"{counts['entries_removed']} entries and {counts['customers_removed']} customers."
+        ))
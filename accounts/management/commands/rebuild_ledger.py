@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import ledger
+
+
+class Command(BaseCommand):
+    help = "Recompute the monthly ledger from milk entries and verify it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare the stored ledger with the entries; exit with an error on drift.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        mismatches = ledger.diff()
+        for customer_id, year, month, stored, expected in mismatches[:20]:
+            self.stdout.write(
+                f"customer {customer_id} {year}-{month:02d}: stored {stored}, expected {expected}"
+            )
+        if len(mismatches) > 20:
+            self.stdout.write(f"... and {len(mismatches) - 20} more")
+
+        if options['check']:
+            if mismatches:
+                raise CommandError(f"Ledger drift in {len(mismatches)} customer-months.")
+            self.stdout.write(self.style.SUCCESS("Ledger matches milk entries."))
+            return
+
+        created = ledger.rebuild(batch_size=options['batch_size'])
+        remaining = ledger.diff()
+        if remaining:
+            raise CommandError(f"Ledger still differs in {len(remaining)} customer-months after rebuild.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} ledger rows ({len(mismatches)} customer-months corrected)."
+        ))
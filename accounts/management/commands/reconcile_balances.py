@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the ledger's month totals, payments and running balances from entries and "
+        "payments, report any drift and fix the customers it affects."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report drift; exit with an error if there is any.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = ledger.diff()
+        for customer_id, year, month, stored, expected in mismatches[:20]:
+            self.stdout.write(self.style.WARNING(
+                f"customer {customer_id} {year}-{month:02d}: stored {stored}, expected {expected}"
+            ))
+        if len(mismatches) > 20:
+            self.stdout.write(f"... and {len(mismatches) - 20} more")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Balances match entries and payments."))
+            return
+        if options['check']:
+            raise CommandError(f"Balance drift in {len(mismatches)} customer-months.")
+
+        ledger.refresh({(customer_id, year, month) for customer_id, year, month, _, _ in mismatches})
+        remaining = ledger.diff()
+        if remaining:
+            raise CommandError(f"Balances still differ in {len(remaining)} customer-months.")
+        customers = len({customer_id for customer_id, *_ in mismatches})
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {len(mismatches)} customer-months of {customers} customers."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accounts import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard running totals from customers and the ledger, reporting any drift."
+
+    def handle(self, *args, **options):
+        row, drift = stats.reconcile()
+        for field, (stored, computed) in drift.items():
+            self.stdout.write(self.style.WARNING(f"{field}: stored {stored}, computed {computed}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Dashboard stats reconciled ({len(drift)} fields corrected): "
+            f"{row.customer_count} customers, {row.total_ml} ml, "
+            f"amount {round(row.total_amount, 2)}, balance {row.total_balance}."
+        ))
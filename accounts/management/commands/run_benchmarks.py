@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from accounts import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot views with the test client, recording queries and peak memory; "
+        "write JSON results and fail when a view exceeds its query budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark-results.json', help="JSON results file.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per view.")
+        parser.add_argument(
+            '--only', action='append', choices=[case.name for case in benchmarks.CASES],
+            help="Only this benchmark (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        # lets the test client through ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            results = benchmarks.run(repeat=max(1, options['repeat']), only=options['only'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'generated_at': timezone.now().isoformat(),
+                'repeat': options['repeat'],
+                'dataset': benchmarks.dataset(),
+                'results': results,
+            }, f, indent=2)
+
+        self.stdout.write(f"{'view':<24} {'status':>6} {'queries':>9} {'median ms':>10} {'max ms':>9} {'peak KB':>9}")
+        for result in results:
+            line = (
+                f"{result['name']:<24} {result['status']:>6} "
+                f"{result['queries']:>4}/{result['budget']:<4} {result['median_ms']:>10} "
+                f"{result['max_ms']:>9} {result['peak_memory_kb']:>9}"
+            )
+            ok = result['status'] == 200 and not result['over_budget']
+            self.stdout.write(line if ok else self.style.ERROR(line))
+        self.stdout.write(f"Results written to {options['output']}")
+
+        failed = [r['name'] for r in results if r['status'] != 200]
+        over = [f"{r['name']} ({r['queries']} > {r['budget']})" for r in results if r['over_budget']]
+        if failed or over:
+            problems = []
+            if failed:
+                problems.append(f"failed: {', '.join(failed)}")
+            if over:
+                problems.append(f"over query budget: {', '.join(over)}")
+            raise CommandError("; ".join(problems))
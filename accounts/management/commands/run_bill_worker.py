@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts import bill_jobs
+
+
+class Command(BaseCommand):
+    help = "Render queued bill PDFs (see accounts.bill_jobs) in a process pool until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Render processes (default: CPU count).")
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds between checks for new jobs (default: 1).",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty instead of waiting for more jobs.",
+        )
+
+    def handle(self, *args, **options):
+        finished = bill_jobs.work(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Finished {finished} bill jobs."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent requests to a running server for a while and report throughput and "
+        "latency percentiles. The server must use this database (the benchmark user logs in here)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds to send requests for.")
+        parser.add_argument(
+            '--only', action='append', choices=[case.name for case in benchmarks.CASES],
+            help=f"Request this case (repeatable; default: {', '.join(benchmarks.LOAD_CASES)}).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            result = benchmarks.load_test(
+                options['url'],
+                concurrency=max(1, options['concurrency']),
+                duration=max(1, options['duration']),
+                only=options['only'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'path':<40} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for path in result['paths']:
+            line = (
+                f"{path['path']:<40} {path['requests']:>9} {path['errors']:>7} "
+                f"{path['p50_ms']!s:>8} {path['p95_ms']!s:>8} {path['max_ms']!s:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if path['errors'] else line)
+        self.stdout.write(
+            f"{result['requests']} requests in {result['seconds']}s from {result['concurrency']} threads: "
+            f"{result['requests_per_second']} requests/s, {result['errors']} errors"
+        )
+        if result['errors']:
+            raise CommandError(f"{result['errors']} requests failed.")
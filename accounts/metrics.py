@@ -0,0 +1,246 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request and counts its SQL queries and
+the time spent in them, through an execute wrapper installed on every
+database connection; timed('pdf') adds the time spent rendering bill PDFs. Each response
+carries the numbers in a Server-Timing header (visible in the browser's
+network panel), and they are aggregated into histograms per view that
+the /metrics endpoint serves in the Prometheus text format.
+
+Requests slower than SLOW_REQUEST_MS are logged to accounts.performance
+with the statements they repeated most, so an N+1 loop shows up as one
+line run hundreds of times.
+
+The current request's stats are held in a context variable rather than
+a thread local, so the queries an async view runs on Django's database
+thread, and a bill PDF it renders in the PDF pool, are still counted. The
+middleware itself runs sync or async, whichever the view below needs.
+
+The histograms live in the memory of each process: with several workers
+every scrape sees the worker that answered it, and a restart resets them.
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+SLOW_REQUEST_MS = getattr(settings, 'SLOW_REQUEST_MS', 1000)
+SLOW_REQUEST_TOP_SQL = 5
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', '')
+
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+logger = logging.getLogger('accounts.performance')
+
+_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with Prometheus semantics."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        bucket_labels = f'{labels},' if labels else ''
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{bucket_labels}le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+# metric name -> (help, bucket bounds); all are histograms
+METRICS = {
+    'http_request_duration_seconds': ("Time to respond, by view.", SECONDS_BUCKETS),
+    'db_queries_per_request': ("SQL queries run by one request, by view.", QUERY_BUCKETS),
+    'db_query_duration_seconds': ("Time spent in SQL by one request, by view.", SECONDS_BUCKETS),
+    'pdf_render_duration_seconds': ("Time spent rendering bill PDFs in one request, by view.", SECONDS_BUCKETS),
+}
+
+_lock = threading.Lock()
+_histograms = defaultdict(dict)  # metric -> {labels: Histogram}
+
+
+def observe(metric, value, **labels):
+    key = ','.join(f'{name}="{label}"' for name, label in sorted(labels.items()))
+    with _lock:
+        histogram = _histograms[metric].get(key)
+        if histogram is None:
+            histogram = _histograms[metric][key] = Histogram(METRICS[metric][1])
+        histogram.observe(value)
+
+
+def render():
+    """All histograms in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric, (description, _) in METRICS.items():
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} histogram')
+            for labels, histogram in sorted(_histograms[metric].items()):
+                lines.extend(histogram.lines(metric, labels))
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """One request's counters; also the execute wrapper that feeds them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.pdf_seconds = 0.0
+        self.statements = Counter()
+        self.statement_seconds = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_seconds += elapsed
+            self.statements[sql] += 1
+            self.statement_seconds[sql] += elapsed
+
+
+def current():
+    """Stats of the request being handled, or None."""
+    return _stats.get()
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def count_queries(sender, connection, **kwargs):
+    """Report the connection's queries to the request whose context runs them, on any thread."""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def timed(kind):
+    """Decorator adding the call's duration to the current request's `kind` time (only 'pdf' so far)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = current()
+                if stats is not None:
+                    setattr(stats, f'{kind}_seconds', getattr(stats, f'{kind}_seconds') + time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def _server_timing(stats, total):
+    parts = [
+        f'sql;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries"',
+        f'total;dur={total * 1000:.1f}',
+    ]
+    if stats.pdf_seconds:
+        parts.insert(1, f'pdf;dur={stats.pdf_seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def _log_slow(request, view, stats, total):
+    repeated = [
+        f"{count}x {stats.statement_seconds[sql] * 1000:.1f}ms {sql[:300]}"
+        for sql, count in stats.statements.most_common(SLOW_REQUEST_TOP_SQL)
+        if count > 1
+    ]
+    logger.warning(
+        "Slow request %s %s (%s): %.0fms, %d queries in %.0fms, pdf %.0fms%s",
+        request.method, request.path, view, total * 1000, stats.queries, stats.sql_seconds * 1000,
+        stats.pdf_seconds * 1000,
+        ''.join(f"\n  {line}" for line in repeated),
+    )
+
+
+class PerformanceMiddleware:
+    """Measures each request; keep it first in MIDDLEWARE so it sees all of the time."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    def _finish(self, request, response, stats, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        observe('http_request_duration_seconds', total, view=view)
+        observe('db_queries_per_request', stats.queries, view=view)
+        observe('db_query_duration_seconds', stats.sql_seconds, view=view)
+        if stats.pdf_seconds:
+            observe('pdf_render_duration_seconds', stats.pdf_seconds, view=view)
+
+        response['Server-Timing'] = _server_timing(stats, total)
+        if total * 1000 >= SLOW_REQUEST_MS:
+            _log_slow(request, view, stats, total)
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /metrics for Prometheus. Needs `Authorization: Bearer <METRICS_TOKEN>`
+    or a staff session.
+    """
+    auth = request.headers.get('Authorization', '')
+    token_ok = METRICS_TOKEN and constant_time_compare(auth, f'Bearer {METRICS_TOKEN}')
+    if not token_ok and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden("Metrics need a staff login or the METRICS_TOKEN bearer token.")
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
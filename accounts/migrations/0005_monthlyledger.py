@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:51
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+import django.db.models.deletion
+
+
+def populate_ledger(apps, schema_editor):
+    MilkEntry = apps.get_model('accounts', 'MilkEntry')
+    MonthlyLedger = apps.get_model('accounts', 'MonthlyLedger')
+    price = Decimal(getattr(settings, 'PRICE_PER_LITRE', 50))
+    totals = (
+        MilkEntry.objects.order_by()
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('customer_id', 'year', 'month')
+        .annotate(total_ml=Sum('quantity_ml'), entry_count=Count('id'))
+    )
+    MonthlyLedger.objects.bulk_create(
+        (
+            MonthlyLedger(
+                customer_id=row['customer_id'],
+                year=row['year'],
+                month=row['month'],
+                total_ml=row['total_ml'] or 0,
+                entry_count=row['entry_count'],
+                amount=Decimal(row['total_ml'] or 0) * price / Decimal(1000),
+                price_per_litre=price,
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_customer_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('total_ml', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('price_per_litre', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='accounts.customer')),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+                'indexes': [models.Index(fields=['year', 'month'], name='ledger_year_month_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyledger',
+            constraint=models.UniqueConstraint(fields=('customer', 'year', 'month'), name='unique_ledger_customer_month'),
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='milkentry',
+            options={},
+        ),
+        migrations.AlterField(
+            model_name='milkentry',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='milk_entries', to='accounts.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='milkentry',
+            index=models.Index(fields=['customer', 'date'], name='entry_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkentry',
+            index=models.Index(fields=['date'], name='entry_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_milkentry_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_count', models.IntegerField(default=0)),
+                ('total_ml', models.BigIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('total_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'dashboard stats',
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:02
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def seed_default_price(apps, schema_editor):
+    # pin the current price to existing history so changing the setting
+    # (or adding a schedule row) no longer reprices past bills
+    MilkEntry = apps.get_model('accounts', 'MilkEntry')
+    PriceSchedule = apps.get_model('accounts', 'PriceSchedule')
+    first = MilkEntry.objects.aggregate(first=Min('date'))['first']
+    PriceSchedule.objects.create(
+        customer=None,
+        effective_from=first or timezone.localdate(),
+        price_per_litre=Decimal(str(getattr(settings, 'PRICE_PER_LITRE', 50))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_dashboardstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effective_from', models.DateField()),
+                ('price_per_litre', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='accounts.customer')),
+            ],
+            options={
+                'ordering': ['-effective_from'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='priceschedule',
+            constraint=models.UniqueConstraint(fields=('customer', 'effective_from'), name='unique_price_customer_from'),
+        ),
+        migrations.AddConstraint(
+            model_name='priceschedule',
+            constraint=models.UniqueConstraint(condition=models.Q(('customer__isnull', True)), fields=('effective_from',), name='unique_default_price_from'),
+        ),
+        migrations.RunPython(seed_default_price, migrations.RunPython.noop),
+    ]
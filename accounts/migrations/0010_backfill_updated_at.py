@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:10
+
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def backfill_updated_at(apps, schema_editor):
+    now = timezone.now()
+    for name in ('Customer', 'MilkEntry'):
+        model = apps.get_model('accounts', name)
+        model.objects.filter(updated_at__isnull=True).update(updated_at=Coalesce('created_at', Value(now)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_priceschedule'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
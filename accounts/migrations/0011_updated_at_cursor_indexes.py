@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_backfill_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='milkentry',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['updated_at', 'id'], name='customer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkentry',
+            index=models.Index(fields=['updated_at', 'id'], name='entry_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_updated_at_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='milkentry',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='milkentry',
+            name='modified_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('customer', 'Customer'), ('entry', 'Milk entry')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('uuid', models.UUIDField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+                    models.Index(fields=['uuid'], name='tombstone_uuid_idx'),
+                ],
+            },
+        ),
+    ]
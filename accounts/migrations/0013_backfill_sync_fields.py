@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:20
+
+import uuid
+
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_sync_fields(apps, schema_editor):
+    MilkEntry = apps.get_model('accounts', 'MilkEntry')
+    MilkEntry.objects.filter(modified_at__isnull=True).update(modified_at=F('updated_at'))
+    pending = MilkEntry.objects.filter(uuid__isnull=True).only('id')
+    while True:
+        batch = list(pending[:1000])
+        if not batch:
+            break
+        for entry in batch:
+            entry.uuid = uuid.uuid4()
+        MilkEntry.objects.bulk_update(batch, ['uuid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_sync_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sync_fields, migrations.RunPython.noop),
+    ]
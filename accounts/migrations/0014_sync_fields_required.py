@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:20
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_backfill_sync_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='milkentry',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='milkentry',
+            name='modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:11
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0014_sync_fields_required'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(max_length=10)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='milkentry',
+            name='entry_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='milkentry',
+            name='entry_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='milkentry',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['updated_at', 'id'], name='customer_live_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='customer_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkentry',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['date'], name='entry_live_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkentry',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['updated_at', 'id'], name='entry_live_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkentry',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='entry_deleted_idx'),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model', 'object_id'], name='audit_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['at'], name='audit_at_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_soft_delete_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardstats',
+            name='total_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='monthlyledger',
+            name='billed_to_date',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='monthlyledger',
+            name='paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='monthlyledger',
+            name='paid_to_date',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='balance_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='opening balance'),
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=django.utils.timezone.localdate)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='accounts.customer')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['customer', 'date'], name='payment_customer_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:24
+"""
+balance_amount used to be typed in by hand as "unpaid till previous
+month". It now holds the opening balance, and the balance is the ledger's
+running total, so keep today's dues: everything billed before this month
+beyond the old balance_amount is recorded as one settling payment dated
+the last day of last month, and the ledger's running totals are filled in.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import migrations
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+NOTE = "Settled before payments were recorded"
+
+
+def opening_balances(apps, schema_editor):
+    Customer = apps.get_model('accounts', 'Customer')
+    DashboardStats = apps.get_model('accounts', 'DashboardStats')
+    MonthlyLedger = apps.get_model('accounts', 'MonthlyLedger')
+    Payment = apps.get_model('accounts', 'Payment')
+
+    this_month = timezone.localdate().replace(day=1)
+    settled_on = this_month - timedelta(days=1)
+    billed_before = dict(
+        MonthlyLedger.objects.filter(Q(year__lt=this_month.year) | Q(year=this_month.year, month__lt=this_month.month))
+        .order_by()
+        .values('customer_id')
+        .annotate(amount=Sum('amount'))
+        .values_list('customer_id', 'amount')
+    )
+
+    customers, payments = [], []
+    for customer in Customer.objects.only('id', 'balance_amount').iterator():
+        due = Decimal(customer.balance_amount or 0)
+        billed = round(Decimal(billed_before.get(customer.id) or 0), 2)
+        if billed > due:
+            payments.append(Payment(customer_id=customer.id, date=settled_on, amount=billed - due, note=NOTE))
+            customer.balance_amount = Decimal(0)
+        else:
+            customer.balance_amount = due - billed
+        if customer.balance_amount != due:
+            customers.append(customer)
+    Customer.objects.bulk_update(customers, ['balance_amount'], batch_size=1000)
+    Payment.objects.bulk_create(payments, batch_size=1000)
+
+    for payment in payments:
+        row, _ = MonthlyLedger.objects.get_or_create(
+            customer_id=payment.customer_id, year=settled_on.year, month=settled_on.month,
+        )
+        row.paid += payment.amount
+        row.save(update_fields=['paid'])
+
+    openings = dict(Customer.objects.values_list('id', 'balance_amount'))
+    rows = list(
+        MonthlyLedger.objects.order_by('customer_id', 'year', 'month')
+        .values_list('customer_id', 'pk', 'amount', 'paid')
+    )
+    batch = []
+    for customer_id, group in groupby(rows, key=lambda row: row[0]):
+        billed, paid = Decimal(openings.get(customer_id) or 0), Decimal(0)
+        for _, pk, amount, month_paid in group:
+            billed += amount
+            paid += month_paid
+            batch.append(MonthlyLedger(pk=pk, billed_to_date=billed, paid_to_date=paid))
+    MonthlyLedger.objects.bulk_update(batch, ['billed_to_date', 'paid_to_date'], batch_size=1000)
+
+    # recomputed from the source tables on first use
+    DashboardStats.objects.all().delete()
+
+
+def hand_edited_balances(apps, schema_editor):
+    """
+    Back to balance_amount as "unpaid till previous month": each customer's
+    outstanding balance at the end of last month, read from the ledger's
+    running totals (settling payments included, as they stood for it).
+    The settling payments are then deleted and the ledger's payment
+    columns, which 0016 leaves unused, are cleared.
+    """
+    Customer = apps.get_model('accounts', 'Customer')
+    DashboardStats = apps.get_model('accounts', 'DashboardStats')
+    MonthlyLedger = apps.get_model('accounts', 'MonthlyLedger')
+    Payment = apps.get_model('accounts', 'Payment')
+
+    this_month = timezone.localdate().replace(day=1)
+    before = Q(year__lt=this_month.year) | Q(year=this_month.year, month__lt=this_month.month)
+    carried = {}
+    for customer_id, billed, paid in (
+        MonthlyLedger.objects.filter(before)
+        .order_by('customer_id', 'year', 'month')
+        .values_list('customer_id', 'billed_to_date', 'paid_to_date')
+    ):
+        carried[customer_id] = billed - paid
+
+    customers = []
+    for customer in Customer.objects.only('id', 'balance_amount').iterator():
+        due = round(Decimal(carried.get(customer.id, customer.balance_amount or 0)), 2)
+        if due != customer.balance_amount:
+            customer.balance_amount = due
+            customers.append(customer)
+    Customer.objects.bulk_update(customers, ['balance_amount'], batch_size=1000)
+
+    Payment.objects.filter(note=NOTE).delete()
+    MonthlyLedger.objects.update(paid=0, billed_to_date=0, paid_to_date=0)
+    DashboardStats.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_payments'),
+    ]
+
+    operations = [
+        migrations.RunPython(opening_balances, hand_edited_balances),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0017_opening_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('month', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('key', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('file', models.CharField(blank=True, max_length=200)),
+                ('filename', models.CharField(blank=True, max_length=250)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bill_jobs', to='accounts.customer')),
+                ('requested_by', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['created_at'], name='billjob_queued_idx'), models.Index(fields=['key', 'status'], name='billjob_key_idx'), models.Index(fields=['customer', 'created_at'], name='billjob_customer_idx'), models.Index(fields=['expires_at'], name='billjob_expires_idx')],
+            },
+        ),
+    ]
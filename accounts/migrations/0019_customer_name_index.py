@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:31
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_bill_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('name'), condition=models.Q(('deleted_at__isnull', True)), name='customer_live_name_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_customer_name_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_live_name_idx',
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='name_key',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:36
+"""
+Fill Customer.name_key. Where several live customers share a key only
+the oldest gets it, so the unique constraint added next holds; the
+others are left for `manage.py merge_duplicate_customers`.
+"""
+from django.db import migrations
+
+
+def name_key(name):
+    # a copy of accounts.models.customer_name_key as of this migration
+    key = ' '.join((name or '').split()).casefold()
+    return key[:200] or None
+
+
+def fill_name_keys(apps, schema_editor):
+    Customer = apps.get_model('accounts', 'Customer')
+    taken = set()
+    batch = []
+    rows = list(Customer.objects.order_by('id').values_list('id', 'name', 'deleted_at'))
+    for pk, name, deleted_at in rows:
+        key = name_key(name)
+        if key is not None and deleted_at is None:
+            if key in taken:
+                continue
+            taken.add(key)
+        if key is not None:
+            batch.append(Customer(pk=pk, name_key=key))
+    Customer.objects.bulk_update(batch, ['name_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_customer_name_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_fill_customer_name_keys'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name_key',), name='unique_live_customer_name_key'),
+        ),
+    ]
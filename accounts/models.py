@@ -1,3 +1,7 @@
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
@@ -5,25 +9,82 @@ from decimal import Decimal
 
 PRICE_PER_LITRE = getattr(settings, 'PRICE_PER_LITRE', 50.0)
 
+LIVE = models.Q(deleted_at__isnull=True)
+DELETED = models.Q(deleted_at__isnull=False)
+
+
+def customer_name_key(name):
+    """Casefolded, whitespace-collapsed name that identifies a customer; None when blank."""
+    key = ' '.join((name or '').split()).casefold()
+    return key[:200] or None
+
+
+class LiveManager(models.Manager):
+    """Default manager that hides soft-deleted rows (see accounts.deletion)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=200, blank=True, null=True)
-    balance_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # dues from before payments were recorded; the running balance is in MonthlyLedger
+    balance_amount = models.DecimalField('opening balance', max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
-    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # customer_name_key(name), unique among live customers; customers
+    # still waiting for `manage.py merge_duplicate_customers` have none
+    name_key = models.CharField(max_length=200, null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name or "Unknown Customer"
 
+    def clean(self):
+        key = customer_name_key(self.name)
+        if key and Customer.objects.filter(name_key=key).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': "A customer with this name already exists."})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'name' in update_fields:
+            self.name_key = customer_name_key(self.name)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # also serves the prefix search in accounts.search
+            models.UniqueConstraint(fields=['name_key'], condition=LIVE, name='unique_live_customer_name_key'),
+        ]
+        indexes = [
+            # cursor order of the read API (accounts.pagination)
+            models.Index(fields=['updated_at', 'id'], condition=LIVE, name='customer_live_updated_idx'),
+            models.Index(fields=['deleted_at'], condition=DELETED, name='customer_deleted_idx'),
+        ]
 
 
 class MilkEntry(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='milk_entries')
+    # indexed through the (customer, date) composite index below
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='milk_entries', db_index=False)
     date = models.DateField(default=timezone.now)
     quantity_ml = models.IntegerField(default=0)  # quantity in ml
+    # stable id shared with offline handsets (see accounts.sync)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # last-writer-wins clock: the writer's time of the last change, which
+    # for synced edits is the handset's clock rather than the server's
+    modified_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
-    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     @property
     def litres(self):
@@ -32,11 +93,251 @@ class MilkEntry(models.Model):
 
     @property
     def amount(self):
-        """Calculate amount based on litres"""
-        return self.litres * Decimal(PRICE_PER_LITRE)
+        """
+        Amount at the price in effect on the entry's date.
+
+        Querysets annotated with accounts.pricing.with_price() carry the
+        price already; otherwise it is looked up once and kept.
+        """
+        if getattr(self, 'unit_price', None) is None:
+            from .pricing import price_on
+            self.unit_price = price_on(self.customer_id, self.date)
+        return self.litres * Decimal(self.unit_price)
 
     def __str__(self):
         return f"{self.customer.name} - {self.date} - {self.quantity_ml}ml"
 
     class Meta:
-        ordering = ['-date']
+        # no default ordering: callers order explicitly so unordered
+        # queries (counts, aggregates, existence checks) skip the sort
+        indexes = [
+            # not partial: it also serves the customer foreign key
+            models.Index(fields=['customer', 'date'], name='entry_customer_date_idx'),
+            # the rest only cover the rows the default manager can return
+            models.Index(fields=['date'], condition=LIVE, name='entry_live_date_idx'),
+            models.Index(fields=['updated_at', 'id'], condition=LIVE, name='entry_live_updated_idx'),
+            models.Index(fields=['deleted_at'], condition=DELETED, name='entry_deleted_idx'),
+        ]
+
+
+class PriceSchedule(models.Model):
+    """
+    Price per litre from effective_from onwards (see accounts.pricing).
+
+    Rows without a customer are the default price; a customer's own rows
+    override it from their effective date.
+    """
+    # indexed through the (customer, effective_from) unique constraint below
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name='prices', null=True, blank=True, db_index=False,
+    )
+    effective_from = models.DateField()
+    price_per_litre = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        who = f"customer {self.customer_id}" if self.customer_id else "default"
+        return f"{who} - from {self.effective_from} - {self.price_per_litre}/L"
+
+    class Meta:
+        ordering = ['-effective_from']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['customer', 'effective_from'], name='unique_price_customer_from',
+            ),
+            models.UniqueConstraint(
+                fields=['effective_from'], condition=models.Q(customer__isnull=True),
+                name='unique_default_price_from',
+            ),
+        ]
+
+
+class MonthlyLedger(models.Model):
+    """Per-customer monthly totals and running balance, kept in step with MilkEntry and Payment (see accounts.ledger)."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='ledger')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    total_ml = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    entry_count = models.IntegerField(default=0)
+    # average rate of the month (amount / litres); entries may span a price change
+    price_per_litre = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # running totals up to and including this month; billed includes the opening balance
+    billed_to_date = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    paid_to_date = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def balance(self):
+        """Outstanding at the end of the month."""
+        return self.billed_to_date - self.paid_to_date
+
+    @property
+    def carried_forward(self):
+        """Outstanding brought into the month."""
+        return self.balance - self.amount + self.paid
+
+    @property
+    def total_litres(self):
+        return Decimal(self.total_ml) / Decimal(1000)
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.year}-{self.month:02d} - {self.total_ml}ml"
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'year', 'month'], name='unique_ledger_customer_month'),
+        ]
+        indexes = [
+            models.Index(fields=['year', 'month'], name='ledger_year_month_idx'),
+        ]
+
+
+class Payment(models.Model):
+    """Money received from a customer; applied to the ledger of its month (see accounts.ledger)."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='payments', db_index=False)
+    date = models.DateField(default=timezone.localdate)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.date} - {self.amount}"
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['customer', 'date'], name='payment_customer_date_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a request made with an Idempotency-Key header, replayed on retries."""
+    # keys are the client's, so each user has their own; the unique constraint indexes user first
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', db_index=False,
+    )
+    key = models.CharField(max_length=100)
+    # sha256 of the request body and query string; a retry must send the same request
+    request_hash = models.CharField(max_length=64, blank=True)
+    endpoint = models.CharField(max_length=100)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.endpoint} - {self.key}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_user_key'),
+        ]
+
+
+class DashboardStats(models.Model):
+    """Single-row running totals for the dashboard (see accounts.stats)."""
+    customer_count = models.IntegerField(default=0)
+    total_ml = models.BigIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    total_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'dashboard stats'
+
+
+class SyncTombstone(models.Model):
+    """A deleted customer or entry, reported to handsets by the sync pull."""
+    CUSTOMER = 'customer'
+    ENTRY = 'entry'
+    KIND_CHOICES = [(CUSTOMER, 'Customer'), (ENTRY, 'Milk entry')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    uuid = models.UUIDField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+            models.Index(fields=['uuid'], name='tombstone_uuid_idx'),
+        ]
+
+
+class AuditLog(models.Model):
+    """Append-only record of a change, written in batches by accounts.audit."""
+    at = models.DateTimeField(default=timezone.now)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False,
+    )
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"{self.at:%Y-%m-%d %H:%M} {self.action} {self.model} {self.object_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='audit_object_idx'),
+            models.Index(fields=['at'], name='audit_at_idx'),
+        ]
+
+
+class BillJob(models.Model):
+    """A bill PDF rendered in the background by `manage.py run_bill_worker` (see accounts.bill_jobs)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='bill_jobs', db_index=False)
+    # both None for the all-time bill
+    year = models.PositiveSmallIntegerField(null=True, blank=True)
+    month = models.PositiveSmallIntegerField(null=True, blank=True)
+    # pdf_cache key of the bill when it was requested; identical requests share a job
+    key = models.CharField(max_length=64)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False,
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # name of the rendered PDF in default_storage
+    file = models.CharField(max_length=200, blank=True)
+    filename = models.CharField(max_length=250, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        period = f"{self.year}-{self.month:02d}" if self.year and self.month else 'all'
+        return f"{self.customer_id} {period} {self.status}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['created_at'], name='billjob_queued_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(fields=['key', 'status'], name='billjob_key_idx'),
+            models.Index(fields=['customer', 'created_at'], name='billjob_customer_idx'),
+            models.Index(fields=['expires_at'], name='billjob_expires_idx'),
+        ]
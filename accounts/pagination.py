@@ -0,0 +1,20 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UpdatedCursorPagination(CursorPagination):
+    """
+    Pages ordered on (updated_at, id), matching the updated_at indexes.
+
+    The cursor encodes the last position instead of an offset, so every
+    page is an index range scan and rows changed while a client pages
+    through show up again at the end rather than shifting pages.
+    """
+    ordering = ('updated_at', 'id')
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 2000
+
+
+class DeletedCursorPagination(UpdatedCursorPagination):
+    """SyncTombstone pages ordered on (deleted_at, id), their index."""
+    ordering = ('deleted_at', 'id')
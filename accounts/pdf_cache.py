@@ -0,0 +1,133 @@
+"""
+Content-addressed cache for rendered bill PDFs.
+
+A bill is identified by everything that can change its content: the
+customer, the billing period, the state of the entries in that period
+(latest updated_at, count, total and priced amount), the balance brought
+into it and the payments made in it, and the customer's name. The hash of those values is both the cache
+file name and the ETag served with the PDF, so an unchanged bill is
+never laid out twice and browsers can revalidate it with a 304.
+
+Files live in default_storage under BILL_PDF_CACHE_DIR. evict() lists
+the whole directory, so it is not run when a PDF is stored: the bill
+worker's sweep (accounts.bill_jobs) removes the least recently used files
+once the directory grows past BILL_PDF_CACHE_MAX_BYTES.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+# bump when the PDF layout changes so old renders are not served
+LAYOUT_VERSION = 4
+
+CACHE_DIR = getattr(settings, 'BILL_PDF_CACHE_DIR', 'bill_cache')
+MAX_BYTES = getattr(settings, 'BILL_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+
+def bill_key(customer, period, entries_state, balance=(0, 0)):
+    """
+    Hash identifying one rendered bill.
+
+    entries_state is the aggregate of the billed entries:
+    {'last_updated': ..., 'count': ..., 'total_ml': ..., 'amount': ...};
+    balance is (previous balance, paid in the period).
+    """
+    parts = [
+        LAYOUT_VERSION,
+        customer.pk,
+        customer.name,
+        customer.updated_at.isoformat() if customer.updated_at else '',
+        str(balance[0]),
+        str(balance[1]),
+        period,
+        entries_state['last_updated'].isoformat() if entries_state['last_updated'] else '',
+        entries_state['count'],
+        entries_state['total_ml'] or 0,
+        str(round(entries_state['amount'] or 0, 4)),
+    ]
+    return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _path(key):
+    return f"{CACHE_DIR}/{key[:2]}/{key}.pdf"
+
+
+def _touch(name):
+    try:
+        os.utime(default_storage.path(name))
+    except (NotImplementedError, OSError):
+        # storages without local paths fall back to eviction by modified time
+        pass
+
+
+def get(key):
+    """Cached PDF bytes for key, or None."""
+    name = _path(key)
+    try:
+        with default_storage.open(name, 'rb') as f:
+            data = f.read()
+    except (FileNotFoundError, OSError):
+        return None
+    _touch(name)
+    return data
+
+
+def exists(key):
+    return default_storage.exists(_path(key))
+
+
+def put(key, data):
+    name = _path(key)
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, ContentFile(data))
+        if saved != name:
+            # a concurrent render stored the same content first
+            default_storage.delete(saved)
+
+
+def _last_used(name):
+    try:
+        return default_storage.get_accessed_time(name)
+    except NotImplementedError:
+        return default_storage.get_modified_time(name)
+
+
+def _cached_files():
+    try:
+        prefixes, _ = default_storage.listdir(CACHE_DIR)
+    except (FileNotFoundError, OSError):
+        return []
+    names = []
+    for prefix in prefixes:
+        _, files = default_storage.listdir(f"{CACHE_DIR}/{prefix}")
+        names.extend(f"{CACHE_DIR}/{prefix}/{name}" for name in files)
+    return names
+
+
+def evict(max_bytes=None):
+    """Delete least recently used PDFs until the cache fits in max_bytes. Returns files removed."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    total = 0
+    for name in _cached_files():
+        try:
+            size = default_storage.size(name)
+            files.append((_last_used(name), size, name))
+        except (FileNotFoundError, OSError):
+            continue
+        total += size
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for _, size, name in sorted(files, key=lambda item: item[0] or timezone.now()):
+        if total <= max_bytes:
+            break
+        default_storage.delete(name)
+        total -= size
+        removed += 1
+    return removed
@@ -1,3 +1,13 @@
+"""
+Bill PDF layout.
+
+Styles are built once at import. The entries arrive as plain
+(date, quantity_ml, unit_price) rows, e.g. from values_list(), and are
+formatted in a single pass that also finds the billing period. The
+entries table is laid out in page-sized chunks, each a Table with fixed
+column widths and row heights and a repeated header, so ReportLab never
+has to measure or split one table of thousands of rows.
+"""
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
@@ -8,22 +18,149 @@ from datetime import datetime
 from io import BytesIO
 from decimal import Decimal
 
+from .metrics import timed
+
+_styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'Title',
+    parent=_styles['Heading1'],
+    fontSize=20,
+    alignment=TA_CENTER,
+    spaceAfter=12,
+    fontName='Helvetica-Bold'
+)
+
+HEADING_STYLE = ParagraphStyle(
+    'Heading',
+    parent=_styles['Heading3'],
+    fontSize=11,
+    spaceAfter=6,
+    fontName='Helvetica-Bold'
+)
+
+NORMAL_STYLE = ParagraphStyle(
+    'NormalText',
+    parent=_styles['Normal'],
+    fontSize=10,
+    spaceAfter=4
+)
+
+FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=_styles['Normal'],
+    fontSize=9,
+    alignment=TA_CENTER,
+    textColor=colors.grey
+)
+
+SUMMARY_COL_WIDTHS = [3 * inch, 2 * inch]
+SUMMARY_ROW_HEIGHT = 24
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+ENTRY_HEADER = ["Date", "Quantity (ml)", "Litres", "Rate (₹)", "Amount (₹)"]
+ENTRY_COL_WIDTHS = [1.2 * inch] * 5
+ENTRY_ROW_HEIGHT = 18
+# entry rows per table: about one A4 page at ENTRY_ROW_HEIGHT
+ENTRY_ROWS_PER_TABLE = 40
+
+ENTRY_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+])
+# added to the last chunk, which ends with the TOTAL row
+TOTAL_ROW_STYLE = TableStyle([
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+])
+
+MILLI = Decimal('0.001')
+
+
+def _entry_rows(rows):
+    """Formatted table rows and (first date, last date) from (date, quantity_ml, unit_price) rows, in one pass."""
+    table_rows = []
+    first = last = None
+    prices = {}
+    for day, quantity_ml, price in rows:
+        if first is None or day < first:
+            first = day
+        if last is None or day > last:
+            last = day
+        if price not in prices:
+            prices[price] = (Decimal(price), f"{Decimal(price):.2f}")
+        rate, rate_text = prices[price]
+        table_rows.append([
+            day.strftime('%d-%m-%Y'),
+            str(quantity_ml),
+            f"{quantity_ml / 1000:.3f}",
+            rate_text,
+            f"{quantity_ml * rate * MILLI:.2f}",
+        ])
+    return table_rows, first, last
+
+
+def _entry_tables(table_rows, total_row):
+    """The entries table as page-sized Tables, each starting with the header."""
+    table_rows.append(total_row)
+    tables = []
+    for start in range(0, len(table_rows), ENTRY_ROWS_PER_TABLE):
+        chunk = [ENTRY_HEADER] + table_rows[start:start + ENTRY_ROWS_PER_TABLE]
+        table = Table(
+            chunk,
+            colWidths=ENTRY_COL_WIDTHS,
+            rowHeights=[ENTRY_ROW_HEIGHT] * len(chunk),
+            repeatRows=1,
+        )
+        table.setStyle(ENTRY_TABLE_STYLE)
+        tables.append(table)
+    tables[-1].setStyle(TOTAL_ROW_STYLE)
+    return tables
+
+
+def _period_text(first, last):
+    if first is None:
+        return "Billing Period: No entries"
+    if (first.year, first.month) == (last.year, last.month):
+        return f"Billing Period: {first.strftime('%B %Y')}"
+    return f"Billing Period: {first.strftime('%d-%m-%Y')} to {last.strftime('%d-%m-%Y')}"
 
+
+@timed('pdf')
 def generate_bill_pdf(
     customer,
-    entries,
+    rows,
     total_ml,
     total_litres,
     total_amount,
-    price_per_litre,
+    price_per_litre=None,
     year=None,
-    month=None
+    month=None,
+    previous_balance=None,
+    paid=Decimal(0),
 ):
     """
     RULE (FINAL):
-    - customer.balance_amount = unpaid till previous month
+    - previous_balance = unpaid till the start of the period (see
+      accounts.balances; defaults to the customer's opening balance)
     - total_amount = current billing amount
-    - total payable = previous balance + current billing amount
+    - paid = payments received in the period
+    - total payable = previous balance + current billing amount - paid
+
+    rows are the period's entries as (date, quantity_ml, unit_price)
+    tuples in date order; each is billed at its own rate (see
+    accounts.pricing). price_per_litre is shown on the total line and is
+    None when the period spans a price change.
     """
 
     buffer = BytesIO()
@@ -37,67 +174,32 @@ def generate_bill_pdf(
         rightMargin=0.5 * inch,
     )
 
-    styles = getSampleStyleSheet()
-
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=20,
-        alignment=TA_CENTER,
-        spaceAfter=12,
-        fontName='Helvetica-Bold'
-    )
-
-    heading_style = ParagraphStyle(
-        'Heading',
-        parent=styles['Heading3'],
-        fontSize=11,
-        spaceAfter=6,
-        fontName='Helvetica-Bold'
-    )
-
-    normal_style = ParagraphStyle(
-        'NormalText',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=4
-    )
+    table_rows, first, last = _entry_rows(rows)
 
     elements = []
 
     # ---------------- TITLE ----------------
-    elements.append(Paragraph("Milk Billing Invoice", title_style))
-
-    # ---------------- BILLING PERIOD (FIXED) ----------------
-    if entries:
-        start_date = min(e.date for e in entries)
-        end_date = max(e.date for e in entries)
-
-        if start_date.month == end_date.month and start_date.year == end_date.year:
-            period_text = f"Billing Period: {start_date.strftime('%B %Y')}"
-        else:
-            period_text = (
-                f"Billing Period: "
-                f"{start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}"
-            )
-    else:
-        period_text = "Billing Period: No entries"
+    elements.append(Paragraph("Milk Billing Invoice", TITLE_STYLE))
 
+    # ---------------- BILLING PERIOD ----------------
     elements.append(
         Paragraph(
-            f"{period_text}<br/>Generated on: {datetime.now().strftime('%d-%m-%Y %H:%M')}",
-            normal_style
+            f"{_period_text(first, last)}<br/>Generated on: {datetime.now().strftime('%d-%m-%Y %H:%M')}",
+            NORMAL_STYLE
         )
     )
 
     elements.append(Spacer(1, 0.2 * inch))
 
     # ---------------- CUSTOMER SUMMARY ----------------
-    previous_balance = Decimal(customer.balance_amount or 0)
+    if previous_balance is None:
+        previous_balance = customer.balance_amount
+    previous_balance = Decimal(previous_balance or 0)
     current_amount = Decimal(total_amount)
-    total_payable = previous_balance + current_amount
+    paid = Decimal(paid or 0)
+    total_payable = previous_balance + current_amount - paid
 
-    elements.append(Paragraph("Customer Summary", heading_style))
+    elements.append(Paragraph("Customer Summary", HEADING_STYLE))
 
     summary_table = Table(
         [
@@ -105,75 +207,34 @@ def generate_bill_pdf(
             ["Previous Balance (Unpaid)", f"₹ {previous_balance:.2f}"],
             ["Total Litres", f"{total_litres:.2f} L"],
             ["Current Billing Amount", f"₹ {current_amount:.2f}"],
+            ["Payments Received", f"₹ {paid:.2f}"],
             ["Total Payable", f"₹ {total_payable:.2f}"],
         ],
-        colWidths=[3 * inch, 2 * inch]
+        colWidths=SUMMARY_COL_WIDTHS,
+        rowHeights=[SUMMARY_ROW_HEIGHT] * 6,
     )
-
-    summary_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
+    summary_table.setStyle(SUMMARY_TABLE_STYLE)
 
     elements.append(summary_table)
     elements.append(Spacer(1, 0.25 * inch))
 
     # ---------------- ENTRIES TABLE ----------------
-    elements.append(Paragraph("Milk Entries", heading_style))
-
-    table_data = [
-        ["Date", "Quantity (ml)", "Litres", "Rate (₹)", "Amount (₹)"]
-    ]
-
-    if entries:
-        for entry in entries:
-            table_data.append([
-                entry.date.strftime('%d-%m-%Y'),
-                str(entry.quantity_ml),
-                f"{entry.litres:.3f}",
-                f"{Decimal(price_per_litre):.2f}",
-                f"{entry.amount:.2f}",
-            ])
-    else:
-        table_data.append(["No entries", "", "", "", ""])
-
-    table_data.append([
+    elements.append(Paragraph("Milk Entries", HEADING_STYLE))
+
+    if not table_rows:
+        table_rows.append(["No entries", "", "", "", ""])
+    elements.extend(_entry_tables(table_rows, [
         "TOTAL",
         str(total_ml),
         f"{total_litres:.2f}",
-        f"{Decimal(price_per_litre):.2f}",
+        f"{Decimal(price_per_litre):.2f}" if price_per_litre is not None else "-",
         f"{current_amount:.2f}",
-    ])
-
-    entries_table = Table(table_data, colWidths=[1.2 * inch] * 5)
-
-    entries_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
-        ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
     ]))
-
-    elements.append(entries_table)
     elements.append(Spacer(1, 0.3 * inch))
 
     # ---------------- FOOTER ----------------
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_CENTER,
-        textColor=colors.grey
-    )
-
     elements.append(
-        Paragraph("Thank you for your business.", footer_style)
+        Paragraph("Thank you for your business.", FOOTER_STYLE)
     )
 
     doc.build(elements)
@@ -0,0 +1,53 @@
+"""
+Date-range helpers.
+
+Month filters are written as `date >= start AND date < end` ranges rather
+than `date__month=` lookups so the (customer, date) and date indexes on
+MilkEntry can be used.
+"""
+from datetime import date, timedelta
+
+
+def next_month(day):
+    """First day of the month after `day`."""
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def month_range(year, month):
+    """(first day, first day of next month) for a calendar month; use as a half-open range."""
+    start = date(year, month, 1)
+    return start, next_month(start)
+
+
+def add_months(day, months):
+    """First day of the month `months` away from day's month."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_whole_months(start, end):
+    """True when start..end (inclusive) covers complete calendar months."""
+    return start.day == 1 and (end + timedelta(days=1)).day == 1
+
+
+def previous_period(start, end):
+    """
+    The period of the same length right before start..end (inclusive).
+    Whole-month ranges step back by whole months, anything else by days.
+    """
+    if is_whole_months(start, end):
+        months = (end.year - start.year) * 12 + end.month - start.month + 1
+        return add_months(start, -months), start - timedelta(days=1)
+    days = (end - start).days + 1
+    return start - timedelta(days=days), start - timedelta(days=1)
+
+
+def next_period(start, end):
+    """The period of the same length right after start..end (inclusive)."""
+    if is_whole_months(start, end):
+        months = (end.year - start.year) * 12 + end.month - start.month + 1
+        return end + timedelta(days=1), add_months(start, 2 * months) - timedelta(days=1)
+    days = (end - start).days + 1
+    return end + timedelta(days=1), end + timedelta(days=days)
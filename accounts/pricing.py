@@ -0,0 +1,76 @@
+"""
+Price per litre in effect for a milk entry, read from PriceSchedule.
+
+A customer's own schedule rows take precedence over the default rows
+(customer NULL); within each, the row with the latest effective_from on
+or before the entry date applies. Dates before any schedule row fall
+back to settings.PRICE_PER_LITRE.
+
+unit_price() is the lookup as a correlated subquery, so a report prices
+every row inside its one query instead of looking prices up per entry.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import PRICE_PER_LITRE, MonthlyLedger, PriceSchedule
+
+DEFAULT_PRICE = Decimal(str(PRICE_PER_LITRE))
+
+PRICE_FIELD = DecimalField(max_digits=8, decimal_places=2)
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=4)
+
+
+def _latest_price(day, **customer):
+    return (
+        PriceSchedule.objects.filter(effective_from__lte=day, **customer)
+        .order_by('-effective_from')
+        .values('price_per_litre')[:1]
+    )
+
+
+def unit_price(customer='customer_id', day='date'):
+    """Expression for the price of the outer row's customer and date."""
+    return Coalesce(
+        Subquery(_latest_price(OuterRef(day), customer_id=OuterRef(customer)), output_field=PRICE_FIELD),
+        Subquery(_latest_price(OuterRef(day), customer__isnull=True), output_field=PRICE_FIELD),
+        Value(DEFAULT_PRICE, output_field=PRICE_FIELD),
+    )
+
+
+def entry_amount(quantity='quantity_ml', **refs):
+    """Expression for quantity_ml * unit_price / 1000; usable inside Sum()."""
+    # multiply by 0.001 rather than divide by 1000: SQLite stores whole
+    # prices as integers and would otherwise integer-divide
+    return ExpressionWrapper(
+        F(quantity) * unit_price(**refs) * Value(Decimal('0.001')), output_field=AMOUNT_FIELD,
+    )
+
+
+def with_price(entries):
+    """Annotate a MilkEntry queryset with unit_price (used by MilkEntry.amount)."""
+    return entries.annotate(unit_price=unit_price())
+
+
+def price_on(customer_id, day):
+    """Price for one customer and date, with a single query."""
+    price = (
+        PriceSchedule.objects.filter(
+            Q(customer_id=customer_id) | Q(customer__isnull=True), effective_from__lte=day,
+        )
+        .order_by(F('customer_id').asc(nulls_last=True), '-effective_from')
+        .values_list('price_per_litre', flat=True)
+        .first()
+    )
+    return DEFAULT_PRICE if price is None else price
+
+
+def affected_months(since, customer_id=None):
+    """(customer_id, year, month) ledger keys priced by a schedule row effective from `since`."""
+    months = MonthlyLedger.objects.filter(
+        Q(year__gt=since.year) | Q(year=since.year, month__gte=since.month)
+    )
+    if customer_id is not None:
+        months = months.filter(customer_id=customer_id)
+    return set(months.values_list('customer_id', 'year', 'month'))
@@ -0,0 +1,89 @@
+"""
+Per-customer totals for an arbitrary period, computed in the database.
+
+Ranges made of whole months are summed from MonthlyLedger (one row per
+customer-month); any other range is summed from MilkEntry, priced per
+entry date by accounts.pricing. Either way a single
+values('customer').annotate(Sum(...)) query returns the totals of the
+period and of the period before it, for the comparison column.
+"""
+from decimal import Decimal
+
+from django.db.models import ExpressionWrapper, F, IntegerField, Q, Sum
+from django.db.models.functions import Coalesce
+
+from . import pricing
+from .models import MilkEntry, MonthlyLedger
+from .periods import is_whole_months, previous_period
+
+
+def _month_index(day):
+    return day.year * 12 + day.month
+
+
+def _ledger_totals(start, end, previous_start):
+    current = Q(index__gte=_month_index(start))
+    previous = Q(index__lt=_month_index(start))
+    return (
+        MonthlyLedger.objects.filter(year__gte=previous_start.year, year__lte=end.year, entry_count__gt=0)
+        .annotate(index=ExpressionWrapper(F('year') * 12 + F('month'), output_field=IntegerField()))
+        .filter(index__gte=_month_index(previous_start), index__lte=_month_index(end))
+    ), {
+        'period_ml': Coalesce(Sum('total_ml', filter=current), 0),
+        'period_amount': Coalesce(Sum('amount', filter=current), Decimal(0)),
+        'previous_ml': Coalesce(Sum('total_ml', filter=previous), 0),
+        'previous_amount': Coalesce(Sum('amount', filter=previous), Decimal(0)),
+    }
+
+
+def _entry_totals(start, end, previous_start):
+    current = Q(date__gte=start)
+    previous = Q(date__lt=start)
+    return MilkEntry.objects.filter(
+        date__gte=previous_start, date__lte=end, customer__deleted_at__isnull=True,
+    ), {
+        'period_ml': Coalesce(Sum('quantity_ml', filter=current), 0),
+        'period_amount': Coalesce(Sum(pricing.entry_amount(), filter=current), Decimal(0)),
+        'previous_ml': Coalesce(Sum('quantity_ml', filter=previous), 0),
+        'previous_amount': Coalesce(Sum(pricing.entry_amount(), filter=previous), Decimal(0)),
+    }
+
+
+def customer_totals(start, end):
+    """
+    Returns (rows, grand_totals, previous_start, previous_end).
+
+    rows is a values() queryset ordered by customer name with
+    customer_id, customer__name, period_ml, period_amount, previous_ml
+    and previous_amount; pass each row through with_amounts() for display.
+    """
+    previous_start, previous_end = previous_period(start, end)
+    if is_whole_months(start, end):
+        base, sums = _ledger_totals(start, end, previous_start)
+    else:
+        base, sums = _entry_totals(start, end, previous_start)
+    rows = (
+        base.order_by()
+        .values('customer_id', 'customer__name')
+        .annotate(**sums)
+        .order_by('customer__name', 'customer_id')
+    )
+    return rows, base.aggregate(**sums), previous_start, previous_end
+
+
+def with_amounts(totals):
+    """Fill in litres, rounded amounts and the % change for display."""
+    total_ml = totals['period_ml'] or 0
+    previous_ml = totals['previous_ml'] or 0
+    amount = round(totals['period_amount'] or Decimal(0), 2)
+    previous_amount = round(totals['previous_amount'] or Decimal(0), 2)
+    totals.update({
+        'total_ml': total_ml,
+        'previous_ml': previous_ml,
+        'litres': round(Decimal(total_ml) / Decimal(1000), 2),
+        'previous_litres': round(Decimal(previous_ml) / Decimal(1000), 2),
+        'amount': amount,
+        'previous_amount': previous_amount,
+        'change': round((amount - previous_amount) / previous_amount * 100, 1) if previous_amount else None,
+    })
+    return totals
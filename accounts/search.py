@@ -0,0 +1,44 @@
+"""
+Customer name search for the entry form's autocomplete.
+
+Names are matched by prefix on name_key (the casefolded, whitespace
+collapsed name; see models.customer_name_key), written as a range
+(`prefix <= name_key < next prefix`) so both SQLite and Postgres can walk
+the unique_live_customer_name_key index; SQLite never uses an index for
+a LIKE with an ESCAPE clause. When the prefix finds fewer than `limit`
+customers, a query of SUBSTRING_MIN_LENGTH or more characters also
+matches anywhere in the name (e.g. a surname), as a capped scan.
+"""
+from .models import Customer, customer_name_key
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+SUBSTRING_MIN_LENGTH = 3
+
+
+def _after(prefix):
+    """Smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_customers(query, limit=DEFAULT_LIMIT):
+    """Up to `limit` (id, name) pairs of customers whose name matches query, prefix matches first."""
+    prefix = customer_name_key(query)
+    if not prefix:
+        return []
+    matches = list(
+        Customer.objects.filter(name_key__gte=prefix, name_key__lt=_after(prefix))
+        # the range is what the index serves; this keeps exact prefix
+        # semantics under collations that order other strings inside it
+        .filter(name_key__startswith=prefix)
+        .order_by('name_key')
+        .values_list('id', 'name')[:limit]
+    )
+    if len(matches) < limit and len(prefix) >= SUBSTRING_MIN_LENGTH:
+        matches += list(
+            Customer.objects.filter(name_key__contains=prefix)
+            .exclude(name_key__startswith=prefix)
+            .order_by('name_key')
+            .values_list('id', 'name')[:limit - len(matches)]
+        )
+    return matches
@@ -0,0 +1,202 @@
+import threading
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.signals import post_delete, pre_delete, pre_save, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import audit, ledger, stats
+from .models import Customer, MilkEntry, Payment, PriceSchedule, SyncTombstone
+
+# ids of customers currently being deleted; their ledger rows go with them,
+# so the cascaded entry deletes do not need to touch the ledger.
+_deleting = threading.local()
+
+
+def _customers_being_deleted():
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+@receiver(pre_save, sender=MilkEntry)
+def remember_previous_entry(sender, instance, raw=False, **kwargs):
+    instance._ledger_previous = None
+    if raw or instance.pk is None:
+        return
+    # server-side edits win over older handset edits (accounts.sync)
+    instance.modified_at = timezone.now()
+    previous = (
+        MilkEntry.objects.filter(pk=instance.pk)
+        .values_list('customer_id', 'date', 'quantity_ml')
+        .first()
+    )
+    instance._ledger_previous = previous
+
+
+def _entry_fields(state):
+    return dict(zip(('customer_id', 'date', 'quantity_ml'), state))
+
+
+@receiver(post_save, sender=MilkEntry)
+def update_ledger_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_ledger_previous', None)
+    current = ledger.entry_state(instance)
+    ledger.entry_changed(previous, current)
+    if created:
+        audit.record('entry', instance.pk, 'create', _entry_fields(current))
+    elif previous != current:
+        audit.record('entry', instance.pk, 'update', {
+            'before': _entry_fields(previous or ()), 'after': _entry_fields(current),
+        })
+
+
+@receiver(post_delete, sender=MilkEntry)
+def update_ledger_on_delete(sender, instance, **kwargs):
+    if instance.deleted_at is not None:
+        # purge of a soft-deleted entry; accounts.deletion already did the rest
+        return
+    if instance.customer_id in _customers_being_deleted():
+        # the customer's tombstone covers its entries
+        return
+    state = ledger.entry_state(instance)
+    ledger.entry_changed(state, None)
+    SyncTombstone.objects.create(kind=SyncTombstone.ENTRY, object_id=instance.pk, uuid=instance.uuid)
+    audit.record('entry', instance.pk, 'delete', _entry_fields(state))
+
+
+@receiver(pre_save, sender=Customer)
+def remember_previous_balance(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._stats_previous = (
+        Customer.objects.filter(pk=instance.pk).values('name', 'balance_amount').first()
+    )
+
+
+@receiver(post_save, sender=Customer)
+def update_stats_on_customer_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    balance = Decimal(str(instance.balance_amount or 0))
+    previous = getattr(instance, '_stats_previous', None)
+    current = {'name': instance.name, 'balance_amount': balance}
+    if created or previous is None:
+        stats.adjust(customer_count=1 if created else 0, total_balance=balance)
+        audit.record('customer', instance.pk, 'create', current)
+    else:
+        stats.adjust(total_balance=balance - previous['balance_amount'])
+        ledger.opening_changed(instance.pk, balance - previous['balance_amount'])
+        if previous != current:
+            audit.record('customer', instance.pk, 'update', {'before': previous, 'after': current})
+
+
+@receiver(pre_delete, sender=Customer)
+def start_customer_delete(sender, instance, **kwargs):
+    _customers_being_deleted().add(instance.pk)
+    if instance.deleted_at is not None:
+        return
+    # the customer's ledger rows are removed by the cascade without signals
+    instance._stats_ledger = instance.ledger.aggregate(
+        total_ml=Sum('total_ml'), amount=Sum('amount'), paid=Sum('paid'),
+    )
+
+
+@receiver(post_delete, sender=Customer)
+def finish_customer_delete(sender, instance, **kwargs):
+    _customers_being_deleted().discard(instance.pk)
+    if instance.deleted_at is not None:
+        # purge of a soft-deleted customer; accounts.deletion already did the rest
+        return
+    SyncTombstone.objects.create(kind=SyncTombstone.CUSTOMER, object_id=instance.pk)
+    audit.record('customer', instance.pk, 'delete', {'name': instance.name, 'balance_amount': instance.balance_amount})
+    totals = getattr(instance, '_stats_ledger', None) or {}
+    stats.adjust(
+        customer_count=-1,
+        total_balance=-Decimal(str(instance.balance_amount or 0)),
+        total_ml=-(totals.get('total_ml') or 0),
+        total_amount=-(totals.get('amount') or Decimal(0)),
+        total_paid=-(totals.get('paid') or Decimal(0)),
+    )
+
+
+@receiver(pre_save, sender=PriceSchedule)
+def remember_previous_price(sender, instance, raw=False, **kwargs):
+    instance._previous_price = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_price = (
+        PriceSchedule.objects.filter(pk=instance.pk).values_list('customer_id', 'effective_from').first()
+    )
+
+
+def _price_fields(price):
+    return {
+        'customer_id': price.customer_id,
+        'effective_from': price.effective_from,
+        'price_per_litre': price.price_per_litre,
+    }
+
+
+@receiver(post_save, sender=PriceSchedule)
+def reprice_ledger_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    audit.record('price', instance.pk, 'create' if created else 'update', _price_fields(instance))
+    previous = getattr(instance, '_previous_price', None)
+    if previous and previous[0] != instance.customer_id:
+        ledger.reprice(previous[1], previous[0])
+        ledger.reprice(instance.effective_from, instance.customer_id)
+    else:
+        since = min(instance.effective_from, previous[1]) if previous else instance.effective_from
+        ledger.reprice(since, instance.customer_id)
+
+
+@receiver(post_delete, sender=PriceSchedule)
+def reprice_ledger_on_delete(sender, instance, **kwargs):
+    if instance.customer_id in _customers_being_deleted():
+        return
+    audit.record('price', instance.pk, 'delete', _price_fields(instance))
+    ledger.reprice(instance.effective_from, instance.customer_id)
+
+
+@receiver(pre_save, sender=Payment)
+def remember_previous_payment(sender, instance, raw=False, **kwargs):
+    instance._ledger_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._ledger_previous = (
+        Payment.objects.filter(pk=instance.pk).values_list('customer_id', 'date', 'amount').first()
+    )
+
+
+def _payment_fields(state):
+    return dict(zip(('customer_id', 'date', 'amount'), state))
+
+
+@receiver(post_save, sender=Payment)
+def update_ledger_on_payment_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_ledger_previous', None)
+    current = ledger.payment_state(instance)
+    ledger.payment_changed(previous, current)
+    if created:
+        audit.record('payment', instance.pk, 'create', _payment_fields(current))
+    elif previous != current:
+        audit.record('payment', instance.pk, 'update', {
+            'before': _payment_fields(previous or ()), 'after': _payment_fields(current),
+        })
+
+
+@receiver(post_delete, sender=Payment)
+def update_ledger_on_payment_delete(sender, instance, **kwargs):
+    if instance.customer_id in _customers_being_deleted():
+        return
+    state = ledger.payment_state(instance)
+    ledger.payment_changed(state, None)
+    audit.record('payment', instance.pk, 'delete', _payment_fields(state))
@@ -1,6 +1,7 @@
-// usage: call loadMilkChart(chartDataUrl, canvasId)
+// usage: call loadMilkChart(chartDataUrl, canvasId); add ?granularity=week|month for coarser points
+// the endpoint sends an ETag, so repeat loads are revalidated with a 304 by the browser cache
 function loadMilkChart(chartDataUrl, canvasId) {
-  fetch(chartDataUrl)
+  fetch(chartDataUrl, { credentials: 'same-origin' })
     .then(r => {
       if (!r.ok) throw new Error('Network response was not ok');
       return r.json();
@@ -15,7 +16,7 @@ function loadMilkChart(chartDataUrl, canvasId) {
         data: {
           labels: json.labels,
           datasets: [{
-            label: 'Litres per day',
+            label: 'Litres per ' + (json.granularity || 'day'),
             data: json.data,
             borderWidth: 2,
             borderColor: '#007bff',
@@ -0,0 +1,35 @@
+"""
+WhiteNoise for both server modes.
+
+WhiteNoiseMiddleware only runs sync, so under ASGI Django would hand
+every request to a thread before it and back to the event loop after
+it, even for the async views. This subclass also runs async: the lookup
+is a dict get (files are indexed at startup unless WHITENOISE_AUTOREFRESH
+is on), and only serving a file goes to a thread, because it opens it.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,74 @@
+"""
+Running totals for the dashboard.
+
+DashboardStats holds one row that is adjusted with F() updates whenever
+the ledger or a customer changes, so the dashboard reads a single row
+no matter how much history is stored. reconcile() recomputes the totals
+from the source tables and is run periodically by the
+reconcile_dashboard_stats command to catch drift.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Customer, DashboardStats, MonthlyLedger
+
+STATS_ID = 1
+FIELDS = ('customer_count', 'total_ml', 'total_amount', 'total_balance', 'total_paid')
+
+
+def adjust(**deltas):
+    """Add deltas (customer_count=1, total_ml=-500, ...) to the running totals."""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    updated = DashboardStats.objects.filter(pk=STATS_ID).update(
+        **{field: F(field) + value for field, value in deltas.items()}
+    )
+    if not updated:
+        # first use: computing from scratch already includes this change
+        reconcile()
+
+
+def current():
+    """The stats row, created from the source tables on first use."""
+    stats = DashboardStats.objects.filter(pk=STATS_ID).first()
+    if stats is None:
+        stats, _ = reconcile()
+    return stats
+
+
+def compute():
+    """Totals computed from Customer and MonthlyLedger; total_balance is the sum of opening balances."""
+    customers = Customer.objects.aggregate(count=Count('id'), balance=Sum('balance_amount'))
+    ledger = MonthlyLedger.objects.aggregate(total_ml=Sum('total_ml'), amount=Sum('amount'), paid=Sum('paid'))
+    return {
+        'customer_count': customers['count'],
+        'total_ml': ledger['total_ml'] or 0,
+        'total_amount': ledger['amount'] or Decimal(0),
+        'total_balance': customers['balance'] or Decimal(0),
+        'total_paid': ledger['paid'] or Decimal(0),
+    }
+
+
+def reconcile():
+    """
+    Overwrite the running totals with freshly computed ones.
+
+    Returns (stats, drift) where drift maps each field that was off to
+    its (stored, computed) values.
+    """
+    with transaction.atomic():
+        stored = DashboardStats.objects.select_for_update().filter(pk=STATS_ID).first()
+        fresh = compute()
+        drift = {}
+        if stored is not None:
+            for field in FIELDS:
+                if Decimal(getattr(stored, field)) != Decimal(fresh[field]):
+                    drift[field] = (getattr(stored, field), fresh[field])
+        stats, _ = DashboardStats.objects.update_or_create(
+            pk=STATS_ID, defaults={**fresh, 'reconciled_at': timezone.now()}
+        )
+    return stats, drift
@@ -0,0 +1,262 @@
+"""
+Offline delta sync for delivery handsets.
+
+push() applies a batch of entries written on a handset. Entries are keyed
+on their client-generated uuid, so a retried batch changes nothing the
+second time, and conflicts are resolved last-writer-wins on modified_at:
+a change is applied only when it is newer than what the server holds,
+including a server-side deletion (a SyncTombstone). A modified_at in the
+future (a handset clock running fast) is taken as now, so it cannot beat
+every later edit.
+
+pull() returns everything changed since a checkpoint token: customers,
+entries and tombstones, each read in (updated_at, id) order from its
+index, at most `limit` rows per stream. The token is the signed position
+reached in each stream. Rows are stamped when they are written, not when
+their transaction commits, so rows changed in the last SETTLE
+(SYNC_SETTLE_SECONDS) are left for the next pull: a transaction still
+committing is not skipped as long as it commits within SETTLE of its
+writes. One that takes longer, such as a very large bulk import, can
+commit rows behind a checkpoint a client has already pulled past; raise
+SYNC_SETTLE_SECONDS above the longest write transaction.
+"""
+from collections import namedtuple
+from datetime import timedelta
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import audit, deletion, ledger
+from .bulk import RowError
+from .models import Customer, MilkEntry, SyncTombstone
+from .pricing import unit_price
+
+PULL_LIMIT = getattr(settings, 'SYNC_PULL_LIMIT', 1000)
+MAX_PUSH_ROWS = 5000
+SETTLE = timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 60))
+
+CUSTOMER_FIELDS = ('id', 'name', 'balance_amount', 'updated_at')
+ENTRY_FIELDS = ('id', 'uuid', 'customer_id', 'date', 'quantity_ml', 'modified_at', 'updated_at')
+TOMBSTONE_FIELDS = ('id', 'kind', 'object_id', 'uuid', 'deleted_at')
+
+_TOKEN_SALT = 'accounts.sync'
+
+PushRow = namedtuple('PushRow', 'uuid customer_id date quantity_ml modified_at deleted')
+
+
+class SyncError(ValueError):
+    pass
+
+
+def _timestamp(value, name):
+    parsed = parse_datetime(str(value)) if value else None
+    if parsed is None:
+        raise RowError(f"{name} must be an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _clean(row):
+    """Validate one pushed row into a PushRow."""
+    if not isinstance(row, dict):
+        raise RowError("row must be an object")
+    try:
+        entry_uuid = uuid.UUID(str(row.get('uuid')))
+    except ValueError:
+        raise RowError("uuid must be a UUID")
+    modified_at = min(_timestamp(row.get('modified_at'), 'modified_at'), timezone.now())
+    if row.get('deleted'):
+        return PushRow(entry_uuid, None, None, None, modified_at, True)
+
+    try:
+        customer_id = int(row.get('customer_id'))
+        quantity_ml = int(row.get('quantity_ml'))
+    except (TypeError, ValueError):
+        raise RowError("customer_id and quantity_ml must be integers")
+    if quantity_ml < 0:
+        raise RowError("quantity_ml must not be negative")
+    try:
+        entry_date = parse_date(str(row.get('date')))
+    except ValueError:
+        entry_date = None
+    if entry_date is None:
+        raise RowError("date must be YYYY-MM-DD")
+    return PushRow(entry_uuid, customer_id, entry_date, quantity_ml, modified_at, False)
+
+
+def entry_row(entry):
+    return {field: getattr(entry, field) for field in ENTRY_FIELDS}
+
+
+def push(rows):
+    """
+    Apply pushed entry changes; returns one result dict per input row.
+
+    status is created, updated, deleted, unchanged (already applied),
+    stale (the server has a newer change, returned as "entry"; or the
+    entry was deleted on the server) or error.
+    """
+    results = [None] * len(rows)
+    latest = {}
+    for index, row in enumerate(rows):
+        try:
+            change = _clean(row)
+        except RowError as exc:
+            results[index] = {'index': index, 'status': 'error', 'error': str(exc)}
+            continue
+        previous = latest.get(change.uuid)
+        if previous and previous[1].modified_at > change.modified_at:
+            results[index] = {'index': index, 'uuid': change.uuid, 'status': 'stale'}
+            continue
+        if previous:
+            results[previous[0]] = {'index': previous[0], 'uuid': change.uuid, 'status': 'stale'}
+        latest[change.uuid] = (index, change)
+
+    with transaction.atomic():
+        customer_ids = set(
+            Customer.objects.filter(
+                id__in={change.customer_id for _, change in latest.values() if not change.deleted}
+            ).values_list('id', flat=True)
+        )
+        existing = {
+            entry.uuid: entry
+            for entry in MilkEntry.all_objects.select_for_update().filter(uuid__in=latest.keys())
+        }
+        deleted_at = {}
+        for entry_uuid, when in SyncTombstone.objects.filter(
+            kind=SyncTombstone.ENTRY, uuid__in=latest.keys() - existing.keys(),
+        ).values_list('uuid', 'deleted_at'):
+            deleted_at[entry_uuid] = max(when, deleted_at.get(entry_uuid, when))
+
+        now = timezone.now()
+        to_create, to_update, to_delete = [], [], []
+        updated, revived_entries = [], []
+        months = set()
+        for entry_uuid, (index, change) in latest.items():
+            result = {'index': index, 'uuid': entry_uuid}
+            results[index] = result
+            entry = existing.get(entry_uuid)
+            if entry is not None and entry.deleted_at is not None:
+                # soft-deleted on the server: the deletion time is its last change
+                deleted_at[entry_uuid] = entry.deleted_at
+                revived = entry
+                entry = None
+            else:
+                revived = None
+            if not change.deleted and change.customer_id not in customer_ids:
+                result.update(status='error', error="Invalid customer_id")
+            elif entry is None:
+                if change.deleted:
+                    result['status'] = 'deleted'
+                elif entry_uuid in deleted_at and deleted_at[entry_uuid] >= change.modified_at:
+                    result['status'] = 'stale'
+                elif revived is not None:
+                    # edited on the handset after the server deleted it
+                    revived.deleted_at = None
+                    _apply(revived, change, now)
+                    to_update.append(revived)
+                    revived_entries.append(revived)
+                    months.add((change.customer_id, change.date.year, change.date.month))
+                    result['status'] = 'created'
+                else:
+                    to_create.append(MilkEntry(
+                        uuid=entry_uuid,
+                        customer_id=change.customer_id,
+                        date=change.date,
+                        quantity_ml=change.quantity_ml,
+                        modified_at=change.modified_at,
+                    ))
+                    months.add((change.customer_id, change.date.year, change.date.month))
+                    result['status'] = 'created'
+            elif entry.modified_at >= change.modified_at:
+                same = (entry.modified_at == change.modified_at and not change.deleted and (
+                    entry.customer_id, entry.date, entry.quantity_ml,
+                ) == (change.customer_id, change.date, change.quantity_ml))
+                result['status'] = 'unchanged' if same else 'stale'
+                if not same:
+                    result['entry'] = entry_row(entry)
+            elif change.deleted:
+                to_delete.append(entry)
+                result['status'] = 'deleted'
+            else:
+                months.add((entry.customer_id, entry.date.year, entry.date.month))
+                before = audit.entry_fields(entry)
+                _apply(entry, change, now)
+                updated.append((entry.pk, {'before': before, 'after': audit.entry_fields(entry)}))
+                to_update.append(entry)
+                months.add((change.customer_id, change.date.year, change.date.month))
+                result['status'] = 'updated'
+
+        MilkEntry.all_objects.bulk_update(
+            to_update, ['customer', 'date', 'quantity_ml', 'modified_at', 'updated_at', 'deleted_at'], batch_size=500,
+        )
+        MilkEntry.objects.bulk_create(to_create, batch_size=500)
+        ledger.refresh(months)
+        deletion.delete_entries(to_delete)
+        audit.record_many('entry', 'update', updated)
+        audit.record_many('entry', 'create', [
+            (entry.pk, audit.entry_fields(entry)) for entry in to_create + revived_entries
+        ])
+    return results
+
+
+def _apply(entry, change, now):
+    entry.customer_id = change.customer_id
+    entry.date = change.date
+    entry.quantity_ml = change.quantity_ml
+    entry.modified_at = change.modified_at
+    entry.updated_at = now
+
+
+def _streams():
+    return (
+        ('customers', Customer.objects.all(), 'updated_at', CUSTOMER_FIELDS),
+        ('entries', MilkEntry.objects.annotate(unit_price=unit_price()), 'updated_at', ENTRY_FIELDS + ('unit_price',)),
+        ('deleted', SyncTombstone.objects.all(), 'deleted_at', TOMBSTONE_FIELDS),
+    )
+
+
+def _load_token(token):
+    if not token:
+        return {}
+    try:
+        position = signing.loads(token, salt=_TOKEN_SALT)
+    except signing.BadSignature:
+        raise SyncError("Invalid checkpoint token")
+    return {name: (parse_datetime(ts), pk) for name, (ts, pk) in position.items()}
+
+
+def pull(token=None, limit=PULL_LIMIT):
+    """
+    Changes since the checkpoint token (everything when token is None).
+
+    Returns {'customers': [...], 'entries': [...], 'deleted': [...],
+    'checkpoint': token, 'has_more': bool}; while has_more is true the
+    client pulls again with the new checkpoint straight away.
+    """
+    position = _load_token(token)
+    until = timezone.now() - SETTLE
+    changes = {'has_more': False}
+    for name, queryset, field, fields in _streams():
+        queryset = queryset.filter(**{f'{field}__lt': until})
+        if name in position:
+            since, pk = position[name]
+            queryset = queryset.filter(Q(**{f'{field}__gt': since}) | Q(**{field: since, 'id__gt': pk}))
+        rows = list(queryset.order_by(field, 'id').values(*fields)[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            changes['has_more'] = True
+        if rows:
+            position[name] = (rows[-1][field], rows[-1]['id'])
+        changes[name] = rows
+
+    changes['checkpoint'] = signing.dumps(
+        {name: (since.isoformat(), pk) for name, (since, pk) in position.items()}, salt=_TOKEN_SALT,
+    )
+    return changes
@@ -0,0 +1,1305 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.base import BaseHandler
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    audit, balances, benchmarks, bill_jobs, charts, customers, deletion, ledger, pdf_cache, pdf_generation, reports,
+    stats, sync,
+)
+from .billing import Bill, generate_month_bills
+from .forms import MilkEntryForm
+from .management.commands.check_query_plans import _uses_index
+from .models import AuditLog, BillJob, Customer, MilkEntry, MonthlyLedger, Payment, PriceSchedule, SyncTombstone
+
+
+class ViewTestCase(TestCase):
+    """Logged-in test client; rendered PDFs go to a temporary MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_root = override_settings(MEDIA_ROOT=media)
+        media_root.enable()
+        cls.addClassCleanup(media_root.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('staff', password='unused', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+
+def _duplicate(name, **fields):
+    """A live customer named `name` without a name_key, as duplicates from before the constraint are."""
+    customer = Customer.objects.create(name=f"{name} (duplicate)", **fields)
+    Customer.objects.filter(pk=customer.pk).update(name=name, name_key=None)
+    customer.refresh_from_db()
+    return customer
+
+
+class MergeCustomersTests(TestCase):
+    def test_merge_moves_opening_balance_of_duplicate_without_entries(self):
+        keep = Customer.objects.create(name="Ravi Patil")
+        MilkEntry.objects.create(customer=keep, date=date(2026, 9, 5), quantity_ml=1000)
+        duplicate = _duplicate(" ravi  patil", balance_amount=Decimal('300'))
+
+        self.assertEqual(customers.duplicate_groups(), [(keep.pk, [duplicate.pk])])
+        result = customers.merge(keep.pk, [duplicate.pk])
+
+        self.assertEqual(result['opening_balance'], Decimal('300'))
+        keep.refresh_from_db()
+        self.assertEqual(keep.balance_amount, Decimal('300'))
+        row = MonthlyLedger.objects.get(customer=keep, year=2026, month=9)
+        self.assertEqual(row.amount, Decimal('50'))
+        self.assertEqual(row.billed_to_date, Decimal('350'))
+        self.assertEqual(ledger.diff(), [])
+        self.assertFalse(Customer.objects.filter(pk=duplicate.pk).exists())
+
+    def test_merge_command_keeps_balances_consistent(self):
+        keep = Customer.objects.create(name="Anita Iyer")
+        MilkEntry.objects.create(customer=keep, date=date(2026, 9, 5), quantity_ml=1000)
+        duplicate = _duplicate("ANITA IYER", balance_amount=Decimal('120'))
+        MilkEntry.objects.create(customer=duplicate, date=date(2026, 8, 5), quantity_ml=2000)
+
+        call_command('merge_duplicate_customers', stdout=open('/dev/null', 'w'))
+
+        rows = MonthlyLedger.objects.filter(customer=keep).order_by('year', 'month')
+        self.assertEqual(
+            [(row.month, row.billed_to_date) for row in rows],
+            [(8, Decimal('220')), (9, Decimal('270'))],
+        )
+        self.assertEqual(customers.duplicate_groups(), [])
+
+
+class GetOrCreateByNameConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+
+    def test_concurrent_calls_create_one_customer(self):
+        barrier = threading.Barrier(self.THREADS)
+        results, errors = [], []
+
+        def create(name):
+            try:
+                barrier.wait()
+                results.append(customers.get_or_create_by_name(name))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        names = ["Meena Nair", " meena nair", "MEENA  NAIR", "Meena  Nair"]
+        threads = [
+            threading.Thread(target=create, args=(names[index % len(names)],))
+            for index in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Customer.objects.filter(name_key="meena nair").count(), 1)
+        self.assertEqual({customer.pk for customer, _ in results}, {Customer.objects.get().pk})
+        self.assertEqual(sum(created for _, created in results), 1)
+
+
+class MonthRangeViewTests(ViewTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = Customer.objects.create(name="Kiran Joshi")
+        MilkEntry.objects.create(customer=cls.customer, date=date(2026, 9, 1), quantity_ml=1000)
+        MilkEntry.objects.create(customer=cls.customer, date=date(2026, 9, 30), quantity_ml=500)
+        MilkEntry.objects.create(customer=cls.customer, date=date(2026, 10, 1), quantity_ml=2000)
+
+    def test_bill_pdf_month(self):
+        response = self.client.get(reverse('accounts:bill_pdf_month', args=[self.customer.pk, 2026, 9]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_bill_pdf_rejects_invalid_month(self):
+        for year, month in ((2026, 13), (2026, 0), (0, 5)):
+            response = self.client.get(reverse('accounts:bill_pdf_month', args=[self.customer.pk, year, month]))
+            self.assertEqual(response.status_code, 404, (year, month))
+
+    def test_bill_job_create_rejects_invalid_month(self):
+        response = self.client.post(reverse('accounts:bill_job_create_month', args=[self.customer.pk, 2026, 13]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_monthly_summary_counts_only_the_month(self):
+        response = self.client.get(reverse('accounts:monthly_summary'), {'month': '2026-09'})
+        self.assertEqual(response.status_code, 200)
+        [row] = response.context['summary']
+        self.assertEqual(row['name'], "Kiran Joshi")
+        self.assertEqual(response.context['totals']['total_ml'], 1500)
+
+    def test_bulk_upsert_updates_the_days_entry(self):
+        url = reverse('accounts:api_bulk_entries') + '?upsert=1'
+        row = {'customer_id': self.customer.pk, 'date': '2026-09-01', 'quantity_ml': 750}
+        response = self.client.post(url, [row], content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            list(MilkEntry.objects.filter(customer=self.customer, date=date(2026, 9, 1)).values_list('quantity_ml', flat=True)),
+            [750],
+        )
+
+
+class PriceChangeTests(ViewTestCase):
+    """Bills spanning a price change: the default price is 50/L until 16 September, 60/L from then."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = Customer.objects.create(name="Sunita Reddy")
+        MilkEntry.objects.create(customer=cls.customer, date=date(2026, 9, 10), quantity_ml=1000)
+        MilkEntry.objects.create(customer=cls.customer, date=date(2026, 9, 20), quantity_ml=2000)
+        # added after the entries, so the ledger has to be re-priced
+        PriceSchedule.objects.create(effective_from=date(2026, 9, 16), price_per_litre=Decimal('60'))
+
+    def test_ledger_prices_each_entry_at_its_date(self):
+        row = MonthlyLedger.objects.get(customer=self.customer, year=2026, month=9)
+        self.assertEqual(row.total_ml, 3000)
+        self.assertEqual(row.amount, Decimal('170'))
+        self.assertEqual(row.billed_to_date, Decimal('170'))
+        self.assertEqual(ledger.diff(), [])
+
+    def test_customer_override_takes_precedence(self):
+        PriceSchedule.objects.create(
+            customer=self.customer, effective_from=date(2026, 9, 18), price_per_litre=Decimal('45'),
+        )
+        row = MonthlyLedger.objects.get(customer=self.customer, year=2026, month=9)
+        self.assertEqual(row.amount, Decimal('140'))
+        self.assertEqual(ledger.diff(), [])
+
+    def test_bill_totals(self):
+        customer = Bill.customers(2026, 9).get(pk=self.customer.pk)
+        bill = Bill(customer, 2026, 9)
+        arguments = bill.pdf_arguments()
+        self.assertEqual(bill.state['amount'], Decimal('170'))
+        self.assertEqual(arguments['total_amount'], Decimal('170'))
+        self.assertEqual(arguments['total_ml'], 3000)
+        self.assertEqual([price for _, _, price in arguments['rows']], [Decimal('50'), Decimal('60')])
+        # two rates in the period: no single rate on the total line
+        self.assertIsNone(arguments['price_per_litre'])
+
+    def test_bill_key_changes_with_the_price(self):
+        customer = Bill.customers(2026, 9).get(pk=self.customer.pk)
+        before = Bill(customer, 2026, 9).key
+        PriceSchedule.objects.filter(effective_from=date(2026, 9, 16)).update(price_per_litre=Decimal('65'))
+        self.assertNotEqual(Bill(customer, 2026, 9).key, before)
+
+    def test_export_rows(self):
+        response = self.client.get(
+            reverse('accounts:export_entries'),
+            {'format': 'csv', 'customer': self.customer.pk, 'start': '2026-09-01', 'end': '2026-09-30'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(
+            [(row['date'], row['rate'], row['amount']) for row in rows],
+            [('2026-09-10', '50.00', '50.00'), ('2026-09-20', '60.00', '120.00')],
+        )
+
+
+class AsyncMiddlewareTests(SimpleTestCase):
+    @override_settings(DEBUG=True)
+    def test_async_chain_needs_no_sync_adapters(self):
+        # Django logs each middleware it has to wrap for the other mode
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            BaseHandler().load_middleware(is_async=True)
+
+
+class AsyncViewTests(ViewTestCase):
+    """The async views through the ASGI request path."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = Customer.objects.create(name="Farhan Khan")
+        MilkEntry.objects.create(customer=cls.customer, date=date(2026, 9, 10), quantity_ml=1000)
+
+    def setUp(self):
+        self.async_client.force_login(self.user)
+
+    async def test_views(self):
+        paths = [
+            reverse('accounts:home'),
+            reverse('accounts:chart_data', args=[self.customer.pk]) + '?granularity=month&start=2026-09-01&end=2026-09-30',
+            reverse('accounts:customer_search') + '?q=farhan',
+            reverse('accounts:bill_pdf_month', args=[self.customer.pk, 2026, 9]),
+        ]
+        for path in paths:
+            response = await self.async_client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            # queries run on Django's database thread still reach the request's stats
+            self.assertNotIn('desc="0 queries"', response['Server-Timing'], path)
+        self.assertIn(b'Farhan Khan', (await self.async_client.get(paths[2])).content)
+        self.assertIn('pdf;dur=', response['Server-Timing'])
+
+    async def test_exports_stream_asynchronously(self):
+        for fmt, start in (('csv', b'date,'), ('xlsx', b'PK')):
+            response = await self.async_client.get(reverse('accounts:export_entries'), {'format': fmt})
+            self.assertEqual(response.status_code, 200, fmt)
+            # a synchronous iterator would be read to the end before the first byte is sent
+            self.assertTrue(response.is_async, fmt)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertTrue(content.startswith(start), fmt)
+            if fmt == 'csv':
+                self.assertIn(b'Farhan Khan', content)
+
+    async def test_login_required(self):
+        response = await AsyncClient().get(reverse('accounts:home'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('login')))
+
+
+class AsyncAuditTests(TransactionTestCase):
+    """Audit records written under the ASGI request path name the user and reach the log."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('clerk', password='unused')
+        self.customer = Customer.objects.create(name="Jaya Singh")
+        self.async_client.force_login(self.user)
+
+    async def test_changes_are_audited_with_the_user(self):
+        response = await self.async_client.post(
+            reverse('accounts:api_entries'),
+            {'customer_id': self.customer.pk, 'date': '2026-09-10', 'quantity_ml': 1000},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        log = await AuditLog.objects.aget(model='entry', action='create')
+        self.assertEqual(log.user_id, self.user.pk)
+        self.assertEqual(log.object_id, response.json()['entry_id'])
+
+
+class MonthBillsTests(TestCase):
+    def test_renders_each_customers_bill_in_spawned_workers(self):
+        customers = [Customer.objects.create(name=name) for name in ("Geeta Patil", "Harish Nair")]
+        for customer in customers:
+            MilkEntry.objects.create(customer=customer, date=date(2026, 9, 10), quantity_ml=1000)
+
+        output = io.BytesIO()
+        manifest = generate_month_bills(2026, 9, output, workers=2)
+
+        self.assertEqual([bill['customer_id'] for bill in manifest['bills']], [c.pk for c in customers])
+        with zipfile.ZipFile(output) as archive:
+            names = archive.namelist()
+            self.assertEqual(json.loads(archive.read('manifest.json'))['bills'], manifest['bills'])
+            for bill in manifest['bills']:
+                self.assertIn(bill['filename'], names)
+                self.assertTrue(archive.read(bill['filename']).startswith(b'%PDF'))
+        # the parent's connection (and the test transaction) survive the pool
+        self.assertEqual(Customer.objects.count(), 2)
+
+
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Ravi Patil")
+
+    def _job(self, age, **fields):
+        created_at = timezone.now() - age
+        return BillJob.objects.create(
+            customer=self.customer, key='k', created_at=created_at,
+            expires_at=created_at + timedelta(hours=1), **fields,
+        )
+
+    def test_ok_while_queued_jobs_are_fresh(self):
+        self._job(timedelta(seconds=10))
+        response = self.client.get(reverse('accounts:health'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['bill_queue']['queued'], 1)
+
+    def test_fails_when_no_worker_picks_up_the_queue(self):
+        self._job(bill_jobs.QUEUE_STALE_AFTER + timedelta(minutes=1))
+        response = self.client.get(reverse('accounts:health'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'stale_bill_queue')
+
+    def test_old_retried_job_is_not_stale_while_jobs_are_starting(self):
+        self._job(bill_jobs.QUEUE_STALE_AFTER + timedelta(minutes=1))
+        self._job(timedelta(seconds=30), status=BillJob.RUNNING, started_at=timezone.now())
+        self.assertEqual(self.client.get(reverse('accounts:health')).status_code, 200)
+
+
+class ChartPeriodTests(SimpleTestCase):
+    def test_count_matches_the_periods(self):
+        for start, end in [
+            (date(2026, 9, 1), date(2026, 9, 1)),
+            (date(2026, 9, 3), date(2026, 9, 29)),
+            (date(2025, 12, 31), date(2026, 3, 2)),
+            (date(2024, 2, 29), date(2026, 10, 18)),
+        ]:
+            for granularity in charts.GRANULARITIES:
+                with self.subTest(start=start, end=end, granularity=granularity):
+                    self.assertEqual(
+                        charts.count(start, end, granularity), len(charts.periods(start, end, granularity)),
+                    )
+
+    def test_count_of_a_huge_range_is_immediate(self):
+        self.assertEqual(charts.count(date(1, 1, 1), date(9999, 12, 31), 'month'), 9999 * 12)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_an_index(self):
+        customer = Customer.objects.create(name="Ravi Patil")
+        MilkEntry.objects.create(customer=customer, date=date(2026, 9, 10), quantity_ml=1000)
+        output = io.StringIO()
+        try:
+            call_command('check_query_plans', stdout=output)
+        except CommandError as e:
+            self.fail(f"{e}\n{output.getvalue()}")
+        self.assertIn('monthly_summary', output.getvalue())
+        self.assertIn('chart_data', output.getvalue())
+
+    def test_full_table_scan_fails(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite plan format")
+        self.assertFalse(_uses_index(MilkEntry.all_objects.filter(quantity_ml=1000).explain()))
+
+
+class BulkEntriesTests(ViewTestCase):
+    def _post(self, rows, key='sync-1'):
+        return self.client.post(
+            reverse('accounts:api_bulk_entries'), rows, content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_stored_response(self):
+        rows = [{'customer_name': 'Ravi Patil', 'date': '2026-09-10', 'quantity_ml': 1000}]
+        first = self._post(rows)
+        self.assertEqual(first.status_code, 201, first.content)
+        retry = self._post(rows)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(MilkEntry.objects.count(), 1)
+
+    def test_same_key_with_a_different_body_is_rejected(self):
+        self._post([{'customer_name': 'Ravi Patil', 'date': '2026-09-10', 'quantity_ml': 1000}])
+        response = self._post([{'customer_name': 'Ravi Patil', 'date': '2026-09-11', 'quantity_ml': 500}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(MilkEntry.objects.count(), 1)
+
+    def test_bad_row_is_reported_with_the_rest_saved(self):
+        response = self._post([
+            {'customer_name': 'Ravi Patil', 'date': '2026-09-10', 'quantity_ml': 1000},
+            {'customer_name': 42, 'date': '2026-09-10', 'quantity_ml': 1000},
+            {'customer_name': None, 'date': '2026-09-10', 'quantity_ml': 1000},
+        ], key='')
+        self.assertEqual(response.status_code, 207, response.content)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error'])
+        self.assertEqual(results[1]['error'], "customer_name must be a string")
+        self.assertEqual(MilkEntry.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self._post([{'customer_name': 'Ravi Patil', 'date': '2026-09-10', 'quantity_ml': 1000}])
+        other = get_user_model().objects.create_user('other', password='x')
+        self.client.force_login(other)
+        response = self._post([{'customer_name': 'Ravi Patil', 'date': '2026-09-11', 'quantity_ml': 500}])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(MilkEntry.objects.count(), 2)
+
+
+class RouteSheetTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Ravi Patil")
+        self.url = reverse('accounts:route_sheet')
+
+    def test_saves_the_grid(self):
+        response = self.client.post(self.url, {'date': '2026-09-10', f'qty_{self.customer.pk}': '1500'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(MilkEntry.objects.get(customer=self.customer).quantity_ml, 1500)
+
+    def test_bad_field_name_is_a_form_error(self):
+        response = self.client.post(self.url, {
+            'date': '2026-09-10', f'qty_{self.customer.pk}': '1500', 'qty_abc': '500',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['errors'], ["'qty_abc' is not a customer field; reload the sheet."])
+        self.assertFalse(MilkEntry.objects.exists())
+
+    def test_bad_quantity_is_shown_again(self):
+        response = self.client.post(self.url, {'date': '2026-09-10', f'qty_{self.customer.pk}': 'lots'})
+        self.assertEqual(response.context['errors'], ["'lots' is not a whole number of ml."])
+        self.assertEqual(response.context['customers'][0].value, 'lots')
+
+
+class BalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # opening 100; bills of 100 (July), 50 (August) and 50 (September); 60 paid in August
+        cls.customer = Customer.objects.create(name="Ravi Patil", balance_amount=Decimal('100'))
+        for day, quantity_ml in ((date(2026, 7, 10), 2000), (date(2026, 8, 10), 1000), (date(2026, 9, 10), 1000)):
+            MilkEntry.objects.create(customer=cls.customer, date=day, quantity_ml=quantity_ml)
+        Payment.objects.create(customer=cls.customer, date=date(2026, 8, 20), amount=Decimal('60'))
+
+    def _customer(self, year, month):
+        return balances.with_balances(Customer.objects.filter(pk=self.customer.pk), year, month).get()
+
+    def test_running_balance(self):
+        self.assertEqual(balances.balance(self._customer(2026, 9)), Decimal('240'))
+        self.assertEqual(balances.balance(self._customer(2026, 8)), Decimal('190'))
+        # a month without ledger rows carries the last one forward
+        self.assertEqual(balances.balance(self._customer(2026, 11)), Decimal('240'))
+        self.assertEqual(balances.balance(self._customer(2026, 6)), Decimal('100'))
+        due = Customer.objects.annotate(due=balances.outstanding(2026, 8)).get(pk=self.customer.pk).due
+        self.assertEqual(round(due, 2), Decimal('190'))
+
+    def test_carried_forward(self):
+        self.assertEqual(balances.carried_forward(self._customer(2026, 9)), Decimal('190'))
+        self.assertEqual(balances.carried_forward(self._customer(2026, 7)), Decimal('100'))
+        row = MonthlyLedger.objects.get(customer=self.customer, year=2026, month=9)
+        self.assertEqual(round(row.carried_forward, 2), Decimal('190'))
+
+    def test_ageing_settles_the_oldest_bills_first(self):
+        self.assertEqual(balances.ageing(self._customer(2026, 9)), {
+            'current': Decimal('50'),
+            '1_month': Decimal('50'),
+            '2_months': Decimal('100'),
+            '3_months_plus': Decimal('40'),
+        })
+
+    def test_credit_is_negative_current(self):
+        Payment.objects.create(customer=self.customer, date=date(2026, 9, 25), amount=Decimal('300'))
+        self.assertEqual(balances.ageing(self._customer(2026, 9)), {
+            'current': Decimal('-60'),
+            '1_month': Decimal('0'),
+            '2_months': Decimal('0'),
+            '3_months_plus': Decimal('0'),
+        })
+
+
+class PaymentViewTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Anita Iyer")
+        for month in (8, 9, 10):
+            MilkEntry.objects.create(customer=self.customer, date=date(2026, month, 5), quantity_ml=1000)
+
+    def _paid_to_date(self):
+        return [
+            (row.month, row.paid, row.paid_to_date)
+            for row in MonthlyLedger.objects.filter(customer=self.customer).order_by('year', 'month')
+        ]
+
+    def test_add_and_delete_payment_keep_running_totals(self):
+        response = self.client.post(
+            reverse('accounts:add_payment', args=[self.customer.pk]),
+            {'date': '2026-09-15', 'amount': '75.50', 'note': ''},
+        )
+        self.assertRedirects(response, reverse('accounts:customer_detail', args=[self.customer.pk]))
+        self.assertEqual(self._paid_to_date(), [
+            (8, Decimal('0'), Decimal('0')),
+            (9, Decimal('75.50'), Decimal('75.50')),
+            (10, Decimal('0'), Decimal('75.50')),
+        ])
+
+        payment = Payment.objects.get(customer=self.customer)
+        self.client.post(reverse('accounts:delete_payment', args=[payment.pk]))
+        self.assertEqual([paid_to_date for _, _, paid_to_date in self._paid_to_date()], [0, 0, 0])
+        self.assertEqual(ledger.diff(), [])
+
+    def test_payment_in_a_month_without_entries_creates_its_row(self):
+        self.client.post(
+            reverse('accounts:add_payment', args=[self.customer.pk]),
+            {'date': '2026-11-02', 'amount': '40', 'note': 'cash'},
+        )
+        row = MonthlyLedger.objects.get(customer=self.customer, year=2026, month=11)
+        self.assertEqual((row.paid, row.paid_to_date, round(row.billed_to_date, 2)), (40, 40, Decimal('150')))
+        self.assertEqual(ledger.diff(), [])
+
+
+class OpeningBalancesMigrationTests(TransactionTestCase):
+    before = ('accounts', '0016_payments')
+    after = ('accounts', '0017_opening_balances')
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+        return executor.loader.project_state([target]).apps
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('accounts')
+        self.addCleanup(self._migrate, latest[0])
+        apps = self._migrate(self.before)
+        Customer = apps.get_model('accounts', 'Customer')
+        MonthlyLedger = apps.get_model('accounts', 'MonthlyLedger')
+
+        this_month = timezone.localdate().replace(day=1)
+        self.last_month = this_month - timedelta(days=1)
+        two_months_ago = self.last_month.replace(day=1) - timedelta(days=1)
+        # "unpaid till previous month" was typed in by hand
+        self.settled = Customer.objects.create(name="Paid Up", balance_amount=Decimal('30'))
+        self.owing = Customer.objects.create(name="Owing", balance_amount=Decimal('500'))
+        for customer_id, day, amount in (
+            (self.settled.pk, two_months_ago, Decimal('100')),
+            (self.settled.pk, self.last_month, Decimal('50')),
+            (self.owing.pk, self.last_month, Decimal('100')),
+        ):
+            MonthlyLedger.objects.create(customer_id=customer_id, year=day.year, month=day.month, amount=amount)
+
+    def test_forward_and_back(self):
+        apps = self._migrate(self.after)
+        Customer = apps.get_model('accounts', 'Customer')
+        MonthlyLedger = apps.get_model('accounts', 'MonthlyLedger')
+        Payment = apps.get_model('accounts', 'Payment')
+        openings = dict(Customer.objects.values_list('pk', 'balance_amount'))
+        self.assertEqual(openings, {self.settled.pk: 0, self.owing.pk: 400})
+        payment = Payment.objects.get()
+        self.assertEqual((payment.customer_id, payment.amount, payment.date), (self.settled.pk, 120, self.last_month))
+        row = MonthlyLedger.objects.get(customer_id=self.settled.pk, year=self.last_month.year, month=self.last_month.month)
+        self.assertEqual((row.billed_to_date, row.paid_to_date), (150, 120))
+
+        apps = self._migrate(self.before)
+        Customer = apps.get_model('accounts', 'Customer')
+        Payment = apps.get_model('accounts', 'Payment')
+        openings = dict(Customer.objects.values_list('pk', 'balance_amount'))
+        self.assertEqual(openings, {self.settled.pk: 30, self.owing.pk: 500})
+        self.assertFalse(Payment.objects.exists())
+
+
+class SoftDeleteTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Sunita Rao")
+        self.entry = MilkEntry.objects.create(customer=self.customer, date=date(2026, 9, 10), quantity_ml=1000)
+        self.since = timezone.now().isoformat()
+
+    def _api(self, name, **params):
+        response = self.client.get(reverse(f'accounts:{name}'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_deleted_entry_is_hidden_and_reported(self):
+        response = self.client.delete(reverse('accounts:api_delete_entry', args=[self.entry.pk]))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(MilkEntry.objects.exists())
+        self.assertIsNotNone(MilkEntry.all_objects.get(pk=self.entry.pk).deleted_at)
+        self.assertEqual(MonthlyLedger.objects.get(customer=self.customer).total_ml, 0)
+        self.assertEqual(self._api('api_entries', updated_since=self.since), [])
+        deleted = self._api('api_deleted', updated_since=self.since)
+        self.assertEqual(
+            [(row['kind'], row['object_id'], row['uuid']) for row in deleted],
+            [('entry', self.entry.pk, str(self.entry.uuid))],
+        )
+
+    def test_deleted_customer_takes_its_entries(self):
+        self.client.post(reverse('accounts:delete_customer', args=[self.customer.pk]))
+
+        self.assertFalse(Customer.objects.exists())
+        self.assertFalse(MilkEntry.objects.exists())
+        self.assertFalse(MonthlyLedger.objects.exists())
+        self.assertEqual(self._api('api_customers'), [])
+        self.assertEqual(
+            [(row['kind'], row['object_id']) for row in self._api('api_deleted', kind='customer')],
+            [('customer', self.customer.pk)],
+        )
+        self.assertEqual(self._api('api_deleted', kind='entry'), [])
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Mohan Das")
+        for day in range(1, 6):
+            MilkEntry.objects.create(customer=self.customer, date=date(2026, 9, day), quantity_ml=500)
+
+    def test_large_customer_delete_is_finished_in_batches(self):
+        with mock.patch.object(deletion, 'PURGE_BATCH_SIZE', 2):
+            deletion.delete_customer(self.customer)
+        # too many entries to mark in the request
+        self.assertEqual(MilkEntry.objects.filter(customer_id=self.customer.pk).count(), 5)
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = deletion.purge(batch_size=2)
+        self.assertEqual(counts, {'entries_marked': 5, 'entries_removed': 0, 'customers_removed': 0})
+        marks = [q for q in queries if q['sql'].startswith('UPDATE "accounts_milkentry"')]
+        self.assertEqual(len(marks), 3)
+        self.assertFalse(MilkEntry.objects.exists())
+
+    def test_rows_past_retention_are_removed(self):
+        deletion.delete_customer(self.customer)
+        long_ago = timezone.now() - timedelta(days=deletion.RETENTION_DAYS + 1)
+        Customer.all_objects.filter(pk=self.customer.pk).update(deleted_at=long_ago)
+        MilkEntry.all_objects.update(deleted_at=long_ago)
+
+        counts = deletion.purge(batch_size=2)
+        self.assertEqual(counts, {'entries_marked': 0, 'entries_removed': 5, 'customers_removed': 1})
+        self.assertFalse(Customer.all_objects.exists())
+        self.assertFalse(MilkEntry.all_objects.exists())
+        # handsets still learn about the customer
+        self.assertTrue(SyncTombstone.objects.filter(kind=SyncTombstone.CUSTOMER, object_id=self.customer.pk).exists())
+
+
+class AuditFlushTests(TransactionTestCase):
+    def test_records_are_written_when_the_request_finishes(self):
+        with transaction.atomic():
+            audit.record('customer', 7, 'update', {'name': "Leela Menon"})
+        # buffered after the commit, not written yet
+        self.assertFalse(AuditLog.objects.exists())
+
+        request_finished.send(sender=self.__class__)
+        log = AuditLog.objects.get()
+        self.assertEqual((log.model, log.object_id, log.action), ('customer', 7, 'update'))
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            audit.record('customer', 1, 'create')
+            raise RuntimeError
+        request_finished.send(sender=self.__class__)
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_request_through_the_client_is_logged_with_its_user(self):
+        user = get_user_model().objects.create_user('clerk', password='unused')
+        customer = Customer.objects.create(name="Leela Menon")
+        self.client.force_login(user)
+        audit.flush()
+        response = self.client.post(
+            reverse('accounts:api_entries'),
+            {'customer_id': customer.pk, 'date': '2026-09-10', 'quantity_ml': 1000},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        log = AuditLog.objects.get(model='entry')
+        self.assertEqual((log.user_id, log.object_id), (user.pk, response.json()['entry_id']))
+
+
+class BillCacheTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Farah Khan")
+        self.entry = MilkEntry.objects.create(customer=self.customer, date=date(2026, 9, 10), quantity_ml=1000)
+        self.url = reverse('accounts:bill_pdf_month', args=[self.customer.pk, 2026, 9])
+
+    def _key(self):
+        return Bill(Bill.customers(2026, 9).get(pk=self.customer.pk), 2026, 9).key
+
+    def test_unchanged_bill_revalidates_with_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(pdf_cache.exists(self._key()))
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_entry_change_invalidates_the_bill(self):
+        etag = self.client.get(self.url)['ETag']
+        self.entry.quantity_ml = 1500
+        self.entry.save()
+        self.assertNotEqual(f'"{self._key()}"', etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_price_change_invalidates_the_bill(self):
+        before = self._key()
+        PriceSchedule.objects.create(effective_from=date(2026, 9, 1), price_per_litre=Decimal('55'))
+        self.assertNotEqual(self._key(), before)
+
+    def test_payment_invalidates_the_bill(self):
+        before = self._key()
+        Payment.objects.create(customer=self.customer, date=date(2026, 9, 20), amount=Decimal('10'))
+        self.assertNotEqual(self._key(), before)
+
+    def test_storing_does_not_evict_the_worker_sweep_does(self):
+        shutil.rmtree(default_storage.path(pdf_cache.CACHE_DIR), ignore_errors=True)
+        keys = [f"{n:02d}{'0' * 62}" for n in range(3)]
+        for age, key in zip((300, 200, 100), keys):
+            pdf_cache.put(key, b'%PDF' + b'x' * 96)
+            last_used = timezone.now().timestamp() - age
+            os.utime(default_storage.path(pdf_cache._path(key)), (last_used, last_used))
+        with mock.patch.object(pdf_cache, 'MAX_BYTES', 0):
+            pdf_cache.put('ff' + '0' * 62, b'%PDF')
+        self.assertTrue(all(pdf_cache.exists(key) for key in keys))
+
+        self.assertEqual(pdf_cache.evict(max_bytes=150), 2)
+        self.assertEqual([pdf_cache.exists(key) for key in keys], [False, False, True])
+
+
+class SyncTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Nisha Verma")
+        self.uuid = str(uuid.uuid4())
+        self.now = timezone.now()
+
+    def _row(self, quantity_ml=1000, seconds_ago=60, **fields):
+        return {
+            'uuid': self.uuid, 'customer_id': self.customer.pk, 'date': '2026-09-10',
+            'quantity_ml': quantity_ml, 'modified_at': (self.now - timedelta(seconds=seconds_ago)).isoformat(),
+            **fields,
+        }
+
+    def _push(self, *rows):
+        response = self.client.post(reverse('accounts:api_sync_push'), list(rows), content_type='application/json')
+        self.assertIn(response.status_code, (200, 207), response.content)
+        return [result['status'] for result in response.json()['results']], response.json()
+
+    def _pull(self, checkpoint=None, **params):
+        if checkpoint:
+            params['checkpoint'] = checkpoint
+        response = self.client.get(reverse('accounts:api_sync_pull'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_retried_push_changes_nothing(self):
+        self.assertEqual(self._push(self._row())[0], ['created'])
+        self.assertEqual(self._push(self._row())[0], ['unchanged'])
+        self.assertEqual(MilkEntry.objects.get().quantity_ml, 1000)
+        self.assertEqual(MonthlyLedger.objects.get(customer=self.customer).total_ml, 1000)
+
+    def test_last_writer_wins(self):
+        self._push(self._row(seconds_ago=60))
+        statuses, body = self._push(self._row(quantity_ml=500, seconds_ago=120))
+        self.assertEqual(statuses, ['stale'])
+        self.assertEqual(body['results'][0]['entry']['quantity_ml'], 1000)
+        self.assertEqual(self._push(self._row(quantity_ml=1500, seconds_ago=30))[0], ['updated'])
+        self.assertEqual(MilkEntry.objects.get().quantity_ml, 1500)
+        # the newer of two changes to one entry in a batch wins
+        statuses, _ = self._push(self._row(quantity_ml=700, seconds_ago=10), self._row(quantity_ml=800, seconds_ago=20))
+        self.assertEqual(statuses, ['updated', 'stale'])
+        self.assertEqual(MilkEntry.objects.get().quantity_ml, 700)
+
+    def test_future_modified_at_counts_as_now(self):
+        self._push(self._row(seconds_ago=-365 * 24 * 3600))
+        entry = MilkEntry.objects.get()
+        self.assertLessEqual(entry.modified_at, timezone.now())
+        # a later edit still wins
+        later = (timezone.now() + timedelta(seconds=1)).isoformat()
+        self.assertEqual(self._push(self._row(quantity_ml=400, modified_at=later))[0], ['updated'])
+
+    def test_deletes_and_tombstones(self):
+        self._push(self._row(seconds_ago=60))
+        entry = MilkEntry.objects.get()
+        self.client.delete(reverse('accounts:api_delete_entry', args=[entry.pk]))
+        # an edit made offline before the server's delete stays deleted
+        self.assertEqual(self._push(self._row(quantity_ml=500, seconds_ago=30))[0], ['stale'])
+        self.assertFalse(MilkEntry.objects.exists())
+
+        with mock.patch.object(sync, 'SETTLE', timedelta(0)):
+            pulled = self._pull()
+        self.assertEqual([(row['kind'], row['uuid']) for row in pulled['deleted']], [('entry', self.uuid)])
+        self.assertEqual(pulled['entries'], [])
+
+        other = str(uuid.uuid4())
+        self._push(self._row(uuid=other))
+        self.assertEqual(self._push(self._row(uuid=other, deleted=True, seconds_ago=0))[0], ['deleted'])
+        self.assertFalse(MilkEntry.objects.filter(uuid=other).exists())
+
+    def test_checkpoint_paging(self):
+        for day in (1, 2, 3):
+            MilkEntry.objects.create(customer=self.customer, date=date(2026, 9, day), quantity_ml=1000)
+        # changes younger than SETTLE wait for the next pull
+        self.assertEqual(self._pull()['entries'], [])
+
+        with mock.patch.object(sync, 'SETTLE', timedelta(0)):
+            first = self._pull(limit=2)
+            self.assertTrue(first['has_more'])
+            second = self._pull(first['checkpoint'], limit=2)
+            self.assertFalse(second['has_more'])
+            self.assertEqual(
+                sorted(row['date'] for row in first['entries'] + second['entries']),
+                ['2026-09-01', '2026-09-02', '2026-09-03'],
+            )
+            third = self._pull(second['checkpoint'])
+            self.assertEqual((third['entries'], third['customers']), ([], []))
+
+            MilkEntry.objects.filter(date=date(2026, 9, 2)).update(quantity_ml=2000, updated_at=timezone.now())
+            changed = self._pull(third['checkpoint'])
+            self.assertEqual([row['quantity_ml'] for row in changed['entries']], [2000])
+
+    def test_bad_checkpoint(self):
+        response = self.client.get(reverse('accounts:api_sync_pull'), {'checkpoint': 'forged'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CustomerDetailMonthsTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Pooja Shah")
+        for month in (5, 6, 7, 8, 9):
+            MilkEntry.objects.create(customer=self.customer, date=date(2026, month, 3), quantity_ml=1000)
+            MilkEntry.objects.create(customer=self.customer, date=date(2026, month, 4), quantity_ml=500)
+
+    def test_only_recent_months_carry_their_entries(self):
+        response = self.client.get(reverse('accounts:customer_detail', args=[self.customer.pk]))
+        self.assertEqual(response.status_code, 200)
+        months = response.context['months_data']
+        self.assertEqual([month['month'] for month in months], [9, 8, 7, 6, 5])
+        self.assertEqual([month['loaded'] for month in months], [True, True, True, False, False])
+        self.assertEqual([len(month['entries']) for month in months], [2, 2, 2, 0, 0])
+        self.assertEqual([month['entry_count'] for month in months], [2] * 5)
+        self.assertEqual(response.context['total_entries'], 10)
+
+    def test_older_month_fragment(self):
+        url = reverse('accounts:customer_month_entries', args=[self.customer.pk, 2026, 5])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry.date.day for entry in response.context['entries']], [4, 3])
+        self.assertEqual(
+            self.client.get(reverse('accounts:customer_month_entries', args=[self.customer.pk, 2026, 13])).status_code,
+            400,
+        )
+
+    def test_fragment_of_unknown_or_deleted_customer_is_404(self):
+        missing = reverse('accounts:customer_month_entries', args=[self.customer.pk + 1000, 2026, 5])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+        deletion.delete_customer(self.customer)
+        url = reverse('accounts:customer_month_entries', args=[self.customer.pk, 2026, 5])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_month_missing_from_the_ledger_is_skipped(self):
+        MonthlyLedger.objects.filter(customer=self.customer, month=8).delete()
+        with self.assertLogs('accounts.views', 'WARNING'):
+            response = self.client.get(reverse('accounts:customer_detail', args=[self.customer.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([month['month'] for month in response.context['months_data']], [9, 7, 6, 5])
+
+
+class CustomerListTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.month_start = timezone.localdate().replace(day=1)
+        last_month = self.month_start - timedelta(days=1)
+        self.regular = Customer.objects.create(name="Meena Rao")
+        MilkEntry.objects.create(customer=self.regular, date=last_month, quantity_ml=2000)
+        MilkEntry.objects.create(customer=self.regular, date=self.month_start, quantity_ml=1000)
+        self.idle = Customer.objects.create(name="Anil Kale")
+
+    def _names(self, **params):
+        response = self.client.get(reverse('accounts:customer_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [customer.name for customer in response.context['customers']]
+
+    def test_totals_are_annotated(self):
+        response = self.client.get(reverse('accounts:customer_list'), {'sort': 'name'})
+        idle, regular = response.context['customers']
+        self.assertEqual(regular.total_litres, Decimal('3.00'))
+        self.assertEqual(regular.month_litres, Decimal('1.00'))
+        self.assertEqual(regular.amount_due, Decimal('150.00'))
+        self.assertEqual(regular.last_delivery, self.month_start)
+        self.assertEqual((idle.total_litres, idle.amount_due, idle.last_delivery), (0, 0, None))
+
+    def test_sort_and_search(self):
+        self.assertEqual(self._names(sort='name'), ["Anil Kale", "Meena Rao"])
+        self.assertEqual(self._names(sort='-litres'), ["Meena Rao", "Anil Kale"])
+        self.assertEqual(self._names(sort='last'), ["Anil Kale", "Meena Rao"])
+        self.assertEqual(self._names(sort='bogus'), ["Anil Kale", "Meena Rao"])
+        self.assertEqual(self._names(q='meena'), ["Meena Rao"])
+
+    def test_paginated(self):
+        with mock.patch('accounts.views.CUSTOMERS_PER_PAGE', 1):
+            self.assertEqual(self._names(sort='name', page=2), ["Meena Rao"])
+            self.assertEqual(self._names(sort='name', page=99), ["Meena Rao"])
+
+    def test_query_count_does_not_grow_with_customers(self):
+        url = reverse('accounts:customer_list')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for n in range(5):
+            customer = Customer.objects.create(name=f"Customer {n}")
+            MilkEntry.objects.create(customer=customer, date=self.month_start, quantity_ml=500)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['customers']), 7)
+        self.assertEqual(len(many), len(few))
+
+
+class LedgerTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Lata Naik", balance_amount=Decimal('20'))
+
+    def _months(self):
+        return list(
+            MonthlyLedger.objects.filter(customer=self.customer).order_by('year', 'month')
+            .values_list('month', 'total_ml', 'entry_count', 'amount', 'billed_to_date')
+        )
+
+    def test_entry_views_keep_the_ledger(self):
+        self.client.post(reverse('accounts:add_entry'), {
+            'customer': self.customer.pk, 'date': '2026-09-05', 'quantity_ml': 1000,
+        })
+        entry = MilkEntry.objects.get(customer=self.customer)
+        self.assertEqual(self._months(), [(9, 1000, 1, 50, 70)])
+
+        self.client.post(reverse('accounts:edit_entry', args=[entry.pk]), {
+            'customer': self.customer.pk, 'date': '2026-10-05', 'quantity_ml': 1500,
+        })
+        self.assertEqual(self._months(), [(9, 0, 0, 0, 20), (10, 1500, 1, 75, 95)])
+
+        self.client.post(reverse('accounts:delete_entry', args=[entry.pk]))
+        self.assertEqual(self._months(), [(9, 0, 0, 0, 20), (10, 0, 0, 0, 20)])
+        self.assertEqual(ledger.diff(), [])
+
+    def test_api_delete_keeps_the_ledger(self):
+        entry = MilkEntry.objects.create(customer=self.customer, date=date(2026, 9, 5), quantity_ml=500)
+        response = self.client.delete(reverse('accounts:api_delete_entry', args=[entry.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._months(), [(9, 0, 0, 0, 20)])
+
+    def test_rebuild_corrects_drift(self):
+        MilkEntry.objects.create(customer=self.customer, date=date(2026, 9, 5), quantity_ml=1000)
+        MilkEntry.objects.create(customer=self.customer, date=date(2026, 10, 5), quantity_ml=2000)
+        MonthlyLedger.objects.filter(customer=self.customer, month=9).update(total_ml=1, amount=0)
+        [(customer_id, year, month, stored, expected)] = ledger.diff()
+        self.assertEqual((customer_id, year, month), (self.customer.pk, 2026, 9))
+        self.assertEqual(expected[:3], (1000, 1, 50))
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ledger', '--check', stdout=io.StringIO())
+        call_command('rebuild_ledger', stdout=io.StringIO())
+        self.assertEqual(ledger.diff(), [])
+        self.assertEqual(self._months(), [(9, 1000, 1, 50, 70), (10, 2000, 1, 100, 170)])
+
+
+class DashboardStatsTests(ViewTestCase):
+    def _stored(self):
+        row = stats.current()
+        return {field: getattr(row, field) for field in stats.FIELDS}
+
+    def test_signals_keep_the_totals(self):
+        ravi = Customer.objects.create(name="Ravi Patil", balance_amount=Decimal('100'))
+        asha = Customer.objects.create(name="Asha More")
+        entry = MilkEntry.objects.create(customer=ravi, date=date(2026, 9, 1), quantity_ml=1000)
+        MilkEntry.objects.create(customer=asha, date=date(2026, 9, 2), quantity_ml=2000)
+        Payment.objects.create(customer=ravi, date=date(2026, 9, 3), amount=Decimal('30'))
+        entry.quantity_ml = 1500
+        entry.save()
+        asha.balance_amount = Decimal('-10')
+        asha.save()
+        self.assertEqual(self._stored(), {
+            'customer_count': 2, 'total_ml': 3500, 'total_amount': Decimal('175'),
+            'total_balance': Decimal('90'), 'total_paid': Decimal('30'),
+        })
+
+        deletion.delete_customer(asha)
+        self.assertEqual(self._stored(), stats.compute())
+        self.assertEqual(self._stored()['customer_count'], 1)
+
+    def test_home_reads_the_stats_row(self):
+        customer = Customer.objects.create(name="Ravi Patil", balance_amount=Decimal('100'))
+        MilkEntry.objects.create(customer=customer, date=date(2026, 9, 1), quantity_ml=2000)
+        Payment.objects.create(customer=customer, date=date(2026, 9, 3), amount=Decimal('30'))
+        response = self.client.get(reverse('accounts:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_customers'], 1)
+        self.assertEqual(response.context['total_litres'], Decimal('2.00'))
+        self.assertEqual(response.context['total_amount'], Decimal('100.00'))
+        self.assertEqual(response.context['total_balance'], Decimal('170.00'))
+
+    def test_reconcile_corrects_drift(self):
+        customer = Customer.objects.create(name="Ravi Patil")
+        MilkEntry.objects.create(customer=customer, date=date(2026, 9, 1), quantity_ml=1000)
+        stats.adjust(total_ml=7, customer_count=3)
+        out = io.StringIO()
+        call_command('reconcile_dashboard_stats', stdout=out)
+        self.assertIn("customer_count: stored 4, computed 1", out.getvalue())
+        self.assertIn("total_ml: stored 1007, computed 1000", out.getvalue())
+        self.assertEqual(self._stored(), stats.compute())
+        self.assertEqual(stats.reconcile()[1], {})
+
+
+class MonthlySummaryTests(ViewTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        kiran = Customer.objects.create(name="Kiran Joshi")
+        asha = Customer.objects.create(name="Asha More")
+        MilkEntry.objects.create(customer=kiran, date=date(2026, 8, 10), quantity_ml=1000)
+        MilkEntry.objects.create(customer=kiran, date=date(2026, 9, 5), quantity_ml=2000)
+        MilkEntry.objects.create(customer=kiran, date=date(2026, 9, 20), quantity_ml=1000)
+        MilkEntry.objects.create(customer=asha, date=date(2026, 9, 5), quantity_ml=500)
+
+    def _get(self, **params):
+        response = self.client.get(reverse('accounts:monthly_summary'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def _rows(self, context):
+        return [
+            (row['name'], row['total_ml'], row['amount'], row['previous_ml'], row['change'])
+            for row in context['summary']
+        ]
+
+    def test_month_compares_with_the_month_before(self):
+        context = self._get(month='2026-09')
+        self.assertEqual(self._rows(context), [
+            ("Asha More", 500, Decimal('25.00'), 0, None),
+            ("Kiran Joshi", 3000, Decimal('150.00'), 1000, Decimal('200.0')),
+        ])
+        self.assertEqual(context['totals']['amount'], Decimal('175.00'))
+        self.assertEqual((context['previous_start'], context['previous_end']), (date(2026, 8, 1), date(2026, 8, 31)))
+        self.assertEqual((context['next_start'], context['next_end']), (date(2026, 10, 1), date(2026, 10, 31)))
+
+    def test_day_range_is_summed_from_entries(self):
+        context = self._get(start='2026-09-15', end='2026-09-25')
+        self.assertEqual(self._rows(context), [
+            ("Asha More", 0, Decimal('0.00'), 500, Decimal('-100.0')),
+            ("Kiran Joshi", 1000, Decimal('50.00'), 2000, Decimal('-50.0')),
+        ])
+        self.assertEqual((context['previous_start'], context['previous_end']), (date(2026, 9, 4), date(2026, 9, 14)))
+        self.assertEqual((context['next_start'], context['next_end']), (date(2026, 9, 26), date(2026, 10, 6)))
+
+    def test_ledger_and_entry_totals_agree(self):
+        start, end = date(2026, 8, 1), date(2026, 12, 31)
+        # one query for the rows, one for the grand totals
+        with self.assertNumQueries(2):
+            from_ledger = list(reports.customer_totals(start, end)[0])
+        with mock.patch('accounts.reports.is_whole_months', return_value=False):
+            from_entries = list(reports.customer_totals(start, end)[0])
+        self.assertEqual(from_ledger, from_entries)
+
+    def test_paginated(self):
+        with mock.patch('accounts.views.SUMMARY_PER_PAGE', 1):
+            context = self._get(year='2026', page=2)
+        self.assertEqual([row['name'] for row in context['summary']], ["Kiran Joshi"])
+        self.assertEqual(context['totals']['total_ml'], 4500)
+
+    def test_bad_period_is_rejected(self):
+        url = reverse('accounts:monthly_summary')
+        for params in ({'month': '2026-13'}, {'year': '26x'}, {'start': '2026-09-10', 'end': '2026-09-01'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class ChangedRowsApiTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now() - timedelta(days=10)
+        self.customers = []
+        for n in range(5):
+            customer = Customer.objects.create(name=f"Customer {n}")
+            Customer.objects.filter(pk=customer.pk).update(updated_at=self.start + timedelta(days=n))
+            self.customers.append(customer)
+
+    def _pages(self, url, params=None):
+        """(ids of each page) following "next" until it is null."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            pages.append([row['id'] for row in body['results']])
+            if not body['next']:
+                return pages
+            response = self.client.get(body['next'])
+
+    def test_cursor_pages_in_updated_order(self):
+        pages = self._pages(reverse('accounts:api_customers'), {'page_size': 2})
+        self.assertEqual(pages, [
+            [self.customers[0].pk, self.customers[1].pk],
+            [self.customers[2].pk, self.customers[3].pk],
+            [self.customers[4].pk],
+        ])
+
+    def test_row_changed_while_paging_comes_again_at_the_end(self):
+        body = self.client.get(reverse('accounts:api_customers'), {'page_size': 2}).json()
+        self.customers[0].name = "Customer 0 renamed"
+        self.customers[0].save()
+        rest = self._pages(body['next'])
+        self.assertEqual(sum(rest, []), [customer.pk for customer in self.customers[2:] + self.customers[:1]])
+
+    def test_updated_since(self):
+        url = reverse('accounts:api_customers')
+        since = self.start + timedelta(days=3)
+        self.assertEqual(self._pages(url, {'updated_since': since.isoformat()}), [
+            [self.customers[3].pk, self.customers[4].pk],
+        ])
+        naive = timezone.make_naive(since).isoformat()
+        self.assertEqual(self._pages(url, {'updated_since': naive}), [
+            [self.customers[3].pk, self.customers[4].pk],
+        ])
+        self.assertEqual(self.client.get(url, {'updated_since': 'yesterday'}).status_code, 400)
+
+    def test_entries_of_one_customer(self):
+        customer = self.customers[2]
+        entry = MilkEntry.objects.create(customer=customer, date=date(2026, 9, 1), quantity_ml=500)
+        MilkEntry.objects.create(customer=self.customers[3], date=date(2026, 9, 1), quantity_ml=500)
+        url = reverse('accounts:api_entries')
+        [row] = self.client.get(url, {'customer': customer.pk}).json()['results']
+        self.assertEqual((row['id'], row['quantity_ml'], Decimal(str(row['unit_price']))), (entry.pk, 500, 50))
+        self.assertEqual(self.client.get(url, {'customer': 'x'}).status_code, 400)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('accounts:api_customers')).status_code, 403)
+
+
+class BenchmarkTests(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        call_command(
+            'seed_benchmark_data', customers=3, years=1, end=date(2026, 9, 30), seed=1, stdout=io.StringIO(),
+        )
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.unlink, output.name)
+        self.output = output.name
+        # the test runner has already set up the test environment
+        for name in ('setup_test_environment', 'teardown_test_environment'):
+            patcher = mock.patch(f'accounts.management.commands.run_benchmarks.{name}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_seeded_data_is_consistent(self):
+        self.assertEqual(Customer.objects.count(), 3)
+        self.assertGreater(MilkEntry.objects.count(), 3 * 300)
+        self.assertEqual(MilkEntry.objects.filter(date__gt=date(2026, 9, 30)).count(), 0)
+        self.assertEqual(Payment.objects.filter(date__gt=date(2026, 9, 30)).count(), 0)
+        self.assertEqual(ledger.diff(), [])
+        self.assertEqual(stats.reconcile()[1], {})
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', customers=3, years=1, stdout=io.StringIO())
+
+    def test_views_stay_within_their_query_budgets(self):
+        call_command('run_benchmarks', output=self.output, repeat=1, stdout=io.StringIO())
+        with open(self.output) as f:
+            report = json.load(f)
+        self.assertEqual(report['dataset']['customers'], 3)
+        results = {result['name']: result for result in report['results']}
+        self.assertEqual(set(results), {case.name for case in benchmarks.CASES})
+        for name, result in results.items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertFalse(result['over_budget'], result)
+
+    def test_over_budget_fails(self):
+        with mock.patch.object(benchmarks, 'CASES', (benchmarks.Case('home', 'accounts:home', (), '', 0),)):
+            with self.assertRaisesMessage(CommandError, "over query budget: home"):
+                call_command('run_benchmarks', output=self.output, repeat=1, stdout=io.StringIO())
+
+
+class BillPdfTests(SimpleTestCase):
+    def test_rows_are_formatted_in_one_pass(self):
+        rows = iter([
+            (date(2026, 9, 2), 1500, Decimal('52')),
+            (date(2026, 9, 1), 1000, Decimal('50')),
+            (date(2026, 9, 30), 200, Decimal('52.5')),
+        ])
+        table_rows, first, last = pdf_generation._entry_rows(rows)
+        self.assertEqual(table_rows, [
+            ['02-09-2026', '1500', '1.500', '52.00', '78.00'],
+            ['01-09-2026', '1000', '1.000', '50.00', '50.00'],
+            ['30-09-2026', '200', '0.200', '52.50', '10.50'],
+        ])
+        self.assertEqual((first, last), (date(2026, 9, 1), date(2026, 9, 30)))
+
+    def test_long_table_is_split_with_the_header_on_each_part(self):
+        table_rows = [['01-09-2026', '1000', '1.000', '50.00', '50.00']] * 100
+        tables = pdf_generation._entry_tables(table_rows, ['TOTAL', '100000', '100.00', '50.00', '5000.00'])
+        self.assertEqual([len(table._cellvalues) for table in tables], [41, 41, 22])
+        for table in tables:
+            self.assertEqual(table._cellvalues[0], pdf_generation.ENTRY_HEADER)
+        self.assertEqual(tables[-1]._cellvalues[-1][0], 'TOTAL')
+
+    def test_long_bill_renders_a_page_per_table(self):
+        rows = benchmarks._bill_rows(1000, date(2026, 9, 30))
+        total_ml = sum(quantity for _, quantity, _ in rows)
+        pdf = pdf_generation.generate_bill_pdf(
+            customer=Customer(name="Kiran Joshi"),
+            rows=rows,
+            total_ml=total_ml,
+            total_litres=Decimal(total_ml) / 1000,
+            total_amount=sum(quantity * price for _, quantity, price in rows) / 1000,
+        ).getvalue()
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        tables = -(-1001 // pdf_generation.ENTRY_ROWS_PER_TABLE)
+        self.assertIn(len(benchmarks.PDF_PAGE.findall(pdf)), (tables, tables + 1))
+
+    def test_empty_bill(self):
+        pdf = pdf_generation.generate_bill_pdf(
+            customer=Customer(name="Kiran Joshi"), rows=[], total_ml=0, total_litres=Decimal(0), total_amount=0,
+        ).getvalue()
+        self.assertEqual(len(benchmarks.PDF_PAGE.findall(pdf)), 1)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_bill_pdf', rows=[30, 200], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['30', '200'])
+
+
+class CustomerSearchTests(ViewTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name in ("Ravi Patil", "Ravindra  Rao", "Asha Ravikumar", "Meena Rao"):
+            Customer.objects.create(name=name)
+
+    def _search(self, **params):
+        response = self.client.get(reverse('accounts:customer_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [result['text'] for result in response.json()['results']]
+
+    def test_prefix_matches_come_first(self):
+        self.assertEqual(self._search(q="  RAV"), ["Ravi Patil", "Ravindra  Rao", "Asha Ravikumar"])
+        self.assertEqual(self._search(q="ravindra rao"), ["Ravindra  Rao"])
+        # too short to match inside names
+        self.assertEqual(self._search(q="ra"), ["Ravi Patil", "Ravindra  Rao"])
+        self.assertEqual(self._search(q="rao"), ["Meena Rao", "Ravindra  Rao"])
+        self.assertEqual(self._search(q=""), [])
+
+    def test_limit(self):
+        self.assertEqual(self._search(q="rav", limit=1), ["Ravi Patil"])
+        url = reverse('accounts:customer_search')
+        self.assertEqual(self.client.get(url, {'q': 'rav', 'limit': 'all'}).status_code, 400)
+
+    def test_deleted_customers_are_not_found(self):
+        deletion.delete_customer(Customer.objects.get(name="Ravi Patil"))
+        self.assertEqual(self._search(q="ravi"), ["Ravindra  Rao", "Asha Ravikumar"])
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('accounts:customer_search'), {'q': 'rav'}).status_code, 302)
+
+    def test_entry_form_lists_only_the_chosen_customer(self):
+        response = self.client.get(reverse('accounts:add_entry'))
+        self.assertNotContains(response, "Ravi Patil")
+        chosen = Customer.objects.get(name="Meena Rao")
+        entry = MilkEntry.objects.create(customer=chosen, date=date(2026, 9, 1), quantity_ml=500)
+        response = self.client.get(reverse('accounts:edit_entry', args=[entry.pk]))
+        self.assertContains(response, "Meena Rao")
+        self.assertNotContains(response, "Ravi Patil")
+
+    def test_choice_is_validated_by_primary_key(self):
+        chosen = Customer.objects.get(name="Meena Rao")
+        form = MilkEntryForm({'customer': chosen.pk, 'date': '2026-09-01', 'quantity_ml': 500})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(form.is_valid(), form.errors)
+        # the choice, then the model's own foreign key check; neither lists customers
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertIn(f'"accounts_customer"."id" = {chosen.pk}', query['sql'])
+        self.assertEqual(form.cleaned_data['customer'], chosen)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api_views, metrics, views
 
 app_name = 'accounts'
 
@@ -10,22 +10,54 @@ urlpatterns = [
 
     # Customer Management
     path('customers/', views.customer_list, name='customer_list'),
+    path('customers/search/', views.customer_search, name='customer_search'),
     path('customers/<int:customer_id>/', views.customer_detail, name='customer_detail'),
+    path('customers/<int:customer_id>/months/<int:year>/<int:month>/', views.customer_month_entries, name='customer_month_entries'),
     path('customers/<int:customer_id>/edit/', views.edit_customer, name='edit_customer'),
     path('customers/<int:customer_id>/delete/', views.delete_customer, name='delete_customer'),
 
+    # Payments
+    path('customers/<int:customer_id>/payments/add/', views.add_payment, name='add_payment'),
+    path('payments/<int:payment_id>/delete/', views.delete_payment, name='delete_payment'),
+
     # Bill PDF
     path('customers/<int:customer_id>/bill-pdf/', views.bill_pdf, name='bill_pdf'),
     path('customers/<int:customer_id>/bill-pdf/<int:year>/<int:month>/', views.bill_pdf, name='bill_pdf_month'),
 
+    # Bill PDFs rendered by run_bill_worker (see accounts.bill_jobs)
+    path('customers/<int:customer_id>/bill-jobs/', views.bill_job_create, name='bill_job_create'),
+    path('customers/<int:customer_id>/bill-jobs/<int:year>/<int:month>/', views.bill_job_create, name='bill_job_create_month'),
+    path('bill-jobs/<uuid:job_id>/', views.bill_job_status, name='bill_job_status'),
+    path('bill-jobs/<uuid:job_id>/download/', views.bill_job_download, name='bill_job_download'),
+
     # Chart data
     path('customers/<int:customer_id>/chart-data/', views.chart_data, name='chart_data'),
 
     # Milk Entry Management
     path('entry/add/', views.add_entry, name='add_entry'),
+    path('entry/route-sheet/', views.route_sheet, name='route_sheet'),
     path('entry/<int:entry_id>/edit/', views.edit_entry, name='edit_entry'),
     path('entry/<int:entry_id>/delete/', views.delete_entry, name='delete_entry'),
 
     # Reports
     path('monthly-summary/', views.monthly_summary, name='monthly_summary'),
+
+    # Exports (?format=csv|xlsx&start=&end=&customer=)
+    path('export/entries/', views.export_entries, name='export_entries'),
+    path('export/monthly/', views.export_monthly, name='export_monthly'),
+
+    # API
+    path('api/customers/', api_views.list_customers, name='api_customers'),
+    path('api/entries/', api_views.entries, name='api_entries'),
+    path('api/entries/bulk/', api_views.bulk_create_entries, name='api_bulk_entries'),
+    path('api/entries/<int:entry_id>/', api_views.delete_entry, name='api_delete_entry'),
+    path('api/deleted/', api_views.list_deleted, name='api_deleted'),
+    path('api/sync/push/', api_views.sync_push, name='api_sync_push'),
+    path('api/sync/pull/', api_views.sync_pull, name='api_sync_pull'),
+
+    # Render health check: the site is up and the bill queue is being worked
+    path('healthz/', views.health, name='health'),
+
+    # Prometheus scrape endpoint (see accounts.metrics)
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
@@ -1,37 +1,74 @@
+import asyncio
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse, HttpResponseRedirect
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse,
+)
 from django.views.decorators.http import require_http_methods
-from django.db.models import Sum
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import (
+    DateField, F, IntegerField, OuterRef, Q, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta, datetime
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from datetime import date, timedelta, datetime
 from decimal import Decimal
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.conf import settings
 
-from .models import Customer, MilkEntry, PRICE_PER_LITRE
-from .forms import MilkEntryForm, CustomerForm
-from .pdf_generation import generate_bill_pdf
+from . import balances, bill_jobs, bulk, charts, deletion, exports, pdf_cache, pricing, reports, search
+from . import stats as dashboard_stats
+from .billing import Bill
+from .customers import get_or_create_by_name
+from .models import BillJob, Customer, MilkEntry, MonthlyLedger, Payment
+from .forms import MilkEntryForm, CustomerForm, PaymentForm
+from .periods import month_range, next_month, next_period
+
+logger = logging.getLogger(__name__)
+
 
+def async_login_required(view):
+    """login_required for async views (Django 4.2's only wraps sync ones)."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # loads the session and user on the database thread; later reads are cached
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path(), 'login')
+        return await view(request, *args, **kwargs)
+    return wrapper
 
 
 # Dashboard
 # ...existing code...
 
 
-@login_required(login_url='login')
-def home(request):
+@async_login_required
+async def home(request):
     try:
-        total_customers = Customer.objects.count()
-        total_ml = MilkEntry.objects.aggregate(total=Sum('quantity_ml'))['total'] or 0
+        # running totals, kept up to date by accounts.stats, and the latest entries
+        stats, last_entries = await asyncio.gather(
+            sync_to_async(dashboard_stats.current)(),
+            _last_entries(),
+        )
+        total_customers = stats.customer_count
+        total_ml = stats.total_ml
         total_litres = round(Decimal(total_ml) / Decimal(1000), 2) if total_ml else Decimal(0)
-        # total amount across all customers / entries
-        total_amount = round((Decimal(total_ml) / Decimal(1000)) * Decimal(PRICE_PER_LITRE), 2) if total_ml else Decimal(0)
-        total_balance = Customer.objects.aggregate(balance=Sum('balance_amount'))['balance'] or Decimal(0)
-        last_entries = MilkEntry.objects.select_related('customer').order_by('-date')[:10]
+        total_amount = round(stats.total_amount, 2)
+        # opening balances plus everything billed, less everything paid
+        total_balance = stats.total_balance + stats.total_amount - stats.total_paid
         context = {
             'total_customers': total_customers,
             'total_litres': total_litres,
@@ -39,9 +76,9 @@ def home(request):
             'total_amount': total_amount,
             'last_entries': last_entries,
         }
-        return render(request, 'accounts/home.html', context)
+        return await sync_to_async(render)(request, 'accounts/home.html', context)
     except Exception as e:
-        return render(request, 'accounts/home.html', {
+        return await sync_to_async(render)(request, 'accounts/home.html', {
             'total_customers': 0,
             'total_litres': 0,
             'total_balance': 0,
@@ -49,54 +86,176 @@ def home(request):
             'last_entries': [],
             'error': str(e)
         })
+
+
+async def _last_entries():
+    entries = pricing.with_price(
+        MilkEntry.objects.filter(customer__deleted_at__isnull=True).select_related('customer')
+    ).order_by('-date')[:10]
+    return [entry async for entry in entries]
 # ...existing code...
 
+CUSTOMERS_PER_PAGE = 50
+
+# sort key (as used in the ?sort= query string) -> ordering
+CUSTOMER_SORTS = {
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+    'litres': ('total_ml', 'id'),
+    '-litres': ('-total_ml', '-id'),
+    'month': ('month_ml', 'id'),
+    '-month': ('-month_ml', '-id'),
+    'due': ('amount_due', 'id'),
+    '-due': ('-amount_due', '-id'),
+    'last': (F('last_delivery').asc(nulls_first=True), 'id'),
+    '-last': (F('last_delivery').desc(nulls_last=True), '-id'),
+    'created': ('created_at', 'id'),
+    '-created': ('-created_at', '-id'),
+}
+
+
+def _entry_total(**filters):
+    """Correlated SUM(quantity_ml) of a customer's entries, 0 when there are none."""
+    entries = (
+        MilkEntry.objects.filter(customer=OuterRef('pk'), **filters)
+        .order_by()
+        .values('customer')
+        .annotate(total=Sum('quantity_ml'))
+        .values('total')
+    )
+    return Coalesce(Subquery(entries, output_field=IntegerField()), 0)
+
+
+def annotated_customers(month_start):
+    """
+    Customers with their totals computed in the same query:
+    total_ml, month_ml (since month_start), last_delivery and
+    amount_due (the balance at the end of the month, from the ledger's
+    running totals).
+    """
+    last_delivery = (
+        MilkEntry.objects.filter(customer=OuterRef('pk'))
+        .order_by('-date')
+        .values('date')[:1]
+    )
+    return Customer.objects.annotate(
+        total_ml=_entry_total(),
+        month_ml=_entry_total(date__gte=month_start),
+        last_delivery=Subquery(last_delivery, output_field=DateField()),
+        amount_due=balances.outstanding(month_start.year, month_start.month),
+    )
+
+
 @login_required(login_url='login')
 def customer_list(request):
-    customers = Customer.objects.all()
-    for customer in customers:
-        total_ml = MilkEntry.objects.filter(customer=customer).aggregate(total=Sum('quantity_ml'))['total'] or 0
-        customer.total_ml = total_ml
-        customer.total_litres = round(Decimal(total_ml) / Decimal(1000), 2) if total_ml else Decimal(0)
-    return render(request, 'accounts/customer_list.html', {'customers': customers})
+    month_start = timezone.localdate().replace(day=1)
+    query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', '-created')
+    if sort not in CUSTOMER_SORTS:
+        sort = '-created'
+
+    customers = annotated_customers(month_start)
+    if query:
+        customers = customers.filter(name__icontains=query)
+    customers = customers.order_by(*CUSTOMER_SORTS[sort])
+
+    page = Paginator(customers, CUSTOMERS_PER_PAGE).get_page(request.GET.get('page'))
+    for customer in page:
+        customer.total_litres = round(Decimal(customer.total_ml) / Decimal(1000), 2)
+        customer.month_litres = round(Decimal(customer.month_ml) / Decimal(1000), 2)
+        customer.amount_due = round(customer.amount_due, 2)
+
+    return render(request, 'accounts/customer_list.html', {
+        'customers': page,
+        'page_obj': page,
+        'q': query,
+        'sort': sort,
+        'month_start': month_start,
+    })
+
+RECENT_MONTHS = 3
+RECENT_PAYMENTS = 10
+
+AGEING_LABELS = {
+    'current': 'This month',
+    '1_month': '1 month',
+    '2_months': '2 months',
+    '3_months_plus': '3+ months',
+}
+
 
 @login_required(login_url='login')
 def customer_detail(request, customer_id):
-    customer = get_object_or_404(Customer, id=customer_id)
-    
-    entries = MilkEntry.objects.filter(customer=customer).order_by('-date')
-    
-    months_data = {}
-    for entry in entries:
-        key = (entry.date.year, entry.date.month)
-        if key not in months_data:
-            months_data[key] = {
-                'year': entry.date.year,
-                'month': entry.date.month,
-                'month_name': entry.date.strftime('%B %Y'),
-                'entries': [],
-                'total_ml': 0,
-                'total_litres': Decimal(0),
-                'total_amount': Decimal(0),
-            }
-        months_data[key]['entries'].append(entry)
-        months_data[key]['total_ml'] += entry.quantity_ml
-        months_data[key]['total_amount'] += entry.amount
-    
-    for month_key in months_data:
-        ml = months_data[month_key]['total_ml']
-        months_data[month_key]['total_litres'] = round(Decimal(ml) / Decimal(1000), 2)
-        months_data[month_key]['total_amount'] = round(months_data[month_key]['total_amount'], 2)
-    
-    sorted_months = sorted(months_data.values(), key=lambda x: (x['year'], x['month']), reverse=True)
-    
+    # balances are read from the ledger's running totals in the same query
+    customer = get_object_or_404(balances.with_balances(Customer.objects.all()), id=customer_id)
+
+    # month totals come from the ledger (one row per month); only the most
+    # recent months are rendered with their entries, older ones load on demand
+    months = [
+        _month_bucket(row.year, row.month, row.total_ml, row.amount, row.entry_count, row.paid, row.balance)
+        for row in customer.ledger.filter(Q(entry_count__gt=0) | ~Q(paid=0)).order_by('-year', '-month')
+    ]
+    recent = months[:RECENT_MONTHS]
+    if recent:
+        oldest = recent[-1]
+        entries = pricing.with_price(MilkEntry.objects.filter(
+            customer=customer, date__gte=date(oldest['year'], oldest['month'], 1)
+        )).order_by('-date', '-id')
+        by_month = {(month['year'], month['month']): month for month in recent}
+        unlisted = set()
+        for entry in entries:
+            month = by_month.get((entry.date.year, entry.date.month))
+            if month is None:
+                unlisted.add((entry.date.year, entry.date.month))
+            else:
+                month['entries'].append(entry)
+        if unlisted:
+            # the ledger has drifted from the entries; reconcile_balances rebuilds it
+            logger.warning("Customer %s has entries in months missing from its ledger: %s", customer.pk, sorted(unlisted))
+        for month in recent:
+            month['loaded'] = True
+
+    ageing = balances.ageing(customer)
     context = {
         'customer': customer,
-        'months_data': sorted_months,
-        'total_entries': entries.count(),
+        'months_data': months,
+        'total_entries': sum(month['entry_count'] for month in months),
+        'outstanding': balances.balance(customer),
+        'carried_forward': balances.carried_forward(customer),
+        'ageing': [(label, ageing[key]) for key, label in AGEING_LABELS.items()],
+        'payments': customer.payments.all()[:RECENT_PAYMENTS],
     }
     return render(request, 'accounts/customer_detail.html', context)
 
+
+def _month_bucket(year, month, total_ml=0, amount=Decimal(0), entry_count=0, paid=Decimal(0), balance=Decimal(0)):
+    return {
+        'year': year,
+        'month': month,
+        'month_name': date(year, month, 1).strftime('%B %Y'),
+        'entries': [],
+        'loaded': False,
+        'entry_count': entry_count,
+        'total_ml': total_ml,
+        'total_litres': round(Decimal(total_ml) / Decimal(1000), 2),
+        'total_amount': round(amount, 2),
+        'paid': round(paid, 2),
+        'balance': round(balance, 2),
+    }
+
+
+@login_required(login_url='login')
+def customer_month_entries(request, customer_id, year, month):
+    """Table rows of one month's entries, fetched when an older month is expanded."""
+    if not 1 <= month <= 12:
+        return HttpResponseBadRequest("month must be between 1 and 12")
+    customer = get_object_or_404(Customer, id=customer_id)
+    start, end = month_range(year, month)
+    entries = pricing.with_price(MilkEntry.objects.filter(
+        customer=customer, date__gte=start, date__lt=end
+    )).order_by('-date', '-id')
+    return render(request, 'accounts/_month_entries.html', {'entries': entries})
+
 @login_required(login_url='login')
 @require_http_methods(["GET", "POST"])
 def add_entry(request):
@@ -107,22 +266,118 @@ def add_entry(request):
             new_name = form.cleaned_data.get('customer_name')
             
             if not customer and new_name:
-                customer, created = Customer.objects.get_or_create(
-                    name=new_name.strip()
-                )
+                customer, created = get_or_create_by_name(new_name)
             
             if customer:
-                entry = MilkEntry.objects.create(
-                    customer=customer,
-                    date=form.cleaned_data['date'],
-                    quantity_ml=form.cleaned_data['quantity_ml']
-                )
+                with transaction.atomic():
+                    entry = MilkEntry.objects.create(
+                        customer=customer,
+                        date=form.cleaned_data['date'],
+                        quantity_ml=form.cleaned_data['quantity_ml']
+                    )
                 return redirect('accounts:customer_list')
     else:
         form = MilkEntryForm()
     
     return render(request, 'accounts/entry_form.html', {'form': form})
 
+ROUTE_SHEET_PER_PAGE = 300
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value or '') or timezone.localdate()
+    except ValueError:
+        return timezone.localdate()
+
+
+@login_required(login_url='login')
+@require_http_methods(["GET", "POST"])
+def route_sheet(request):
+    """
+    One row per customer for a single day, prefilled with that day's
+    entry or the customer's last quantity. Saving writes the whole grid
+    with one bulk upsert keyed on (customer, date).
+    """
+    day = _parse_day(request.POST.get('date') or request.GET.get('date'))
+    query = request.GET.get('q', '').strip()
+    page_number = request.GET.get('page')
+
+    # customer id -> the value as typed, shown again when the sheet has errors
+    posted = {}
+    quantities = {}
+    errors = []
+    if request.method == 'POST':
+        for key, value in request.POST.items():
+            value = value.strip()
+            if not key.startswith('qty_') or not value:
+                continue
+            try:
+                customer_id = int(key[4:])
+            except ValueError:
+                errors.append(f"'{key}' is not a customer field; reload the sheet.")
+                continue
+            posted[customer_id] = value
+            try:
+                quantity_ml = int(value)
+            except ValueError:
+                errors.append(f"'{value}' is not a whole number of ml.")
+                continue
+            if quantity_ml < 0:
+                errors.append("Quantity cannot be negative.")
+                continue
+            quantities[customer_id] = quantity_ml
+
+        known = set(Customer.objects.filter(id__in=quantities.keys()).values_list('id', flat=True))
+        if len(known) != len(quantities):
+            errors.append("Some customers no longer exist; reload the sheet.")
+
+        if not errors:
+            created, updated = bulk.upsert_day_entries(day, quantities)
+            messages.success(
+                request,
+                f"Saved {day.strftime('%d-%m-%Y')}: {created} new, {updated} updated, "
+                f"{len(quantities) - created - updated} unchanged.",
+            )
+            params = urlencode({'date': day.isoformat(), 'q': query, 'page': page_number or 1})
+            return HttpResponseRedirect(f"{reverse('accounts:route_sheet')}?{params}")
+
+    day_qty = (
+        MilkEntry.objects.filter(customer=OuterRef('pk'), date=day)
+        .order_by('id')
+        .values('quantity_ml')[:1]
+    )
+    last_qty = (
+        MilkEntry.objects.filter(customer=OuterRef('pk'), date__lt=day)
+        .order_by('-date', '-id')
+        .values('quantity_ml')[:1]
+    )
+    customers = Customer.objects.annotate(
+        day_qty=Subquery(day_qty, output_field=IntegerField()),
+        last_qty=Subquery(last_qty, output_field=IntegerField()),
+    ).order_by('name', 'id')
+    if query:
+        customers = customers.filter(name__icontains=query)
+
+    page = Paginator(customers, ROUTE_SHEET_PER_PAGE).get_page(page_number)
+    for customer in page:
+        if customer.id in posted:
+            customer.value = posted[customer.id]
+        elif customer.day_qty is not None:
+            customer.value = customer.day_qty
+        else:
+            customer.value = customer.last_qty if customer.last_qty is not None else ''
+
+    return render(request, 'accounts/route_sheet.html', {
+        'customers': page,
+        'page_obj': page,
+        'day': day,
+        'previous_day': day - timedelta(days=1),
+        'next_day': day + timedelta(days=1),
+        'q': query,
+        'errors': errors,
+    })
+
 @login_required(login_url='login')
 @require_http_methods(["GET", "POST"])
 def edit_entry(request, entry_id):
@@ -130,7 +385,8 @@ def edit_entry(request, entry_id):
     if request.method == 'POST':
         form = MilkEntryForm(request.POST, instance=entry)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             return redirect('accounts:customer_detail', customer_id=entry.customer.id)
     else:
         form = MilkEntryForm(instance=entry)
@@ -140,9 +396,32 @@ def edit_entry(request, entry_id):
 @require_http_methods(["POST"])
 def delete_entry(request, entry_id):
     entry = get_object_or_404(MilkEntry, id=entry_id)
-    customer_id = entry.customer.id
-    entry.delete()
-    return redirect('accounts:customer_detail', customer_id=customer_id)
+    deletion.delete_entries([entry])
+    return redirect('accounts:customer_detail', customer_id=entry.customer_id)
+
+@login_required(login_url='login')
+@require_http_methods(["GET", "POST"])
+def add_payment(request, customer_id):
+    customer = get_object_or_404(Customer, id=customer_id)
+    if request.method == 'POST':
+        form = PaymentForm(request.POST)
+        if form.is_valid():
+            payment = form.save(commit=False)
+            payment.customer = customer
+            with transaction.atomic():
+                payment.save()
+            return redirect('accounts:customer_detail', customer_id=customer.id)
+    else:
+        form = PaymentForm()
+    return render(request, 'accounts/payment_form.html', {'form': form, 'customer': customer})
+
+@login_required(login_url='login')
+@require_http_methods(["POST"])
+def delete_payment(request, payment_id):
+    payment = get_object_or_404(Payment, id=payment_id)
+    with transaction.atomic():
+        payment.delete()
+    return redirect('accounts:customer_detail', customer_id=payment.customer_id)
 
 @login_required(login_url='login')
 @require_http_methods(["GET", "POST"])
@@ -161,79 +440,319 @@ def edit_customer(request, customer_id):
 @require_http_methods(["POST"])
 def delete_customer(request, customer_id):
     customer = get_object_or_404(Customer, id=customer_id)
-    customer.delete()
+    deletion.delete_customer(customer)
     return redirect('accounts:customer_list')
 
+@async_login_required
+async def chart_data(request, customer_id):
+    """
+    Litres per day, week or month for the customer's chart:
+    ?granularity=day|week|month&start=&end= (dates inclusive; by default
+    the last 30 days, 12 weeks or 12 months). Revalidated with an ETag.
+    """
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in charts.GRANULARITIES:
+        return HttpResponseBadRequest(f"granularity must be one of {', '.join(charts.GRANULARITIES)}")
+    try:
+        end = _query_date(request, 'end') or timezone.localdate()
+        start = _query_date(request, 'start') or charts.default_start(end, granularity)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if end < start:
+        return HttpResponseBadRequest("end must not be before start")
+    if charts.count(start, end, granularity) > charts.MAX_POINTS:
+        return HttpResponseBadRequest(f"at most {charts.MAX_POINTS} points; use a coarser granularity")
+
+    try:
+        customer, latest = await asyncio.gather(
+            Customer.objects.aget(id=customer_id),
+            charts.alatest(customer_id, start, end),
+        )
+    except Customer.DoesNotExist:
+        raise Http404("No such customer.")
+
+    validators = {
+        'ETag': f'"{charts.state(customer, latest, start, end, granularity)}"',
+        'Cache-Control': 'private, no-cache',
+    }
+    not_modified = get_conditional_response(request, etag=validators['ETag'])
+    if not_modified is not None:
+        for header, value in validators.items():
+            not_modified[header] = value
+        return not_modified
+
+    labels, data = await charts.aseries(customer_id, start, end, granularity)
+    response = JsonResponse({
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'labels': labels,
+        'data': data,
+    })
+    for header, value in validators.items():
+        response[header] = value
+    return response
+
+@async_login_required
+async def customer_search(request):
+    """
+    GET ?q=&limit= -> {"results": [{"id", "text"}]}, the format select2
+    expects; prefix matches on the name first (see accounts.search).
+    """
+    try:
+        limit = min(int(request.GET.get('limit', search.DEFAULT_LIMIT)), search.MAX_LIMIT)
+    except ValueError:
+        return HttpResponseBadRequest("limit must be a number")
+    matches = await sync_to_async(search.search_customers)(request.GET.get('q', ''), max(limit, 1))
+    return JsonResponse({'results': [{'id': pk, 'text': name or f"Customer {pk}"} for pk, name in matches]})
+
+def _check_bill_month(year, month):
+    """Http404 unless a bill URL's year and month (both None for a full bill) name a calendar month."""
+    if year is None:
+        return
+    try:
+        month_range(year, month)
+    except ValueError:
+        raise Http404("No such month.")
+
+@async_login_required
+async def bill_pdf(request, customer_id, year=None, month=None):
+    _check_bill_month(year, month)
+    try:
+        customer = await Bill.customers(year, month).aget(id=customer_id)
+    except Customer.DoesNotExist:
+        raise Http404("No such customer.")
+    bill = await sync_to_async(Bill)(customer, year, month)
+    modified = bill.last_modified
+    validators = {'ETag': f'"{bill.key}"', 'Cache-Control': 'private, no-cache'}
+    if modified:
+        validators['Last-Modified'] = http_date(modified.timestamp())
+
+    not_modified = get_conditional_response(
+        request,
+        etag=validators['ETag'],
+        last_modified=int(modified.timestamp()) if modified else None,
+    )
+    if not_modified is not None:
+        for header, value in validators.items():
+            not_modified[header] = value
+        return not_modified
+
+    response = HttpResponse(await bill.arender(), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{bill.filename}.pdf"'
+    for header, value in validators.items():
+        response[header] = value
+    return response
+
+def _bill_job_json(job):
+    data = {
+        'id': str(job.id),
+        'status': job.status,
+        'status_url': reverse('accounts:bill_job_status', args=[job.id]),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'expires_at': job.expires_at.isoformat(),
+        'error': job.error,
+    }
+    if job.status == BillJob.DONE:
+        data['download_url'] = reverse('accounts:bill_job_download', args=[job.id])
+    return data
+
+
 @login_required(login_url='login')
-def chart_data(request, customer_id):
-    customer = get_object_or_404(Customer, id=customer_id)
-    entries = MilkEntry.objects.filter(customer=customer).order_by('date')[:30]
-    labels = [e.date.strftime('%Y-%m-%d') for e in entries]
-    data = [float(e.litres) for e in entries]
-    return JsonResponse({'labels': labels, 'data': data})
+@require_http_methods(["POST"])
+def bill_job_create(request, customer_id, year=None, month=None):
+    """
+    Queue the bill for run_bill_worker and return the job to poll (202).
+    A bill already in the PDF cache is returned as done, to be downloaded
+    from bill_pdf straight away.
+    """
+    _check_bill_month(year, month)
+    customer = get_object_or_404(Bill.customers(year, month), id=customer_id)
+    bill = Bill(customer, year, month)
+    if pdf_cache.exists(bill.key):
+        args = [customer.id, year, month] if year and month else [customer.id]
+        return JsonResponse({
+            'id': None,
+            'status': BillJob.DONE,
+            'download_url': reverse('accounts:bill_pdf_month' if year and month else 'accounts:bill_pdf', args=args),
+        })
+    job = bill_jobs.enqueue(bill, request.user)
+    return JsonResponse(_bill_job_json(job), status=202)
+
 
 @login_required(login_url='login')
-def bill_pdf(request, customer_id, year=None, month=None):
-    customer = get_object_or_404(Customer, id=customer_id)
-    
-    if year and month:
-        entries = MilkEntry.objects.filter(
-            customer=customer,
-            date__year=year,
-            date__month=month
-        ).order_by('date')
-        filename = f"bill_{customer.name.replace(' ', '_')}_{year}_{month:02d}"
-    else:
-        entries = MilkEntry.objects.filter(customer=customer).order_by('date')
-        filename = f"bill_{customer.name.replace(' ', '_')}_all"
-    
-    total_ml = entries.aggregate(total=Sum('quantity_ml'))['total'] or 0
-    total_litres = round(Decimal(total_ml) / Decimal(1000), 2) if total_ml else Decimal(0)
-    total_amount = round((Decimal(total_ml) / Decimal(1000)) * Decimal(PRICE_PER_LITRE), 2) if total_ml else Decimal(0)
-    
-    pdf_buffer = generate_bill_pdf(
-        customer=customer,
-        entries=entries,
-        total_ml=total_ml,
-        total_litres=total_litres,
-        total_amount=total_amount,
-        price_per_litre=PRICE_PER_LITRE,
-        year=year,
-        month=month
+def bill_job_status(request, job_id):
+    job = get_object_or_404(BillJob, id=job_id)
+    return JsonResponse(_bill_job_json(job))
+
+
+@login_required(login_url='login')
+def bill_job_download(request, job_id):
+    job = get_object_or_404(BillJob, id=job_id, status=BillJob.DONE)
+    try:
+        pdf = default_storage.open(job.file, 'rb')
+    except (FileNotFoundError, OSError):
+        raise Http404("The rendered bill has expired; request it again.")
+    return FileResponse(pdf, as_attachment=True, filename=job.filename, content_type='application/pdf')
+
+
+@require_http_methods(["GET", "HEAD"])
+def health(request):
+    """
+    GET /healthz/ for Render's health check, without login: 503 while the
+    bill queue is stale (see bill_jobs.queue_health), so a stopped bill
+    worker shows up as a failing service instead of jobs queued forever.
+    """
+    queue = bill_jobs.queue_health()
+    return JsonResponse(
+        {'status': 'stale_bill_queue' if queue['stale'] else 'ok', 'bill_queue': queue},
+        status=503 if queue['stale'] else 200,
     )
-    
-    response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
-    return response
+
+SUMMARY_PER_PAGE = 100
+
+
+def _summary_period(request):
+    """
+    (start, end) inclusive from ?start=&end=, ?month=YYYY-MM or ?year=YYYY;
+    defaults to the current month. Raises ValueError on bad input.
+    """
+    year = request.GET.get('year')
+    month = request.GET.get('month')
+    if year:
+        if not year.isdigit():
+            raise ValueError("year must be YYYY")
+        return date(int(year), 1, 1), date(int(year), 12, 31)
+    if month:
+        try:
+            start = datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            raise ValueError("month must be YYYY-MM")
+        return start, next_month(start) - timedelta(days=1)
+
+    start = _query_date(request, 'start') or timezone.localdate().replace(day=1)
+    end = _query_date(request, 'end') or next_month(start) - timedelta(days=1)
+    if end < start:
+        raise ValueError("end must not be before start")
+    return start, end
+
 
 @login_required(login_url='login')
 def monthly_summary(request):
-    today = timezone.localdate()
-    start_date = today.replace(day=1)
-    if today.month == 12:
-        end_date = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        end_date = today.replace(month=today.month + 1, day=1) - timedelta(days=1)
-    
-    entries = MilkEntry.objects.filter(date__range=[start_date, end_date]).select_related('customer')
-    summary = {}
-    for entry in entries:
-        cid = entry.customer.id
-        if cid not in summary:
-            summary[cid] = {'name': entry.customer.name, 'total_ml': 0, 'amount': Decimal(0)}
-        summary[cid]['total_ml'] += entry.quantity_ml
-        summary[cid]['amount'] += entry.amount
-    
-    summary_list = []
-    for data in summary.values():
-        litres = round(Decimal(data['total_ml']) / Decimal(1000), 2)
-        amt = round(data['amount'], 2)
-        summary_list.append({'name': data['name'], 'total_ml': data['total_ml'], 'litres': litres, 'amount': amt})
-    
-    total_amount = round(sum(item['amount'] for item in summary_list), 2)
+    try:
+        start_date, end_date = _summary_period(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    rows, totals, previous_start, previous_end = reports.customer_totals(start_date, end_date)
+    page = Paginator(rows, SUMMARY_PER_PAGE).get_page(request.GET.get('page'))
+    summary_list = [
+        reports.with_amounts({'name': row['customer__name'], **row}) for row in page
+    ]
+    totals = reports.with_amounts(totals)
+
+    next_start, next_end = next_period(start_date, end_date)
     return render(request, 'accounts/monthly_summary.html', {
         'summary': summary_list,
-        'total_amount': total_amount,
+        'page_obj': page,
+        'totals': totals,
+        'total_amount': totals['amount'],
         'start': start_date,
         'end': end_date,
+        'previous_start': previous_start,
+        'previous_end': previous_end,
+        'next_start': next_start,
+        'next_end': next_end,
+        'this_month': timezone.localdate().strftime('%Y-%m'),
+        'this_year': timezone.localdate().year,
     })
+
+
+def _query_date(request, name):
+    """Optional YYYY-MM-DD query parameter; raises ValueError when present but malformed."""
+    value = request.GET.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+    return parsed
+
+
+def _export_params(request):
+    """(format, start, end, customer_id) from the query string; raises ValueError on bad input."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'xlsx'):
+        raise ValueError("format must be csv or xlsx")
+    start, end = (_query_date(request, name) for name in ('start', 'end'))
+    customer_id = request.GET.get('customer') or None
+    if customer_id is not None and not customer_id.isdigit():
+        raise ValueError("customer must be a customer id")
+    return fmt, start, end, customer_id
+
+
+@login_required(login_url='login')
+def export_entries(request):
+    """Milk entries filtered by ?start=, ?end= (inclusive dates) and ?customer=, as CSV or XLSX."""
+    try:
+        fmt, start, end, customer_id = _export_params(request)
+    except (ValueError, TypeError) as e:
+        return HttpResponseBadRequest(str(e))
+
+    # a deleted customer's entries are marked by purge_deleted, maybe not yet
+    entries = MilkEntry.objects.filter(customer__deleted_at__isnull=True)
+    if start:
+        entries = entries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(date__lte=end)
+    if customer_id:
+        entries = entries.filter(customer_id=customer_id)
+    values = (
+        entries.order_by('date', 'id')
+        .annotate(unit_price=pricing.unit_price())
+        .values_list('date', 'customer_id', 'customer__name', 'quantity_ml', 'unit_price')
+        .iterator(chunk_size=exports.ITERATOR_CHUNK_SIZE)
+    )
+
+    def rows():
+        for day, cid, name, quantity_ml, price in values:
+            litres = Decimal(quantity_ml) / Decimal(1000)
+            yield [day.isoformat(), cid, name, quantity_ml, f"{litres:.3f}", f"{price:.2f}", f"{litres * price:.2f}"]
+
+    return exports.export_response(
+        request, fmt, f"entries_{start or 'all'}_{end or 'all'}", 'Entries',
+        ['date', 'customer_id', 'customer', 'quantity_ml', 'litres', 'rate', 'amount'], rows(),
+    )
+
+
+@login_required(login_url='login')
+def export_monthly(request):
+    """Per-customer monthly totals from the ledger for the months covering ?start= to ?end=."""
+    try:
+        fmt, start, end, customer_id = _export_params(request)
+    except (ValueError, TypeError) as e:
+        return HttpResponseBadRequest(str(e))
+
+    months = MonthlyLedger.objects.filter(entry_count__gt=0)
+    if start:
+        months = months.filter(Q(year__gt=start.year) | Q(year=start.year, month__gte=start.month))
+    if end:
+        months = months.filter(Q(year__lt=end.year) | Q(year=end.year, month__lte=end.month))
+    if customer_id:
+        months = months.filter(customer_id=customer_id)
+    values = (
+        months.order_by('year', 'month', 'customer_id')
+        .values_list('year', 'month', 'customer_id', 'customer__name', 'total_ml', 'entry_count', 'amount')
+        .iterator(chunk_size=exports.ITERATOR_CHUNK_SIZE)
+    )
+
+    def rows():
+        for year, month, cid, name, total_ml, entry_count, amount in values:
+            litres = Decimal(total_ml) / Decimal(1000)
+            yield [f"{year}-{month:02d}", cid, name, total_ml, f"{litres:.2f}", entry_count, f"{amount:.2f}"]
+
+    return exports.export_response(
+        request, fmt, f"monthly_{start or 'all'}_{end or 'all'}", 'Monthly totals',
+        ['month', 'customer_id', 'customer', 'total_ml', 'litres', 'entries', 'amount'], rows(),
+    )
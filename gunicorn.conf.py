@@ -0,0 +1,56 @@
+"""
+Gunicorn settings, read from the environment. `gunicorn` with no arguments
+picks this file up from the working directory.
+
+The default profile runs WEB_CONCURRENCY processes (one per CPU) of
+GUNICORN_THREADS threads each (gthread), so a slow bill PDF or export
+holds one thread instead of the whole site. Every thread keeps its own
+database connection (DB_CONN_MAX_AGE), so threads are capped to keep
+processes x threads within DB_MAX_CONNECTIONS.
+
+SERVER_MODE=asgi serves milkproject.asgi with uvicorn workers instead
+(threads do not apply; see milkproject/asgi.py for its connections).
+
+Workers are restarted after GUNICORN_MAX_REQUESTS requests (with jitter,
+so they do not all restart at once): ReportLab keeps font and image
+caches that grow over the life of a process.
+"""
+import multiprocessing
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+if SERVER_MODE not in ('wsgi', 'asgi'):
+    raise ValueError(f"SERVER_MODE must be 'wsgi' or 'asgi', not {SERVER_MODE!r}")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# most connections the database (or its pooler) accepts from this service
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', '20'))
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'milkproject.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'milkproject.wsgi:application'
+    worker_class = 'gthread'
+    threads = max(1, min(
+        int(os.environ.get('GUNICORN_THREADS', '4')),
+        DB_MAX_CONNECTIONS // workers,
+    ))
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+# a month bill renders in well under a second, but a full-history bill or export takes longer
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+# behind Render's proxy, which keeps connections open between requests
+keepalive = 5
+
+# heartbeat files on tmpfs, so a slow disk cannot make workers look stuck
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
@@ -2,4 +2,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'milkproject.settings')
+# Under ASGI each request's database work runs in a fresh executor thread, so connections
+# kept open between requests pile up instead of being reused; put a pooler such as
+# PgBouncer in DATABASE_URL if connecting per request is too slow.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 application = get_asgi_application()
@@ -40,13 +40,16 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # ─────────────────────────────
 MIDDLEWARE = [
+    'accounts.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise that can also run async (see accounts/static_files.py)
+    'accounts.static_files.StaticFilesMiddleware',
 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.audit.AuditUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,14 +82,29 @@ TEMPLATES = [
 # ─────────────────────────────
 # DATABASE (POSTGRES FIRST)
 # ─────────────────────────────
+DATABASE_URL = os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
+
+# seconds a connection is kept open between requests; every gunicorn thread keeps its own,
+# so WEB_CONCURRENCY x GUNICORN_THREADS is the most connections the site opens (see
+# gunicorn.conf.py). The ASGI entry point sets it to 0 (see milkproject/asgi.py).
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "600"))
+
 DATABASES = {
-    'default': dj_database_url.config(
-        env='DATABASE_URL',
-        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
-        ssl_require=True,
+    'default': dj_database_url.parse(
+        DATABASE_URL,
+        conn_max_age=DB_CONN_MAX_AGE,
+        # a kept connection the database has dropped is replaced instead of failing the request
+        conn_health_checks=DB_CONN_MAX_AGE > 0,
+        # sqlite3.connect() has no sslmode
+        ssl_require=not DATABASE_URL.startswith('sqlite'),
     )
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # tests run in a file rather than shared memory, where threads fail on locks instead of waiting
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / 'test_db.sqlite3')}
+elif DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # fail fast instead of holding a worker thread when the database is unreachable
+    DATABASES['default']['OPTIONS']['connect_timeout'] = int(os.environ.get("DB_CONNECT_TIMEOUT", "5"))
 
 # ─────────────────────────────
 # PASSWORD VALIDATION
@@ -135,6 +153,34 @@ PRICE_PER_LITRE = Decimal(
     os.environ.get("PRICE_PER_LITRE", "50")
 )
 
+# rows per INSERT for POST /api/entries/bulk/ (overridable with ?chunk_size=)
+BULK_ENTRY_CHUNK_SIZE = int(os.environ.get("BULK_ENTRY_CHUNK_SIZE", "500"))
+
+# rendered bill PDFs are cached in default storage; run_bill_worker evicts the least recently used
+BILL_PDF_CACHE_DIR = 'bill_cache'
+BILL_PDF_CACHE_MAX_BYTES = int(os.environ.get("BILL_PDF_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# bills rendered by `manage.py run_bill_worker` are kept in default storage this long
+BILL_JOB_DIR = 'bill_jobs'
+BILL_JOB_TTL_SECONDS = int(os.environ.get("BILL_JOB_TTL_SECONDS", "3600"))
+# /healthz/ fails once a queued bill job waits this long with no worker picking jobs up
+BILL_JOB_QUEUE_STALE_SECONDS = int(os.environ.get("BILL_JOB_QUEUE_STALE_SECONDS", "300"))
+
+# bill PDFs rendered at once by the async bill view, in threads of their own (accounts.billing)
+PDF_RENDER_THREADS = int(os.environ.get("PDF_RENDER_THREADS", "2"))
+
+# the sync pull leaves rows changed this recently for the next pull, so writes still
+# committing are not skipped; a write transaction must commit within this long
+SYNC_SETTLE_SECONDS = int(os.environ.get("SYNC_SETTLE_SECONDS", "60"))
+
+# soft-deleted rows are kept this long before `manage.py purge_deleted` removes them
+SOFT_DELETE_RETENTION_DAYS = int(os.environ.get("SOFT_DELETE_RETENTION_DAYS", "90"))
+
+# requests slower than this are logged with their most repeated SQL (accounts.metrics)
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", "1000"))
+# bearer token for Prometheus to scrape /metrics; staff sessions can always read it
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 # ─────────────────────────────
 # DEFAULT FIELD
 # ─────────────────────────────